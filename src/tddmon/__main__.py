@@ -1,13 +1,45 @@
 # -*- coding: utf-8 -*-
 from abc import ABCMeta, abstractmethod
 import argparse
+import ast
+import codecs
+import collections
+import ctypes
+import ctypes.util
+import errno
+import glob
+import hashlib
+import importlib
+import io
+import json
+from multiprocessing.pool import ThreadPool
 import os
 import re
+import runpy
+import select
+import shutil
+import signal
+import socket
+import sqlite3
+import stat
+import struct
 import sys
 import subprocess
+import tempfile
+import threading
 import time
+import traceback
+import unittest
+import zlib
+import six
+from six.moves import configparser
 from six.moves.urllib.request import urlopen
 from six.moves.urllib.parse import urlencode
+try:
+    import resource
+except ImportError:  # pragma nocover
+    # Windows
+    resource = None
 
 # - uruchamianie testów z pokryciem kodu
 # - zapis wyniku testów do logu
@@ -24,6 +56,26 @@ DEFAULT_COLORS = {
     'blue': 44,
     'sea': 46,
 }
+DEFAULT_IGNORE_PATTERNS = [
+    '.git/', '.hg/', '.svn/', '.bzr/',
+    '.tox/', '.nox/', '.venv/', 'venv/', 'virtualenv/',
+    'node_modules/', '__pycache__/', '.eggs/', '*.egg-info/',
+    'build/', 'dist/', 'htmlcov/',
+    '.mypy_cache/', '.pytest_cache/', '.ruff_cache/',
+    '.tddmon/',
+]
+if not hasattr(os, 'setsid'):  # pragma nocover
+    NEW_SESSION = {}
+elif six.PY3:
+    NEW_SESSION = {'start_new_session': True}
+else:  # pragma nocover
+    NEW_SESSION = {'preexec_fn': os.setsid}
+# exit status of test process killed by signal -> limit it broke
+LIMIT_SIGNALS = dict((-getattr(signal, name), status) for name, status in [
+    ('SIGXCPU', 'timeout'),
+    # sent by kernel OOM killer
+    ('SIGKILL', 'oom'),
+] if hasattr(signal, name))
 
 
 class IObservable(object):
@@ -53,14 +105,41 @@ class StatusDisplay(IObserver, object):
 
         - print status information
     """
+    idle_pattern = 'idle, checking every %.1fs\n'
+    # progress line is shown until next status
+    _progress_shown = False
+    # stage name -> 'ok', 'failed', 'pending' or None when it hasn't run yet
+    _stage_status = {}
+    limit_labels = {'timeout': 'TIMEOUT', 'oom': 'OUT OF MEMORY'}
+
     def notify(self, observable, *args, **kwargs):
         ran, failures, errors, coverage = args
+        if 'stages' in kwargs:
+            self._stage_status = kwargs['stages']
         # first run
         if self._first_run:
             self._write_header()
             self._first_run = False
-        if ran is None:
-            self._write_empty()
+        if kwargs.get('progress'):
+            self._write_progress(ran, failures, errors)
+            self._output.flush()
+            self._progress_shown = True
+            return
+        if self._progress_shown:
+            self._clear_progress()
+            self._progress_shown = False
+        if kwargs.get('syntax_error'):
+            self._write_syntax_error(kwargs['syntax_error'])
+        elif ran is None:
+            self._write_empty(kwargs.get('interval'))
+        elif kwargs.get('limit_exceeded'):
+            self._write_limit(kwargs['limit_exceeded'], ran, failures, errors)
+        elif kwargs.get('early'):
+            self._write_early(ran, failures, errors)
+        elif kwargs.get('stage'):
+            self._write_stage(kwargs['stage'], ran, failures, errors, coverage)
+        elif kwargs.get('stale_coverage'):
+            self._write_stale(ran, failures, errors, coverage)
         else:
             self._write(ran, failures, errors, coverage)
 
@@ -68,12 +147,40 @@ class StatusDisplay(IObserver, object):
     def _write(self, ran, failures, errors, coverage):
         pass  # pragma nocover
 
+    @abstractmethod
+    def _write_stale(self, ran, failures, errors, coverage):
+        pass  # pragma nocover
+
+    @abstractmethod
+    def _write_early(self, ran, failures, errors):
+        pass  # pragma nocover
+
+    @abstractmethod
+    def _write_progress(self, ran, failures, errors):
+        pass  # pragma nocover
+
+    @abstractmethod
+    def _write_syntax_error(self, location):
+        pass  # pragma nocover
+
+    @abstractmethod
+    def _write_stage(self, stage, ran, failures, errors, coverage):
+        pass  # pragma nocover
+
+    @abstractmethod
+    def _write_limit(self, status, ran, failures, errors):
+        pass  # pragma nocover
+
+    @abstractmethod
+    def _clear_progress(self):
+        pass  # pragma nocover
+
     @abstractmethod
     def _write_header(self):
         pass  # pragma nocover
 
     @abstractmethod
-    def _write_empty(self):
+    def _write_empty(self, interval=None):
         pass  # pragma nocover
 
 
@@ -85,6 +192,12 @@ class BWDisplay(StatusDisplay):
         - print status information
     """
     pattern = '%(color)s %(num)8d%(failures)9d%(errors)8d%(coverage)8d%%\n'
+    stale_pattern = '%(color)s %(num)8d%(failures)9d%(errors)8d%(coverage)8s%%  stale\n'
+    early_pattern = '%(color)s %(num)8d%(failures)9d%(errors)8d  failed first\n'
+    progress_pattern = '\r%(color)s %(num)8d%(failures)9d%(errors)8d  running'
+    syntax_error_pattern = '%(color)s SyntaxError: %(location)s\n'
+    stage_pattern = '%(color)s %(num)8d%(failures)9d%(errors)8d%(coverage)8s%%  %(stage)s\n'
+    limit_pattern = '%(color)s %(num)8d%(failures)9d%(errors)8d  %(status)s\n'
     empty_pattern = '%(color)s%(space)28s%(space)8s%%\n'
 
     def __init__(self, output=None, colors=None):
@@ -99,8 +212,11 @@ class BWDisplay(StatusDisplay):
     def _write_header(self):
         self._output.write('      Tests ran Failures  Errors Coverage\n')
 
-    def _write_empty(self):
-        self._output.write('\n')
+    def _write_empty(self, interval=None):
+        if interval is None:
+            self._output.write('\n')
+        else:
+            self._output.write(self.idle_pattern % interval)
 
     def _write(self, ran, failures, errors, coverage):
         """ Display status information.
@@ -123,6 +239,70 @@ class BWDisplay(StatusDisplay):
         }
         self._output.write(line)
 
+    def _write_stale(self, ran, failures, errors, coverage):
+        """ Display result of run without coverage with last known coverage.
+
+        :param coverage: coverage percent; None when it's not known yet
+        """
+        line = self.stale_pattern % {
+            'color': 'FAIL: ' if failures or errors else 'OK:   ',
+            'num': ran,
+            'failures': failures,
+            'errors': errors,
+            'coverage': coverage if coverage is not None else '?',
+        }
+        self._output.write(line)
+
+    def _write_early(self, ran, failures, errors):
+        """ Display result of tests which failed in previous run. """
+        line = self.early_pattern % {
+            'color': 'FAIL: ' if failures or errors else 'OK:   ',
+            'num': ran,
+            'failures': failures,
+            'errors': errors,
+        }
+        self._output.write(line)
+
+    def _write_progress(self, ran, failures, errors):
+        """ Display numbers of tests run so far, overwriting last ones. """
+        line = self.progress_pattern % {
+            'color': 'FAIL: ' if failures or errors else '      ',
+            'num': ran,
+            'failures': failures,
+            'errors': errors,
+        }
+        self._output.write(line)
+        self._progress_width = len(line) - 1
+
+    def _clear_progress(self):
+        self._output.write('\r%s\r' % (' ' * self._progress_width))
+
+    def _write_syntax_error(self, location):
+        """ Display location of syntax error found before tests were run. """
+        self._output.write(self.syntax_error_pattern % {'color': 'FAIL: ', 'location': location})
+
+    def _write_stage(self, stage, ran, failures, errors, coverage):
+        """ Display result of later test stage. """
+        line = self.stage_pattern % {
+            'color': 'FAIL: ' if failures or errors else 'OK:   ',
+            'num': ran,
+            'failures': failures,
+            'errors': errors,
+            'coverage': coverage if coverage is not None else '?',
+            'stage': stage,
+        }
+        self._output.write(line)
+
+    def _write_limit(self, status, ran, failures, errors):
+        """ Display result of run stopped for breaking limits. """
+        self._output.write(self.limit_pattern % {
+            'color': 'FAIL: ',
+            'num': ran,
+            'failures': failures,
+            'errors': errors,
+            'status': self.limit_labels.get(status, status),
+        })
+
 
 class ColorDisplay(StatusDisplay):
     """ <<sink>>
@@ -132,25 +312,53 @@ class ColorDisplay(StatusDisplay):
         - print status information
     """
     pattern = '%(color)s %(num)8d%(failures)9d%(errors)8d%(coverage_color)s%(coverage)8d%%%(normal_color)s\n'
+    stale_pattern = '%(color)s %(num)8d%(failures)9d%(errors)8d%(normal_color)s%(coverage)8s%%  stale\n'
+    early_pattern = '%(color)s %(num)8d%(failures)9d%(errors)8d%(normal_color)s  failed first\n'
+    progress_pattern = '\r%(color)s %(num)8d%(failures)9d%(errors)8d%(normal_color)s  running'
+    syntax_error_pattern = '%(color)s SyntaxError: %(location)s%(normal_color)s\n'
+    stage_pattern = '%(color)s %(num)8d%(failures)9d%(errors)8d%(normal_color)s%(coverage)8s%%'
+    limit_pattern = '%(color)s %(num)8d%(failures)9d%(errors)8d%(normal_color)s  %(status)s'
     empty_pattern = '%(color)s%(space)28s%(coverage_color)s%(space)8s%%%(normal_color)s\n'
+    stage_labels = {'ok': 'ok', 'failed': 'FAIL', 'pending': 'wait'}
 
-    def __init__(self, output=None, colors=None):
+    def __init__(self, output=None, colors=None, stages=()):
         """@todo: Docstring for __init__
 
         :param output: file to which write
         :param colors: color codes used to display status
+        :param stages: names of later test stages, each shown in own column
         """
         self._output = output if output is not None else sys.stdout
         self._colors = colors if colors is not None else DEFAULT_COLORS
+        self._stages = list(stages)
         self._last_run_color = ''
         self._last_run_cov_color = ''
         self._first_run = True
 
     def _write_header(self):
-        self._output.write('Tests ran Failures  Errors Coverage\n')
+        self._output.write('Tests ran Failures  Errors Coverage%s\n' % ''.join(
+            '  %*s' % (self._stage_width(stage), stage) for stage in self._stages))
+
+    def _stage_width(self, stage):
+        return max(len(stage), 4)
 
-    def _write_empty(self):
-        self._output.write('\n')
+    def _with_stages(self, line):
+        """ Add status of every later test stage to line. """
+        if not self._stages:
+            return line
+        cells = []
+        for stage in self._stages:
+            status = self._stage_status.get(stage)
+            color = {'ok': self._colors['green'], 'failed': self._colors['red']}.get(status)
+            cell = '%*s' % (self._stage_width(stage), self.stage_labels.get(status, '-'))
+            cells.append('  \033[%sm%s\033[0m' % (color, cell) if color else '  ' + cell)
+        return line.rstrip('\n') + ''.join(cells) + '\n'
+
+    def _write_empty(self, interval=None):
+        if interval is None:
+            self._output.write('\n')
+        else:
+            self._output.write(self.idle_pattern % interval)
 
     def _write(self, ran, failures, errors, coverage):
         """ Display status information.
@@ -185,8 +393,104 @@ class ColorDisplay(StatusDisplay):
             'coverage': coverage,
             'normal_color': '\033[0m',
         }
+        self._output.write(self._with_stages(line))
+
+    def _write_stale(self, ran, failures, errors, coverage):
+        """ Display result of run without coverage with last known coverage.
+
+        Coverage is shown without color, as it may not be true any more.
+
+        :param coverage: coverage percent; None when it's not known yet
+        """
+        if failures or errors:
+            color = self._colors['red']
+        elif self._last_run_color in [self._colors['green'], self._colors['blue']]:
+            color = self._colors['blue']
+        else:
+            color = self._colors['green']
+        self._last_run_color = color
+        line = self.stale_pattern % {
+            'color': '\033[%sm' % color,
+            'num': ran,
+            'failures': failures,
+            'errors': errors,
+            'coverage': coverage if coverage is not None else '?',
+            'normal_color': '\033[0m',
+        }
+        self._output.write(self._with_stages(line))
+
+    def _write_early(self, ran, failures, errors):
+        """ Display result of tests which failed in previous run.
+
+        Doesn't count as run for blue status.
+        """
+        color = self._colors['red'] if failures or errors else self._colors['green']
+        line = self.early_pattern % {
+            'color': '\033[%sm' % color,
+            'num': ran,
+            'failures': failures,
+            'errors': errors,
+            'normal_color': '\033[0m',
+        }
+        self._output.write(line)
+
+    def _write_progress(self, ran, failures, errors):
+        """ Display numbers of tests run so far, overwriting last ones.
+
+        Red shows at once when a test fails.
+        """
+        line = self.progress_pattern % {
+            'color': '\033[%sm' % self._colors['red'] if failures or errors else '',
+            'num': ran,
+            'failures': failures,
+            'errors': errors,
+            'normal_color': '\033[0m',
+        }
         self._output.write(line)
 
+    def _clear_progress(self):
+        self._output.write('\r\033[K')
+
+    def _write_syntax_error(self, location):
+        """ Display location of syntax error found before tests were run. """
+        color = self._colors['red']
+        self._last_run_color = color
+        self._output.write(self.syntax_error_pattern % {
+            'color': '\033[%sm' % color,
+            'location': location,
+            'normal_color': '\033[0m',
+        })
+
+    def _write_stage(self, stage, ran, failures, errors, coverage):
+        """ Display result of later test stage with status of all stages.
+
+        Doesn't count as run for blue status.
+        """
+        color = self._colors['red'] if failures or errors else self._colors['green']
+        line = self.stage_pattern % {
+            'color': '\033[%sm' % color,
+            'num': ran,
+            'failures': failures,
+            'errors': errors,
+            'coverage': coverage if coverage is not None else '?',
+            'normal_color': '\033[0m',
+        }
+        self._output.write(self._with_stages(line + '\n'))
+
+    def _write_limit(self, status, ran, failures, errors):
+        """ Display result of run stopped for breaking limits. """
+        color = self._colors['red']
+        self._last_run_color = color
+        line = self.limit_pattern % {
+            'color': '\033[%sm' % color,
+            'num': ran,
+            'failures': failures,
+            'errors': errors,
+            'normal_color': '\033[0m',
+            'status': self.limit_labels.get(status, status),
+        }
+        self._output.write(self._with_stages(line + '\n'))
+
 
 class RemoteDisplay(IObserver, object):
     """ <<sink>>
@@ -201,7 +505,12 @@ class RemoteDisplay(IObserver, object):
         self._url = url
 
     def notify(self, observable, *args, **kwargs):
+        if kwargs.get('early') or kwargs.get('progress') or kwargs.get('syntax_error') or kwargs.get('stage'):
+            return
         ran, failures, errors, coverage = args
+        if kwargs.get('stale_coverage') and coverage is None:
+            # run without coverage before it was ever measured
+            return
         self._send(ran, failures, errors, coverage)
 
     def _send(self, ran, failures, errors, coverage):
@@ -226,13 +535,13 @@ class RemoteDisplay(IObserver, object):
 
 class AbstractWriter(object):
 
-    def write(self, text):
+    def write(self, *outputs):
         raise NotImplementedError  # pragma nocover
 
 
 class DummyWriter(AbstractWriter):
 
-    def write(self, text):
+    def write(self, *outputs):
         pass
 
 
@@ -252,224 +561,3582 @@ class LogWriter(AbstractWriter):
 
         """
         self._output = output
-        self._last_traceback = []
+        # digest of last written output without timing lines
+        self._last_traceback = None
 
-    def write(self, text):
-        """@todo: Docstring for write
+    def write(self, *outputs):
+        """ Write outputs one after another unless they are the same as last time.
 
-        :param text: @todo
-        :returns: @todo
+        Outputs are read piece by piece, so that big ones spilled to disk
+        aren't loaded into memory.
 
+        :param outputs: texts or SpillBuffers
         """
-        to_diff = text.splitlines()
-        to_diff = [line for line in to_diff if not line.startswith('Ran')]
-        if to_diff != self._last_traceback:
-            self._output.write(text)
+        digest = hashlib.sha1()
+        for line in output_lines(*outputs):
+            if not line.startswith('Ran'):
+                digest.update((line.encode('utf-8') if isinstance(line, six.text_type) else line) + b'\n')
+        if digest.digest() != self._last_traceback:
+            for output in outputs:
+                for chunk in output_chunks(output):
+                    self._output.write(chunk)
             self._output.flush()
-            self._last_traceback = to_diff
+            self._last_traceback = digest.digest()
 
 
-class TestRunner(object):
-    """ <<source>>
+def write_file_atomically(path, data):
+    """ Write data to temporary file and rename it to path.
 
-    Responsibilities:
+    Readers never see partially written file.
 
-        - run tests
+    :param path: destination path
+    :param data: bytes to write
     """
-    def __init__(self, command):
-        """@todo: Docstring for __init__
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    if hasattr(os, 'replace'):
+        os.replace(tmp_path, path)
+    else:  # pragma nocover
+        os.rename(tmp_path, path)
 
-        :param command: @todo
-        :returns: @todo
 
+def write_coverage_config(path, user_config='.coveragerc'):
+    """ Write coverage configuration recording test contexts.
+
+    Settings from user's configuration file are preserved.
+
+    :param path: path of configuration file to write
+    :param user_config: path of user's coverage configuration
+    """
+    parser = configparser.RawConfigParser()
+    parser.read(user_config)
+    if not parser.has_section('run'):
+        parser.add_section('run')
+    parser.set('run', 'dynamic_context', 'test_function')
+    output = six.StringIO()
+    parser.write(output)
+    write_file_atomically(path, output.getvalue().encode('utf-8'))
+
+
+def read_coverage_contexts(data_file):
+    """ Read which files were executed by which tests from coverage data.
+
+    Needs SQLite data file written by coverage 5 or newer with dynamic
+    contexts enabled.
+
+    :param data_file: path of coverage data file
+    :returns: dict mapping absolute file path to set of test contexts
+    """
+    result = {}
+    if not os.path.exists(data_file):
+        return result
+    connection = sqlite3.connect(data_file)
+    try:
+        for table in ('line_bits', 'arc'):
+            query = ('SELECT DISTINCT file.path, context.context FROM %(table)s '
+                     'JOIN file ON file.id = %(table)s.file_id '
+                     'JOIN context ON context.id = %(table)s.context_id' % {'table': table})
+            try:
+                rows = connection.execute(query).fetchall()
+            except sqlite3.Error:
+                continue
+            for path, context in rows:
+                if context:
+                    result.setdefault(path, set()).add(context)
+    except sqlite3.Error:
+        # not an SQLite data file (older coverage)
+        pass
+    finally:
+        connection.close()
+    return result
+
+
+def is_script_context(context):
+    """ Check if coverage test context is of test defined in script run as main module.
+
+    Only such tests can be named for unittest.main() of the script; tests of
+    modules it imports may be bound in it under other names or not at all.
+    """
+    return context.startswith('__main__.')
+
+
+def unittest_name_from_context(context):
+    """ Convert coverage test context into name accepted by unittest.
+
+    Tests defined in script run as main module are named relative to it.
+    """
+    if is_script_context(context):
+        return context[len('__main__.'):]
+    return context
+
+
+class ImpactIndex(object):
+    """ <<index>>
+
+    Responsibilities:
+
+        - remember which tests executed which files
+        - select tests affected by changes
+    """
+    def __init__(self, path=None, command=None):
         """
+        :param path: path of file in which index is kept between runs
+        :param command: test command; index made for other command is
+            discarded
+        """
+        self._path = path
         self._command = command
+        self._script = self._find_script(command)
+        # absolute file path -> set of test contexts
+        self._tests_by_file = {}
+        if path is not None:
+            self.load()
 
-    def run(self):
-        """@todo: Docstring for run
-        :returns: @todo
+    def load(self):
+        try:
+            with open(self._path, 'rb') as f:
+                data = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+        except (IOError, OSError, ValueError, zlib.error):
+            return
+        if data.get('command') != self._command:
+            return
+        self._tests_by_file = dict((path, set(tests)) for path, tests in data['files'].items())
+
+    def save(self):
+        if self._path is None:
+            return
+        data = {
+            'command': self._command,
+            'files': dict((path, sorted(tests)) for path, tests in self._tests_by_file.items()),
+        }
+        write_file_atomically(self._path, zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), 1))
+
+    @staticmethod
+    def _find_script(command):
+        """ Find file of script run as main module by test command.
+
+        Only tests defined in it are selected (see is_script_context()).
         """
-        command = [
-            'coverage', 'run',
-            '--branch',
-            '--source', '.',
-        ] + self._command.split()
-        program_output, test_output = self._run_command(command)
-        command = ['coverage', 'report']
-        report_output, error_output = self._run_command(command)
-        return (str(program_output), str(test_output + report_output))
+        argv = command.split() if command else []
+        if argv[:1] == ['-m']:
+            return os.path.abspath(os.path.join(*argv[1].split('.')) + '.py') if len(argv) > 1 else None
+        return os.path.abspath(argv[0]) if argv else None
 
-    def _run_command(self, command):
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdoutdata, stderrdata = process.communicate()
-        return stdoutdata, stderrdata
+    def select(self, changes):
+        """ Find tests affected by changes.
 
+        :param changes: ChangeSet or None
+        :returns: sorted list of test contexts; None when whole suite
+            should run (no index, unknown changes, changed file which
+            was never executed by any test, e.g. new test module, changed
+            test script, which may have got tests not indexed yet, or
+            tests which can't be named, see is_script_context())
+        """
+        if not self._tests_by_file or not changes or changes.unknown:
+            return None
+        tests = set()
+        for path in changes.paths:
+            path = os.path.abspath(path)
+            tests_of_file = self._tests_by_file.get(path)
+            if tests_of_file is None or path == self._script:
+                return None
+            tests.update(tests_of_file)
+        if not all(is_script_context(test) for test in tests):
+            return None
+        return sorted(tests)
 
-class TestResultParser(object):
-    """ <<filter>>
+    def update(self, data_file, selected=None):
+        """ Refresh index with coverage data of last run.
+
+        :param data_file: path of coverage data file
+        :param selected: contexts of tests selected for the run; None
+            when whole suite was run
+        """
+        contexts = read_coverage_contexts(data_file)
+        if selected is None:
+            self._tests_by_file = contexts
+        else:
+            ran = set(selected)
+            for tests in contexts.values():
+                ran.update(tests)
+            for path in list(self._tests_by_file):
+                self._tests_by_file[path] -= ran
+                if not self._tests_by_file[path]:
+                    del self._tests_by_file[path]
+            for path, tests in contexts.items():
+                self._tests_by_file.setdefault(path, set()).update(tests)
+        self.save()
+
+
+class ImportGraph(object):
+    """ <<index>>
 
     Responsibilities:
 
-        - parse test result
+        - remember which project modules every module imports, parsing
+          again only files which have changed
+        - select tests of modules which import changed modules
+
+    Used where coverage of earlier runs can't tell which tests to run,
+    e.g. on the first run. Imports are found statically, so modules
+    imported dynamically (importlib, plugins) are not seen.
     """
+    def __init__(self, command, path=None):
+        """
+        :param command: test command; tests are named relative to its
+            script, the way unittest.main() inside it accepts them
+        :param path: path of file in which graph is kept between runs
+        """
+        self._command = command
+        self._path = path
+        self._top = os.path.abspath('.')
+        # absolute file path -> {'digest', 'imports', 'tests'}; every
+        # import is [file path, name bound in module or None, [[imported
+        # name, bound name], ...]]
+        self._files = {}
+        # files compared with their digest since tddmon started
+        self._verified = set()
+        if path is not None:
+            self.load()
 
-    def parse(self, input_data):
-        lines = input_data.splitlines()
-        lines.reverse()
-        ran = self._get_ran_tests_num(lines)
-        failures, errors = self._get_failures(lines)
-        coverage = self._get_coverage(lines)
-        return (ran, failures, errors, coverage)
+    def load(self):
+        try:
+            with open(self._path, 'rb') as f:
+                data = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+        except (IOError, OSError, ValueError, zlib.error):
+            return
+        if data.get('command') != self._command:
+            return
+        self._files = data['files']
 
-    def _get_failures(self, lines):
-        error_re = re.compile('^(?:OK|FAILED)(?:\s*\((?:failures=(\d+))?(?:,\s*)?(?:errors=(\d+))?)')
-        failures = 0
-        errors = 0
-        for line in lines:
-            match = error_re.search(line)
-            if match:
-                failures = int(match.group(1) or 0)
-                errors = int(match.group(2) or 0)
-                return failures, errors
-        return failures, errors
-
-    def _get_ran_tests_num(self, lines):
-        ran_re = re.compile('^Ran (\d+)')
-        ran = 0
-        for line in lines:
-            match = ran_re.search(line)
-            if match:
-                return int(match.group(1) or 0)
-        return ran
-
-    def _get_coverage(self, lines):
-        total_re = re.compile('^[^\s]+\s*\d+\s*\d+\s*\d+\s*\d+\s*(\d+)%')
-        total = 0
-        for line in lines:
-            match = total_re.search(line)
-            if match:
-                return int(match.group(1) or 0)
-        return total
+    def save(self):
+        if self._path is None:
+            return
+        data = {
+            'command': self._command,
+            'files': self._files,
+        }
+        write_file_atomically(self._path, zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), 1))
 
+    def invalidate(self, changes):
+        """ Forget that changed files were compared with their digest.
 
-class FileMonitorTimeoutError(Exception):
-    pass
+        Must see every change, also those for which graph isn't asked to
+        select tests, or imports of changed files would be taken from
+        stale entries later.
 
+        :param changes: ChangeSet or None; unknown changes forget all files
+        """
+        if changes is None or changes.unknown:
+            self._verified.clear()
+        else:
+            self._verified.difference_update(os.path.abspath(path) for path in changes.paths)
 
-class FileMonitor(object):
-    """ <<source>>
+    def select(self, changes):
+        """ Find tests of modules which import changed modules, directly or not.
 
-    Responsibilities:
+        :param changes: ChangeSet or None
+        :returns: sorted list of unittest names; None when whole suite
+            should run (unknown changes, changed test script, changed file
+            not imported by it or tests which can't be named)
+        """
+        self.invalidate(changes)
+        script = self._script()
+        if script is None or not changes or changes.unknown:
+            return None
+        changed = set(os.path.abspath(path) for path in changes.paths)
+        if script in changed:
+            return None
+        modules = self._closure(script)
+        self.save()
+        if not changed.issubset(modules):
+            return None
+        affected = self._dependents(modules, changed)
+        names = set()
+        # script importing all test modules depends on everything; its own
+        # tests don't, unless test module (e.g. with mixin) changed itself
+        if any(path in affected and (path in changed or not modules[path]['tests'])
+               for path, bound, imported in modules[script]['imports']):
+            names.update(modules[script]['tests'])
+        named = set([script])
+        for path, bound, imported in modules[script]['imports']:
+            if path not in affected or not modules[path]['tests']:
+                continue
+            tests = modules[path]['tests']
+            named.add(path)
+            if bound is not None:
+                names.update('%s.%s' % (bound, test) for test in tests)
+            for name, bound_name in imported:
+                if name == '*':
+                    names.update(test for test in tests if not test.startswith('_'))
+                elif name in tests:
+                    names.add(bound_name)
+        if any(modules[path]['tests'] for path in affected - named):
+            # imported by script indirectly, so they can't be named
+            return None
+        return sorted(names) or None
 
-        - monitor file changes
-    """
-    def __init__(self, timeout=60, interval=2, monitored_extensions=['.py']):
-        self._mtimes = {}
-        self._timeout = timeout
-        self._interval = interval
-        self._monitored_extensions = monitored_extensions
+    def _script(self):
+        argv = self._command.split()
+        if not argv:
+            return None
+        if argv[0] == '-m':
+            return self._find_module(argv[1].split('.'), [self._top]) if len(argv) > 1 else None
+        return os.path.abspath(argv[0])
 
-    def wait_for_change(self):
-        """@todo: Docstring for wait_for_change
-        :returns: @todo
+    def _closure(self, script):
+        """ Parse script and modules it imports, directly or not.
 
+        :returns: dict mapping file path to its entry
         """
-        time_passed = 0
-        while not self.code_has_changed():
-            time.sleep(self._interval)
-            time_passed += self._interval
-            if time_passed > self._timeout:
-                raise FileMonitorTimeoutError
-        return True
+        modules = {}
+        stack = [script]
+        while stack:
+            path = stack.pop()
+            if path in modules:
+                continue
+            entry = self._entry(path, script)
+            if entry is None:
+                continue
+            modules[path] = entry
+            stack.extend(imported[0] for imported in entry['imports'])
+        return modules
 
-    def code_has_changed(self):
-        files = self.get_monitored_files()
-        for filename in files:
-            if self.file_has_changed(filename):
-                return True
-        return False
+    def _dependents(self, modules, changed):
+        importers = {}
+        for path, entry in modules.items():
+            for imported in entry['imports']:
+                importers.setdefault(imported[0], set()).add(path)
+        affected = set()
+        stack = list(changed)
+        while stack:
+            path = stack.pop()
+            if path in affected:
+                continue
+            affected.add(path)
+            stack.extend(importers.get(path, ()))
+        return affected
 
-    def get_monitored_files(self):
-        for dirpath, dirnames, filenames in os.walk('.'):
-            for filename in filenames:
-                if self.should_monitor_file(filename):
-                    yield os.path.join(dirpath, filename)
+    def _entry(self, path, script):
+        entry = self._files.get(path)
+        if entry is not None and path in self._verified:
+            return entry
+        try:
+            digest = hash_file(path)
+        except (IOError, OSError):
+            self._files.pop(path, None)
+            return None
+        if entry is None or entry['digest'] != digest:
+            entry = self._parse(path, script)
+            entry['digest'] = digest
+            self._files[path] = entry
+        self._verified.add(path)
+        return entry
 
-    def should_monitor_file(self, filename):
-        file_extension = os.path.splitext(filename)[1]
-        return file_extension in self._monitored_extensions
+    def _parse(self, path, script):
+        try:
+            with open(path, 'rb') as f:
+                tree = ast.parse(f.read(), path)
+        except (SyntaxError, ValueError):
+            # imports are unknown until it's fixed; nothing depends on it yet
+            return {'imports': [], 'tests': []}
+        imports = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                bases = self._bases(path, script, 0)
+                for alias in node.names:
+                    imports.extend(self._resolve_import(alias.name.split('.'), alias.asname, bases))
+            elif isinstance(node, ast.ImportFrom):
+                bases = self._bases(path, script, node.level)
+                imports.extend(self._resolve_import_from(node, bases))
+        tests = []
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef) and any(self._is_test_base(base, tests) for base in node.bases):
+                tests.append(node.name)
+        return {'imports': imports, 'tests': tests}
 
-    def file_has_changed(self, filename):
-        curr_mtime = os.stat(filename).st_mtime
-        last_mtime = self._mtimes.setdefault(filename, curr_mtime)
-        self._mtimes[filename] = curr_mtime
-        return (curr_mtime != last_mtime)
+    def _resolve_import(self, parts, asname, bases):
+        imports = []
+        for i in range(1, len(parts) + 1):
+            module = self._find_module(parts[:i], bases)
+            if module is None:
+                break
+            if i == len(parts):
+                bound = asname or '.'.join(parts)
+            else:
+                bound = None if asname else '.'.join(parts[:i])
+            imports.append([module, bound, []])
+        return imports
 
+    def _resolve_import_from(self, node, bases):
+        parts = node.module.split('.') if node.module else []
+        imports = [[module, None, []] for module in
+                   (self._find_module(parts[:i], bases) for i in range(1, len(parts))) if module is not None]
+        module = self._find_module(parts, bases)
+        if module is not None:
+            imports.append([module, None, [[alias.name, alias.asname or alias.name] for alias in node.names]])
+        for alias in node.names:
+            submodule = self._find_module(parts + [alias.name], bases) if alias.name != '*' else None
+            if submodule is not None:
+                imports.append([submodule, alias.asname or alias.name, []])
+        return imports
 
-class TddMon(IObservable, object):
-    """ <<controller>>
+    def _bases(self, path, script, level):
+        if level:
+            base = os.path.dirname(path)
+            for _ in range(level - 1):
+                base = os.path.dirname(base)
+            return [base]
+        # script's directory comes first in sys.path
+        return [os.path.dirname(script), self._top]
 
-    Collaborators:
+    def _find_module(self, parts, bases):
+        for base in bases:
+            path = os.path.join(base, *parts)
+            for candidate in ([path + '.py'] if parts else []) + [os.path.join(path, '__init__.py')]:
+                if candidate.startswith(os.path.join(self._top, '')) and os.path.isfile(candidate):
+                    return candidate
+        return None
 
-        - TestRunner - <<source>>
-        - TestResultParser - <<filter>>
-        - LogWriter - <<sink>>
-        - IObserver - <<sink>>
-        - FileMonitor - <<source>>
-    """
-    def __init__(self, filename, log=None, output=None):
-        self.test_runner = TestRunner(filename)
-        self.log_writer = LogWriter(log) if log is not None else DummyWriter()
-        self.test_result_parser = TestResultParser()
-        self.file_monitor = FileMonitor()
-        self.server = LogWriter(log) if log is not None else DummyWriter()
-        self._observers = []
+    @staticmethod
+    def _is_test_base(base, tests):
+        if isinstance(base, ast.Attribute):
+            name = base.attr
+        elif isinstance(base, ast.Name):
+            name = base.id
+        else:
+            return False
+        return name.endswith('TestCase') or name in tests
 
-    def register(self, observer):
-        self._observers.append(observer)
 
-    def notify_observers(self, *args, **kwargs):
-        for observer in self._observers:
-            observer.notify(self, *args, **kwargs)
+class CoverageCache(object):
+    """ <<cache>>
 
-    def run(self):
-        """@todo: Docstring for run
-        :returns: @todo
+    Responsibilities:
 
+        - keep coverage data of whole suite between runs
+        - merge data of partial run into it, dropping data of re-run tests
+          and changed files
+    """
+    def __init__(self, path):
         """
-        stdoutdata, stderrdata = self.test_runner.run()
-        self.log_writer.write(stdoutdata + stderrdata)
-        result = self.test_result_parser.parse(stderrdata)
-        self.notify_observers(*result)
+        :param path: path of SQLite coverage data file used as cache
+        """
+        self._path = path
 
-    def loop(self):
-        self.run()
+    def update(self, data_file, selected=None, changes=None):
+        """ Merge coverage data of last run into cache.
+
+        Data recorded by tests which ran again and data of changed files are
+        replaced with fresh data; the rest is kept as measured by earlier
+        runs. Whole suite run replaces cache.
+
+        :param data_file: path of coverage data file of last run
+        :param selected: contexts of tests selected for the run; None
+            when whole suite was run
+        :param changes: ChangeSet which caused the run
+        :returns: path of coverage data file of whole suite
+        """
+        if not os.path.exists(data_file):
+            return data_file
+        if selected is None or not os.path.exists(self._path):
+            self._replace(data_file)
+            return self._path
         try:
-            while True:
-                try:
-                    self.file_monitor.wait_for_change()
-                except FileMonitorTimeoutError:
-                    self.notify_observers(None, None, None, None)
-                else:
-                    self.run()
-        except KeyboardInterrupt:
-            pass
+            self._invalidate(data_file, selected, changes)
+            merged = self._merge(data_file)
+        except (sqlite3.Error, ImportError):
+            merged = False
+        if not merged:
+            self._replace(data_file)
+        return self._path
 
+    def _replace(self, data_file):
+        with open(data_file, 'rb') as f:
+            write_file_atomically(self._path, f.read())
 
-def main(*args):
-    """ Run test monitor
+    def _invalidate(self, data_file, selected, changes):
+        connection = sqlite3.connect(data_file)
+        try:
+            contexts = set(row[0] for row in connection.execute('SELECT context FROM context'))
+        finally:
+            connection.close()
+        # code run outside tests (e.g. imports) isn't re-run by each partial
+        # run, so it's dropped only for changed files
+        stale_contexts = (contexts | set(selected)) - set([''])
+        stale_files = set(os.path.abspath(path) for path in changes.paths) if changes else set()
+        deleted_files = set(os.path.abspath(path) for path in changes.deleted) if changes else set()
+        connection = sqlite3.connect(self._path)
+        try:
+            with connection:
+                connection.execute('CREATE TEMP TABLE stale_context (context TEXT)')
+                connection.execute('CREATE TEMP TABLE stale_file (path TEXT)')
+                connection.executemany('INSERT INTO stale_context VALUES (?)', [(c,) for c in stale_contexts])
+                connection.executemany('INSERT INTO stale_file VALUES (?)', [(p,) for p in stale_files])
+                for table in ('line_bits', 'arc'):
+                    connection.execute(
+                        'DELETE FROM %s WHERE '
+                        'context_id IN (SELECT id FROM context WHERE context IN (SELECT context FROM stale_context)) '
+                        'OR file_id IN (SELECT id FROM file WHERE path IN (SELECT path FROM stale_file))' % table)
+                for path in deleted_files:
+                    for table in ('tracer', 'line_bits', 'arc'):
+                        connection.execute('DELETE FROM %s WHERE file_id IN (SELECT id FROM file WHERE path = ?)'
+                                           % table, (path,))
+                    connection.execute('DELETE FROM file WHERE path = ?', (path,))
+        finally:
+            connection.close()
+
+    def _merge(self, data_file):
+        import coverage
+        try:
+            fresh = coverage.CoverageData(basename=data_file)
+            fresh.read()
+            cached = coverage.CoverageData(basename=self._path)
+            cached.read()
+            cached.update(fresh)
+        except coverage.CoverageException:
+            # e.g. cache measured lines and last run branches
+            return False
+        return True
+
+
+class ResultCache(object):
+    """ <<cache>>
+
+    Responsibilities:
+
+        - remember results of test runs by digest of tested tree
+        - forget least recently used results when cache grows too big
     """
-    parser = argparse.ArgumentParser()
-    parser.add_argument('filename')
-    parser.add_argument('-l', '--log', dest='log', type=argparse.FileType('a'))
-    parser.add_argument('-s', '--server', dest='server')
-    parser.add_argument('-n', '--name', dest='name')
+    def __init__(self, path, max_size=64 * 1024 * 1024, key=None):
+        """
+        :param path: directory in which every result is kept in own file
+        :param max_size: maximum bytes taken by results
+        :param key: e.g. test command; results of other key are not returned
+        """
+        self._path = path
+        self._max_size = max_size
+        self._key = key
+
+    def get(self, digest):
+        """ Find result of run of tree with given digest.
+
+        :returns: dict stored by put; None when there is none
+        """
+        path = self._entry_path(digest)
+        try:
+            with open(path, 'rb') as f:
+                entry = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+            # modification time tells which result was used least recently
+            os.utime(path, None)
+        except (IOError, OSError, ValueError, zlib.error):
+            return None
+        return entry
+
+    def put(self, digest, entry):
+        """ Remember result of run of tree with given digest.
+
+        :param entry: JSON serializable dict
+        """
+        data = json.dumps(entry, separators=(',', ':')).encode('utf-8')
+        write_file_atomically(self._entry_path(digest), zlib.compress(data, 1))
+        self._evict()
+
+    def _entry_path(self, digest):
+        name = hashlib.sha1(json.dumps([self._key, digest]).encode('utf-8')).hexdigest()
+        return os.path.join(self._path, name)
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self._path):
+            path = os.path.join(self._path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        size = sum(entry[2] for entry in entries)
+        for mtime, path, entry_size in sorted(entries):
+            if size <= self._max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+
+
+RunLimits = collections.namedtuple('RunLimits', ['timeout', 'memory', 'cpu'])
+# wall-clock seconds, bytes of address space and CPU seconds of every test
+# process; None means no limit
+RunLimits.__new__.__defaults__ = (None, None, None)
+
+
+def apply_resource_limits(limits):
+    """ Limit memory and CPU time of current process and processes it starts.
+
+    Called in test process before tests run (see exec_limited()) or in
+    process forked by fork server. Linux doesn't enforce limit of
+    resident memory, so address space is limited instead.
+
+    :param limits: RunLimits
+    """
+    if resource is None:  # pragma nocover
+        return
+    for name, value in (('RLIMIT_AS', limits.memory), ('RLIMIT_CPU', limits.cpu)):
+        if value is None or not hasattr(resource, name):
+            continue
+        soft, hard = resource.getrlimit(getattr(resource, name))
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        # over soft limit of CPU time process gets SIGXCPU, over hard one SIGKILL
+        resource.setrlimit(getattr(resource, name), (value, value + 1 if name == 'RLIMIT_CPU' else value))
+
+
+def limited_command(command, limits):
+    """ Command running command under memory and CPU time limits.
+
+    Limits are applied by new interpreter, which then replaces itself with
+    command; preexec_fn of Popen isn't safe while other threads run.
+
+    :param command: argv of command
+    :param limits: RunLimits
+    """
+    return python_command('from tddmon.__main__ import exec_limited; exec_limited(%r, %r)' %
+                          (tuple(limits), list(command)))
+
+
+def exec_limited(limits, argv):
+    """ Replace current process with command, applying limits first.
+
+    :param limits: RunLimits or tuple of its fields
+    :param argv: argv of command
+    """
+    apply_resource_limits(RunLimits(*limits))
+    os.execvp(argv[0], argv)
+
+
+class TestRunner(object):
+    """ <<source>>
+
+    Responsibilities:
+
+        - run tests
+        - run only tests affected by changes when impact index is used
+    """
+    COVERAGE_DATA_FILE = '.coverage'
+    # bytes of output of one process kept in memory; the rest goes to temporary file
+    OUTPUT_MEMORY_LIMIT = 1024 * 1024
+
+    def __init__(self, command, impact_index=None, coverage_config=None, coverage_cache=None, import_graph=None,
+                 limits=None):
+        """
+        :param command: test command (e.g. path of test module); selected
+            tests are appended to it as unittest names, so it must accept
+            them like modules calling unittest.main() do
+        :param impact_index: ImpactIndex used to select tests; None runs
+            whole suite every time
+        :param coverage_config: path of coverage configuration written for
+            impact analysis
+        :param coverage_cache: CoverageCache completing coverage of partial
+            runs; None reports coverage of tests which ran only
+        :param import_graph: ImportGraph selecting tests when impact index
+            can't (or there is none)
+        :param limits: RunLimits of every process started by runner; whole
+            process group is killed when it breaks them
+        """
+        self._command = command
+        self._impact_index = impact_index
+        self._coverage_config = coverage_config
+        self._coverage_cache = coverage_cache
+        self._import_graph = import_graph
+        self.limits = limits if limits is not None else RunLimits()
+        # 'timeout' or 'oom' when process of current run broke limits
+        self._limit_exceeded = None
+        # process -> threading.Timer killing it after timeout
+        self._timers = {}
+        # CoverageSummary of last run
+        self.coverage_summary = None
+        # called with numbers of tests ran, failures and errors while tests run
+        self.progress_callback = None
+        self._processes = []
+        self._cancelled = False
+        self._lock = threading.Lock()
+        if impact_index is not None:
+            write_coverage_config(coverage_config)
+
+    def run(self, changes=None, tests=None, measure_coverage=True):
+        """ Run tests with coverage.
+
+        :param changes: ChangeSet which caused the run
+        :param tests: unittest names of tests to run instead of selected ones
+        :param measure_coverage: False runs tests without tracing, which is
+            faster; there is no coverage report then and coverage data
+            (also of impact index and coverage cache) is left as it was
+        :returns: tuple of SpillBuffers with program output and test output
+            with coverage report
+        :raises TestRunCancelled: when cancel() was called meanwhile
+        :raises TestRunLimitExceeded: when test process broke limits
+        """
+        self._cancelled = False
+        self._limit_exceeded = None
+        selected = self._select(changes, tests)
+        command = self._python_argv(measure_coverage) + self._test_argv(selected)
+        program_output, test_output = self._run_command(command, self._progress_stream())
+        self._check_cancelled()
+        self._check_limits(program_output, test_output)
+        if not measure_coverage:
+            self.coverage_summary = None
+            return (program_output, test_output)
+        test_output.write(self._finish(changes, selected))
+        return (program_output, test_output)
+
+    def cancel(self, kill=False):
+        """ Stop run in progress; called from other thread.
+
+        Test processes are run in their own sessions, so processes started
+        by tests are stopped too.
+
+        :param kill: kill processes instead of asking them to terminate
+        """
+        with self._lock:
+            self._cancelled = True
+            for process in self._processes:
+                terminate_process(process, kill)
+
+    def close(self):
+        pass
+
+    def _check_cancelled(self):
+        if self._cancelled:
+            raise TestRunCancelled()
+
+    def _check_limits(self, program_output, test_output):
+        status = self._limit_exceeded
+        if status is None and self.limits.memory is not None and \
+                any(line.startswith('MemoryError') for line in output_lines(test_output)):
+            # allocation refused under address space limit fails test, not whole process
+            status = 'oom'
+        if status is not None:
+            self.coverage_summary = None
+            raise TestRunLimitExceeded(status, (program_output, test_output))
+
+    def _start_timer(self, kill):
+        """ Call kill after timeout of run, unless timer is cancelled earlier. """
+        def expire():
+            with self._lock:
+                if self._cancelled:
+                    return
+                self._limit_exceeded = 'timeout'
+            kill()
+        timer = threading.Timer(self.limits.timeout, expire)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def _note_exit_status(self, returncode):
+        """ Remember limit broken by test process, as told by signal which killed it. """
+        with self._lock:
+            if not self._cancelled and self._limit_exceeded is None:
+                self._limit_exceeded = LIMIT_SIGNALS.get(returncode)
+
+    def _progress_stream(self, reporter=None):
+        """ Make function feeding test output to progress reporting.
+
+        :returns: None when nobody listens to progress
+        """
+        if self.progress_callback is None:
+            return None
+        if reporter is None:
+            reporter = ProgressReporter(self.progress_callback)
+        return reporter.stream()
+
+    def _start_process(self, command, **kwargs):
+        kwargs.update(NEW_SESSION)
+        if resource is not None and (self.limits.memory is not None or self.limits.cpu is not None):
+            command = limited_command(command, self.limits)
+        with self._lock:
+            self._check_cancelled()
+            process = subprocess.Popen(command, **kwargs)
+            self._processes.append(process)
+            if self.limits.timeout is not None:
+                self._timers[process] = self._start_timer(lambda: terminate_process(process, kill=True))
+        return process
+
+    def _forget_process(self, process):
+        with self._lock:
+            self._processes.remove(process)
+            timer = self._timers.pop(process, None)
+        if timer is not None:
+            timer.cancel()
+        self._note_exit_status(process.returncode)
+
+    def _finish(self, changes, selected):
+        """ Record coverage data of finished run and report it.
+
+        :returns: coverage report
+        """
+        if self._impact_index is not None:
+            self._impact_index.update(self.COVERAGE_DATA_FILE, selected)
+        data_file = self.COVERAGE_DATA_FILE
+        if self._coverage_cache is not None:
+            data_file = self._coverage_cache.update(data_file, selected, changes)
+        return self._report(data_file)
+
+    def _report(self, data_file=None):
+        """ Compute coverage of last run and format it like coverage report.
+
+        Numbers are kept in coverage_summary. Without coverage module
+        importable here, coverage report command is run instead (cache
+        can't merge data then, so it only holds copy of last run's data).
+
+        :param data_file: coverage data file; COVERAGE_DATA_FILE by default
+        """
+        try:
+            self.coverage_summary = read_coverage_summary(data_file or self.COVERAGE_DATA_FILE,
+                                                          self._coverage_config_file())
+        except ImportError:
+            self.coverage_summary = None
+            report_output, error_output = self._run_command(coverage_command('report') + self._rcfile())
+            return report_output.getvalue()
+        if self.coverage_summary is None:
+            return ''
+        return self.coverage_summary.format()
+
+    def _coverage_config_file(self):
+        return self._coverage_config if self._impact_index is not None else True
+
+    def _select(self, changes, tests=None):
+        if self._import_graph is not None:
+            # also when impact index selects tests, so graph never keeps stale imports
+            self._import_graph.invalidate(changes)
+        if tests:
+            return list(tests)
+        selected = self._impact_index.select(changes) if self._impact_index is not None else None
+        if selected is None and self._import_graph is not None:
+            selected = self._import_graph.select(changes)
+        return selected
+
+    def _rcfile(self):
+        return ['--rcfile', self._coverage_config] if self._impact_index is not None else []
+
+    def _python_argv(self, measure_coverage=True, parallel=False):
+        """ Command running python script, traced by coverage or not.
+
+        Script runs in interpreter of tddmon either way, like helper commands
+        (see python_command()), not in whatever "python" or "coverage" is
+        first on PATH, so fast and measured runs test the same environment.
+        """
+        if not measure_coverage:
+            return [sys.executable]
+        return coverage_command('run') + (['--parallel-mode'] if parallel else []) + self._rcfile() + [
+            '--branch',
+            '--source', '.',
+        ]
+
+    def _test_argv(self, selected):
+        argv = self._command.split()
+        if selected:
+            argv += [unittest_name_from_context(context) for context in selected]
+        return argv
+
+    def _run_command(self, command, on_output=None):
+        """ Run command and return its output.
+
+        Output is kept in memory only up to OUTPUT_MEMORY_LIMIT, except on
+        Windows, where pipes can't be streamed with select().
+
+        :param on_output: function called with every piece of error output
+            as soon as it's read
+        :returns: tuple of SpillBuffers with standard and error output
+        """
+        process = self._start_process(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            if os.name == 'nt':  # pragma nocover
+                stdoutdata, stderrdata = process.communicate()
+                outputs = (self._output_buffer(), self._output_buffer())
+                outputs[0].write(stdoutdata)
+                outputs[1].write(stderrdata)
+            else:
+                outputs = self._read_output(process, on_output)
+        finally:
+            self._forget_process(process)
+        return outputs
+
+    def _output_buffer(self):
+        return SpillBuffer(self.OUTPUT_MEMORY_LIMIT)
+
+    def _read_output(self, process, on_output):
+        buffers = {process.stdout: self._output_buffer(), process.stderr: self._output_buffer()}
+        pipes = list(buffers)
+        while pipes:
+            readable, _, _ = select.select(pipes, [], [])
+            for pipe in readable:
+                data = os.read(pipe.fileno(), 64 * 1024)
+                if not data:
+                    pipes.remove(pipe)
+                    pipe.close()
+                    continue
+                buffers[pipe].write(data)
+                if pipe is process.stderr and on_output is not None:
+                    on_output(data)
+        process.wait()
+        return buffers[process.stdout], buffers[process.stderr]
+
+
+class TestProgressParser(object):
+    """ <<filter>>
+
+    Responsibilities:
+
+        - count results of tests in unittest output as it comes
+    """
+    # unittest prints one character per test, or "... result" lines with -v
+    RESULT_CHARS = '.FEsxu'
+    SEPARATORS = ('=' * 70, '-' * 70)
+
+    def __init__(self):
+        self.ran = 0
+        self.failures = 0
+        self.errors = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self._line = ''
+        # characters of current line already counted
+        self._counted = 0
+        # summary of run has started
+        self._done = False
+        self._progress_re = re.compile('^[%s]*(?![A-Za-z])' % re.escape(self.RESULT_CHARS))
+        self._verbose_re = re.compile(
+            r'\.\.\. (ok|FAIL|ERROR|skipped|expected failure|unexpected success)')
+
+    def feed(self, data):
+        """ Count test results in next piece of output.
+
+        :param data: bytes
+        :returns: True when numbers have changed
+        """
+        before = (self.ran, self.failures, self.errors)
+        lines = (self._line + self._decoder.decode(data)).split('\n')
+        self._line = lines.pop()
+        for line in lines:
+            self._count_progress(line)
+            self._count_verbose(line)
+            self._counted = 0
+        self._count_progress(self._line)
+        return before != (self.ran, self.failures, self.errors)
+
+    def _count_progress(self, line):
+        if self._done:
+            return
+        if line.startswith(self.SEPARATORS) or line.startswith('Ran '):
+            self._done = True
+            return
+        match = self._progress_re.match(line)
+        if match is None or match.end() <= self._counted:
+            return
+        for char in line[self._counted:match.end()]:
+            self._count(char)
+        self._counted = match.end()
+
+    def _count_verbose(self, line):
+        if self._done:
+            return
+        match = self._verbose_re.search(line)
+        if match:
+            self._count({'FAIL': 'F', 'ERROR': 'E'}.get(match.group(1), '.'))
+
+    def _count(self, char):
+        self.ran += 1
+        if char == 'F':
+            self.failures += 1
+        elif char == 'E':
+            self.errors += 1
+
+
+class ProgressReporter(object):
+    """ <<filter>>
+
+    Responsibilities:
+
+        - sum progress of test processes
+        - report it at most every interval, but new failure at once
+    """
+    def __init__(self, callback, interval=0.1):
+        """
+        :param callback: called with numbers of tests ran, failures and errors
+        :param interval: minimal seconds between reports
+        """
+        self._callback = callback
+        self._interval = interval
+        self._parsers = []
+        self._reported = None
+        self._reported_at = 0
+
+    def stream(self):
+        """ Make function counting progress of one more test process. """
+        parser = TestProgressParser()
+        self._parsers.append(parser)
+
+        def feed(data):
+            if parser.feed(data):
+                self._report()
+        return feed
+
+    def _report(self):
+        progress = (
+            sum(parser.ran for parser in self._parsers),
+            sum(parser.failures for parser in self._parsers),
+            sum(parser.errors for parser in self._parsers),
+        )
+        now = time.time()
+        failed = self._reported is None or sum(progress[1:]) > sum(self._reported[1:])
+        if failed or now - self._reported_at >= self._interval:
+            self._reported = progress
+            self._reported_at = now
+            self._callback(*progress)
+
+
+class TestRunCancelled(Exception):
+    """ Test run was cancelled before it ended. """
+
+    def __init__(self, changes=None):
+        """
+        :param changes: ChangeSet which caused cancelling
+        """
+        super(TestRunCancelled, self).__init__(changes)
+        self.changes = changes
+
+
+class TestRunLimitExceeded(Exception):
+    """ Test process broke limits of run and was stopped or failed. """
+
+    def __init__(self, status, outputs=()):
+        """
+        :param status: 'timeout' or 'oom'
+        :param outputs: program output and test output written until then
+        """
+        super(TestRunLimitExceeded, self).__init__(status)
+        self.status = status
+        self.outputs = tuple(outputs)
+
+    def __str__(self):
+        return 'test run stopped: %s' % self.status
+
+
+def terminate_process(process, kill=False):
+    """ Stop process with all processes in its process group. """
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, signal.SIGKILL if kill else signal.SIGTERM)
+        elif kill:  # pragma nocover
+            process.kill()
+        else:  # pragma nocover
+            process.terminate()
+    except OSError:
+        # already ended
+        pass
+
+
+CoverageNumbers = collections.namedtuple('CoverageNumbers', [
+    'statements', 'missing', 'branches', 'partial_branches', 'percent',
+])
+
+
+def display_percent(percent):
+    """ Round coverage percent the way coverage report does.
+
+    Only full coverage is shown as 100% and only none as 0%.
+    """
+    rounded = int(round(percent))
+    if rounded == 100 and percent < 100:
+        return 99
+    if rounded == 0 and percent > 0:
+        return 1
+    return rounded
+
+
+class CoverageSummary(object):
+    """ Coverage numbers of measured files and their totals. """
+
+    def __init__(self, files, totals):
+        """
+        :param files: dict mapping path to CoverageNumbers
+        :param totals: CoverageNumbers of all files
+        """
+        self.files = files
+        self.totals = totals
+
+    @classmethod
+    def from_json_report(cls, data):
+        """ Make summary from data of coverage JSON report. """
+        def numbers(summary):
+            return CoverageNumbers(summary['num_statements'], summary['missing_lines'],
+                                   summary.get('num_branches', 0), summary.get('num_partial_branches', 0),
+                                   summary['percent_covered'])
+        files = dict((path, numbers(report['summary'])) for path, report in data['files'].items())
+        return cls(files, numbers(data['totals']))
+
+    def dump(self):
+        """ Return summary as JSON serializable dict. """
+        return {
+            'files': dict((path, list(numbers)) for path, numbers in self.files.items()),
+            'totals': list(self.totals),
+        }
+
+    @classmethod
+    def load(cls, data):
+        """ Make summary from dict returned by dump. """
+        files = dict((path, CoverageNumbers(*numbers)) for path, numbers in data['files'].items())
+        return cls(files, CoverageNumbers(*data['totals']))
+
+    @property
+    def percent(self):
+        """ Total coverage percent as shown by coverage report. """
+        return display_percent(self.totals.percent)
+
+    def format(self):
+        """ Format summary like coverage report with branches does. """
+        width = max([len(path) for path in self.files] + [len('TOTAL')])
+        header = '%-*s %6s %6s %6s %6s %6s' % (width, 'Name', 'Stmts', 'Miss', 'Branch', 'BrPart', 'Cover')
+        rule = '-' * len(header)
+        lines = [header, rule]
+        for path in sorted(self.files):
+            lines.append(self._format_numbers(width, path, self.files[path]))
+        lines.extend([rule, self._format_numbers(width, 'TOTAL', self.totals)])
+        return '\n'.join(lines) + '\n'
+
+    def _format_numbers(self, width, name, numbers):
+        return '%-*s %6d %6d %6d %6d %5d%%' % (width, name, numbers.statements, numbers.missing, numbers.branches,
+                                              numbers.partial_branches, display_percent(numbers.percent))
+
+
+def read_coverage_summary(data_file, config_file=True):
+    """ Compute coverage of files measured in data file.
+
+    Coverage module is imported here, so ImportError is raised when it's
+    not installed alongside tddmon.
+
+    :param data_file: path of coverage data file
+    :param config_file: coverage configuration file; True for default
+    :returns: CoverageSummary; None when there is no data or it can't be
+        read (e.g. written by other version of coverage)
+    """
+    import coverage
+    cov = coverage.Coverage(data_file=data_file, config_file=config_file)
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        cov.load()
+        cov.json_report(outfile=path)
+        with open(path) as f:
+            data = json.load(f)
+    except coverage.CoverageException:
+        return None
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return CoverageSummary.from_json_report(data)
+
+
+class ForkServerTestRunner(TestRunner):
+    """ <<source>>
+
+    Responsibilities:
+
+        - keep server process with third-party modules already imported
+        - run tests in child forked from server, so only project modules
+          are imported on every run
+
+    Modules imported by tests from outside project directory are preloaded
+    by server after every run. Server is restarted when one of them
+    changes.
+    """
+    def __init__(self, command, impact_index=None, coverage_config=None, coverage_cache=None, import_graph=None,
+                 limits=None, preload=()):
+        """
+        :param preload: names of modules to import when server starts
+        """
+        super(ForkServerTestRunner, self).__init__(command, impact_index=impact_index,
+                                                   coverage_config=coverage_config, coverage_cache=coverage_cache,
+                                                   import_graph=import_graph, limits=limits)
+        self._preload = list(preload)
+        self._preloaded_files = set()
+        self._server = None
+        self._child_pid = None
+        self._output_dir = tempfile.mkdtemp(prefix='tddmon-')
+
+    def run(self, changes=None, tests=None, measure_coverage=True):
+        if changes and self._preloaded_files.intersection(os.path.abspath(path) for path in changes.paths):
+            self._stop_server()
+        if self._server is None:
+            self._start_server()
+        self._cancelled = False
+        self._limit_exceeded = None
+        selected = self._select(changes, tests)
+        request = {
+            'argv': self._test_argv(selected),
+            'stdout': os.path.join(self._output_dir, 'stdout'),
+            'stderr': os.path.join(self._output_dir, 'stderr'),
+            'data_file': self.COVERAGE_DATA_FILE,
+            'config_file': self._coverage_config_file(),
+            'coverage': measure_coverage,
+            'limits': {'memory': self.limits.memory, 'cpu': self.limits.cpu},
+        }
+        for path in (request['stdout'], request['stderr']):
+            open(path, 'wb').close()
+        on_output = self._progress_stream()
+        timer = None
+        try:
+            with open(request['stderr'], 'rb') as test_output:
+                self._server.stdin.write((json.dumps(request) + '\n').encode('utf-8'))
+                self._server.stdin.flush()
+                started = self._server.stdout.readline()
+                if started:
+                    self._child_pid = json.loads(started.decode('utf-8'))['pid']
+                    if self.limits.timeout is not None:
+                        timer = self._start_timer(lambda: self._signal_child(signal.SIGKILL))
+                    response = self._read_response(test_output, on_output)
+                else:
+                    response = b''
+        except (IOError, OSError):
+            response = b''
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self._child_pid = None
+        self._check_cancelled()
+        if not response:
+            # server died; run tests the usual way and start it again next time
+            self._stop_server()
+            return super(ForkServerTestRunner, self).run(changes, tests, measure_coverage)
+        response = json.loads(response.decode('utf-8'))
+        self._preloaded_files.update(response['preload'])
+        if response.get('signal'):
+            self._note_exit_status(-response['signal'])
+        program_output, test_output = self._output_buffer(), self._output_buffer()
+        with open(request['stdout'], 'rb') as f:
+            program_output.read_from(f)
+        with open(request['stderr'], 'rb') as f:
+            test_output.read_from(f)
+        self._check_limits(program_output, test_output)
+        if not measure_coverage:
+            self.coverage_summary = None
+            return (program_output, test_output)
+        test_output.write(self._finish(changes, selected))
+        return (program_output, test_output)
+
+    def _read_response(self, test_output, on_output):
+        """ Read response of server, feeding test output written meanwhile to on_output. """
+        while on_output is not None and not select.select([self._server.stdout], [], [], 0.1)[0]:
+            on_output(test_output.read())
+        return self._server.stdout.readline()
+
+    def cancel(self, kill=False):
+        super(ForkServerTestRunner, self).cancel(kill)
+        self._signal_child(signal.SIGKILL if kill else signal.SIGTERM)
+
+    def _signal_child(self, signum):
+        """ Send signal to process group of forked test process, if tests run. """
+        child_pid = self._child_pid
+        if child_pid is not None:
+            try:
+                os.killpg(child_pid, signum)
+            except OSError:
+                pass
+
+    def close(self):
+        self._stop_server()
+        shutil.rmtree(self._output_dir, ignore_errors=True)
+
+    def _start_server(self):
+        command = python_command('from tddmon.__main__ import serve_forks; serve_forks(%r)' % self._preload)
+        # unbuffered, so select() tells whether response has come
+        self._server = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        self._preloaded_files = set()
+
+    def _stop_server(self):
+        if self._server is None:
+            return
+        try:
+            self._server.stdin.close()
+        except (IOError, OSError):
+            pass
+        self._server.wait()
+        self._server = None
+
+
+class ParallelTestRunner(TestRunner):
+    """ <<source>>
+
+    Responsibilities:
+
+        - split tests into shards of similar duration
+        - run shards in parallel and merge their results and coverage
+    """
+    def __init__(self, command, impact_index=None, coverage_config=None, coverage_cache=None, import_graph=None,
+                 limits=None, jobs=2, durations=None):
+        """
+        :param jobs: number of test processes run at once
+        :param durations: TestDurations used to balance shards
+        """
+        super(ParallelTestRunner, self).__init__(command, impact_index=impact_index,
+                                                 coverage_config=coverage_config, coverage_cache=coverage_cache,
+                                                 import_graph=import_graph, limits=limits)
+        self._jobs = jobs
+        self._durations = durations if durations is not None else TestDurations()
+
+    def run(self, changes=None, tests=None, measure_coverage=True):
+        self._cancelled = False
+        self._limit_exceeded = None
+        selected = self._select(changes, tests)
+        if selected:
+            names = [unittest_name_from_context(context) for context in selected]
+        else:
+            names = self._list_tests()
+        if not names:
+            # tests can't be listed (e.g. "-m" command); run them at once
+            return super(ParallelTestRunner, self).run(changes, tests, measure_coverage)
+        if measure_coverage:
+            for path in glob.glob(self.COVERAGE_DATA_FILE + '.*'):
+                os.remove(path)
+        started = time.time()
+        shards = split_into_shards(names, self._jobs, self._durations)
+        reporter = ProgressReporter(self.progress_callback) if self.progress_callback is not None else None
+        workers = [self._start_worker(shard, self._progress_stream(reporter), measure_coverage) for shard in shards]
+        self._wait_for_workers(workers, started)
+        self._check_cancelled()
+        self._durations.save()
+        program_output = self._output_buffer()
+        for worker in workers:
+            program_output.read_from(worker['stdout'])
+            worker['stdout'].close()
+        test_output = merge_test_outputs([(worker['stderr'], worker['returncode']) for worker in workers],
+                                         time.time() - started, self._output_buffer())
+        self._check_limits(program_output, test_output)
+        if not measure_coverage:
+            self.coverage_summary = None
+            return (program_output, test_output)
+        self._combine()
+        test_output.write(self._finish(changes, selected))
+        return (program_output, test_output)
+
+    def _combine(self):
+        try:
+            import coverage
+        except ImportError:
+            self._run_command(coverage_command('combine') + self._rcfile())
+            return
+        cov = coverage.Coverage(data_file=self.COVERAGE_DATA_FILE, config_file=self._coverage_config_file())
+        try:
+            cov.combine()
+        except coverage.CoverageException:
+            # no data written by workers
+            return
+        cov.save()
+
+    def _list_tests(self):
+        argv = self._command.split()
+        command = python_command('from tddmon.__main__ import list_test_names; list_test_names(%r)' % argv[0])
+        output, error_output = self._run_command(command)
+        try:
+            return json.loads(output.getvalue())
+        except ValueError:
+            return None
+
+    def _start_worker(self, shard, on_output=None, measure_coverage=True):
+        command = self._python_argv(measure_coverage, parallel=True) + self._command.split() + shard
+        stdout = tempfile.TemporaryFile()
+        # error output is read by own file object while worker writes it
+        fd, stderr_path = tempfile.mkstemp(prefix='tddmon-')
+        try:
+            with os.fdopen(fd, 'wb') as stderr:
+                process = self._start_process(command, stdout=stdout, stderr=stderr)
+            test_output = open(stderr_path, 'rb')
+        finally:
+            try:
+                os.remove(stderr_path)
+            except OSError:  # pragma nocover
+                # open files can't be removed on Windows
+                pass
+        return {'shard': shard, 'process': process, 'stdout': stdout, 'test_output': test_output,
+                'on_output': on_output, 'stderr': self._output_buffer()}
+
+    def _wait_for_workers(self, workers, started):
+        pending = list(workers)
+        while pending:
+            for worker in list(pending):
+                returncode = worker['process'].poll()
+                data = worker['test_output'].read()
+                worker['stderr'].write(data)
+                if data and worker['on_output'] is not None:
+                    worker['on_output'](data)
+                if returncode is None:
+                    continue
+                pending.remove(worker)
+                self._forget_process(worker['process'])
+                if not self._cancelled:
+                    self._durations.record(worker['shard'], time.time() - started)
+                worker['returncode'] = returncode
+                worker['stderr'].read_from(worker['test_output'])
+                worker['test_output'].close()
+                worker['stdout'].seek(0)
+            if pending:
+                time.sleep(0.01)
+
+
+class TestDurations(object):
+    """ <<index>>
+
+    Responsibilities:
+
+        - remember how long tests took in previous runs
+    """
+    DEFAULT_DURATION = 1.0
+
+    def __init__(self, path=None):
+        """
+        :param path: path of file in which durations are kept between runs
+        """
+        self._path = path
+        # unittest name -> seconds
+        self._durations = {}
+        if path is not None:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self._path, 'rb') as f:
+                self._durations = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+        except (IOError, OSError, ValueError, zlib.error):
+            pass
+
+    def save(self):
+        if self._path is None:
+            return
+        data = json.dumps(self._durations, separators=(',', ':')).encode('utf-8')
+        write_file_atomically(self._path, zlib.compress(data, 1))
+
+    def estimate(self, name):
+        """ Expected duration of test; average of known tests for new one. """
+        if name in self._durations:
+            return self._durations[name]
+        if self._durations:
+            return sum(self._durations.values()) / len(self._durations)
+        return self.DEFAULT_DURATION
+
+    def record(self, names, seconds):
+        """ Record duration of tests run together in one process.
+
+        Time is split evenly, as unittest doesn't report time of every test.
+        """
+        for name in names:
+            self._durations[name] = seconds / len(names)
+
+
+def split_into_shards(names, jobs, durations):
+    """ Split tests into at most jobs shards of similar expected duration.
+
+    Tests of one test case stay in one shard, so its class fixtures run once.
+
+    :param names: unittest names of tests
+    :param durations: TestDurations
+    :returns: list of lists of names
+    """
+    groups = {}
+    for name in names:
+        groups.setdefault(name.rsplit('.', 1)[0], []).append(name)
+    groups = [(sum(durations.estimate(name) for name in tests), tests) for tests in groups.values()]
+    # longest first, each to least loaded shard
+    groups.sort(key=lambda group: (-group[0], group[1]))
+    shards = [[] for i in range(min(jobs, len(groups)))]
+    totals = [0.0] * len(shards)
+    for duration, tests in groups:
+        index = totals.index(min(totals))
+        shards[index].extend(tests)
+        totals[index] += duration
+    return shards
+
+
+def merge_test_outputs(outputs, elapsed, merged=None):
+    """ Merge outputs of unittest processes into one ending with summary.
+
+    Process which failed without reporting failures (e.g. import error)
+    counts as one error.
+
+    :param outputs: list of tuples of test output (text or SpillBuffer) and
+        exit status
+    :param elapsed: seconds spent on all tests
+    :param merged: SpillBuffer to which outputs are written; new one by default
+    :returns: SpillBuffer
+    """
+    parser = TestResultParser()
+    ran = failures = errors = 0
+    for output, returncode in outputs:
+        shard_ran, shard_failures, shard_errors, coverage = parser.parse(output)
+        if returncode and not shard_failures and not shard_errors:
+            shard_errors = 1
+        ran += shard_ran
+        failures += shard_failures
+        errors += shard_errors
+    if failures or errors:
+        counts = [('failures', failures), ('errors', errors)]
+        status = 'FAILED (%s)' % ', '.join('%s=%d' % count for count in counts if count[1])
+    else:
+        status = 'OK'
+    summary = '%s\nRan %d test%s in %.3fs\n\n%s\n' % ('-' * 70, ran, '' if ran == 1 else 's', elapsed, status)
+    merged = merged if merged is not None else SpillBuffer()
+    for output, returncode in outputs:
+        for chunk in output_chunks(output):
+            merged.write(chunk)
+    merged.write(summary)
+    return merged
+
+
+def list_test_names(path):
+    """ Print JSON list of unittest names of tests in test script.
+
+    Run in separate process by ParallelTestRunner. Names are relative to
+    script, the way unittest.main() inside it accepts them.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    namespace = runpy.run_path(path, run_name='__tddmon_tests__')
+    loader = unittest.TestLoader()
+    names = []
+    for name, obj in sorted(namespace.items()):
+        if isinstance(obj, type) and issubclass(obj, unittest.TestCase):
+            names.extend('%s.%s' % (name, method) for method in loader.getTestCaseNames(obj))
+    sys.stdout.write(json.dumps(names))
+
+
+def python_command(code):
+    """ Command running code in new interpreter able to import tddmon. """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return [sys.executable, '-c', 'import sys; sys.path.append(%r); %s' % (package_dir, code)]
+
+
+def coverage_command(*args):
+    """ Command running coverage in interpreter of tddmon. """
+    return [sys.executable, '-m', 'coverage'] + list(args)
+
+
+class SpillBuffer(object):
+    """ <<buffer>>
+
+    Responsibilities:
+
+        - hold output of test process in memory up to limit and in
+          temporary file above it
+        - give it back piece by piece as native strings
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, max_memory=1024 * 1024):
+        """
+        :param max_memory: bytes kept in memory before output is moved to
+            temporary file
+        """
+        self.max_memory = max_memory
+        self.spilled = False
+        self._file = io.BytesIO()
+        self._size = 0
+
+    def write(self, data):
+        """
+        :param data: bytes, or text which is encoded as UTF-8
+        """
+        if isinstance(data, six.text_type):
+            data = data.encode('utf-8')
+        if not self.spilled and self._size + len(data) > self.max_memory:
+            spill = tempfile.TemporaryFile(prefix='tddmon-')
+            spill.write(self._file.getvalue())
+            self._file = spill
+            self.spilled = True
+        # reading moves position
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(data)
+        self._size += len(data)
+
+    def read_from(self, f):
+        """ Append rest of file object piece by piece. """
+        while True:
+            data = f.read(self.CHUNK_SIZE)
+            if not data:
+                return
+            self.write(data)
+
+    def chunks(self):
+        """ Native strings read piece by piece; on Python 3 decoded from UTF-8. """
+        decoder = codecs.getincrementaldecoder('utf-8')('replace') if six.PY3 else None
+        offset = 0
+        while offset < self._size:
+            self._file.seek(offset)
+            data = self._file.read(self.CHUNK_SIZE)
+            offset += len(data)
+            yield decoder.decode(data, offset >= self._size) if decoder is not None else data
+
+    def getvalue(self):
+        """ Whole output as native string; use only for small outputs. """
+        return ''.join(self.chunks())
+
+    def close(self):
+        self._file.close()
+
+    def __len__(self):
+        return self._size
+
+
+def output_chunks(output):
+    """ Pieces of output given as native string or SpillBuffer. """
+    if isinstance(output, SpillBuffer):
+        return output.chunks()
+    return [output]
+
+
+def output_lines(*outputs):
+    """ Lines (without line ends) of outputs joined together, read piece by piece. """
+    rest = ''
+    for output in outputs:
+        for chunk in output_chunks(output):
+            lines = (rest + chunk).splitlines(True)
+            # line end may still come, '\r' can be followed by '\n'
+            rest = lines.pop() if lines and not lines[-1].endswith('\n') else ''
+            for line in lines:
+                yield line.splitlines()[0]
+    if rest:
+        for line in rest.splitlines():
+            yield line
+
+
+def is_project_module(module, project_dir):
+    """ Tell whether module was imported from project directory.
+
+    Modules installed inside project directory (e.g. in virtualenv) don't
+    count.
+    """
+    filename = getattr(module, '__file__', None)
+    if not filename:
+        return False
+    filename = os.path.realpath(filename)
+    if not filename.startswith(project_dir + os.sep):
+        return False
+    parts = filename.split(os.sep)
+    return 'site-packages' not in parts and 'dist-packages' not in parts
+
+
+def serve_forks(preload=(), requests=None, responses=None):
+    """ Serve test runs of ForkServerTestRunner.
+
+    Every request (JSON line) is run in forked child in its own process
+    group; its pid is sent before response, so it can be stopped. Modules imported by
+    tests from outside project are imported by server after response is
+    sent, so next children get them for free.
+
+    :param preload: names of modules to import before first request
+    :param requests: binary file with requests; stdin by default
+    :param responses: binary file for responses; stdout by default
+    """
+    if requests is None:
+        requests = os.fdopen(os.dup(0), 'rb')
+    if responses is None:
+        responses = os.fdopen(os.dup(1), 'wb')
+    # nothing imported by server may write to responses
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1):
+        os.dup2(devnull, fd)
+    os.close(devnull)
+    # project modules are imported only by children
+    if sys.path and sys.path[0] in ('', os.getcwd()):
+        del sys.path[0]
+    _import_modules(['coverage'] + list(preload))
+    for line in iter(requests.readline, b''):
+        request = json.loads(line.decode('utf-8'))
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma nocover
+            status = 1
+            try:
+                os.setpgid(0, 0)
+                os.close(read_fd)
+                requests.close()
+                responses.close()
+                status = run_forked_tests(request, write_fd)
+            finally:
+                os._exit(status)
+        try:
+            os.setpgid(pid, pid)
+        except OSError:
+            # child did it already
+            pass
+        responses.write((json.dumps({'pid': pid}) + '\n').encode('utf-8'))
+        responses.flush()
+        os.close(write_fd)
+        with os.fdopen(read_fd, 'rb') as f:
+            modules = json.loads(f.read().decode('utf-8') or '[]')
+        _, status = os.waitpid(pid, 0)
+        response = {
+            'preload': [filename for name, filename in modules],
+            'signal': os.WTERMSIG(status) if os.WIFSIGNALED(status) else None,
+        }
+        responses.write((json.dumps(response) + '\n').encode('utf-8'))
+        responses.flush()
+        _import_modules(name for name, filename in modules)
+
+
+def _import_modules(names):
+    for name in names:
+        if name in sys.modules:
+            continue
+        try:
+            importlib.import_module(name)
+        except Exception:
+            # e.g. module needing configuration done by tests
+            pass
+
+
+def run_forked_tests(request, modules_fd):
+    """ Run tests with coverage in process forked by fork server.
+
+    Coverage report is made by ForkServerTestRunner. Writes modules imported from outside project to modules_fd as JSON.
+
+    :param request: dict with test argv, output paths and coverage settings
+    :returns: exit status
+    """
+    import coverage
+    if request.get('limits'):
+        apply_resource_limits(RunLimits(**request['limits']))
+    for fd, path in ((1, request['stdout']), (2, request['stderr'])):
+        output = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.dup2(output, fd)
+        os.close(output)
+    project_dir = os.path.realpath(os.getcwd())
+    known_modules = set(sys.modules)
+    argv = request['argv']
+    cov = None
+    if request.get('coverage', True):
+        cov = coverage.Coverage(data_file=request['data_file'], config_file=request['config_file'],
+                                branch=True, source=['.'])
+    status = 0
+    if cov is not None:
+        cov.start()
+    try:
+        if argv[0] == '-m':
+            sys.argv = argv[1:]
+            sys.path.insert(0, os.getcwd())
+            runpy.run_module(argv[1], run_name='__main__', alter_sys=True)
+        else:
+            sys.argv = argv
+            sys.path.insert(0, os.path.dirname(os.path.abspath(argv[0])))
+            runpy.run_path(argv[0], run_name='__main__')
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else int(e.code is not None)
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        if cov is not None:
+            cov.stop()
+            cov.save()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    modules = [
+        (name, os.path.realpath(module.__file__))
+        for name, module in list(sys.modules.items())
+        if name not in known_modules and name != '__main__' and getattr(module, '__file__', None) and
+        not is_project_module(module, project_dir)
+    ]
+    with os.fdopen(modules_fd, 'wb') as f:
+        f.write(json.dumps(modules).encode('utf-8'))
+    return status
+
+
+def check_syntax(paths):
+    """ Compile Python files in this process to find syntax errors.
+
+    :param paths: paths of files; other than .py files and files which
+        don't exist are skipped
+    :returns: list of SyntaxError (IndentationError, ...) sorted by path
+    """
+    paths = sorted(path for path in paths if path.endswith('.py') and os.path.isfile(path))
+    results = [_compile_file(path) for path in paths]
+    return [error for error in results if error is not None]
+
+
+def _compile_file(path):
+    try:
+        with open(path, 'rb') as f:
+            source = f.read()
+    except (IOError, OSError):
+        # removed meanwhile
+        return None
+    try:
+        compile(source, path, 'exec', dont_inherit=True)
+    except SyntaxError as e:
+        return e
+    except ValueError as e:
+        # null bytes on older Pythons
+        return SyntaxError(str(e), (path, None, None, None))
+    return None
+
+
+def format_syntax_error(error):
+    """ Location and message of syntax error in one line, e.g. for status display. """
+    if error.lineno is None:
+        return '%s: %s' % (error.filename, error.msg)
+    return '%s:%d: %s' % (error.filename, error.lineno, error.msg)
+
+
+class TestResultParser(object):
+    """ <<filter>>
+
+    Responsibilities:
+
+        - parse test result
+    """
+
+    def parse(self, input_data):
+        """ Find numbers of tests ran, failures and errors and total coverage.
+
+        Output is read in one pass; last summary in it counts.
+
+        :param input_data: unittest output as text or SpillBuffer
+        """
+        ran_re = re.compile(r'^Ran (\d+)')
+        error_re = re.compile(r'^(?:OK|FAILED)(?:\s*\((?:failures=(\d+))?(?:,\s*)?(?:errors=(\d+))?)')
+        total_re = re.compile(r'^[^\s]+\s*\d+\s*\d+\s*\d+\s*\d+\s*(\d+)%')
+        ran = failures = errors = coverage = 0
+        for line in output_lines(input_data):
+            # cheap checks first, as most lines of verbose output match nothing
+            if line.startswith('Ran '):
+                match = ran_re.search(line)
+                if match:
+                    ran = int(match.group(1) or 0)
+            elif line.startswith(('OK', 'FAILED')):
+                match = error_re.search(line)
+                if match:
+                    failures = int(match.group(1) or 0)
+                    errors = int(match.group(2) or 0)
+            elif '%' in line:
+                match = total_re.search(line)
+                if match:
+                    coverage = int(match.group(1) or 0)
+        return (ran, failures, errors, coverage)
+
+    def failed_tests(self, input_data):
+        """ Find unittest names of tests which failed or raised error.
+
+        Failing class fixture gives name of whole test case.
+
+        :param input_data: unittest output as text or SpillBuffer
+        :returns: list of names in order of appearance
+        """
+        failed_re = re.compile(r'^(?:FAIL|ERROR): (\S+) \(([^)\s]+)\)')
+        names = []
+        for line in output_lines(input_data):
+            if not line.startswith(('FAIL', 'ERROR')):
+                continue
+            match = failed_re.search(line)
+            if not match:
+                continue
+            method, name = match.groups()
+            if method in ('setUpModule', 'tearDownModule'):
+                continue
+            if not name.endswith('.' + method) and method not in ('setUpClass', 'tearDownClass'):
+                name = '%s.%s' % (name, method)
+            name = unittest_name_from_context(name)
+            if name not in names:
+                names.append(name)
+        return names
+
+
+class FileMonitorTimeoutError(Exception):
+    pass
+
+
+class ChangeSet(object):
+    """ <<value>>
+
+    Responsibilities:
+
+        - hold paths of added, modified and deleted files
+    """
+    def __init__(self, added=(), modified=(), deleted=(), unknown=False):
+        """
+        :param added: paths of new files
+        :param modified: paths of changed files
+        :param deleted: paths of removed files
+        :param unknown: changes were lost (e.g. event queue overflow)
+            and anything could have changed
+        """
+        self.added = set(added)
+        self.modified = set(modified)
+        self.deleted = set(deleted)
+        self.unknown = unknown
+
+    @property
+    def paths(self):
+        return self.added | self.modified | self.deleted
+
+    def add(self, path):
+        if path in self.deleted:
+            self.deleted.discard(path)
+            self.modified.add(path)
+        else:
+            self.added.add(path)
+
+    def modify(self, path):
+        if path not in self.added:
+            self.modified.add(path)
+
+    def delete(self, path):
+        if path in self.added:
+            self.added.discard(path)
+        else:
+            self.modified.discard(path)
+            self.deleted.add(path)
+
+    def update(self, other):
+        """ Merge later changes into this change set.
+
+        :param other: ChangeSet
+        """
+        for path in other.deleted:
+            self.delete(path)
+        for path in other.added:
+            self.add(path)
+        for path in other.modified:
+            self.modify(path)
+        self.unknown = self.unknown or other.unknown
+
+    def __bool__(self):
+        return self.unknown or bool(self.added or self.modified or self.deleted)
+    __nonzero__ = __bool__
+
+    def __len__(self):
+        return len(self.added) + len(self.modified) + len(self.deleted)
+
+    def __eq__(self, other):
+        if not isinstance(other, ChangeSet):
+            return NotImplemented
+        return ((self.added, self.modified, self.deleted, self.unknown) ==
+                (other.added, other.modified, other.deleted, other.unknown))
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __repr__(self):
+        return 'ChangeSet(added=%r, modified=%r, deleted=%r, unknown=%r)' % (
+            sorted(self.added), sorted(self.modified), sorted(self.deleted), self.unknown)
+
+
+class IgnoreRules(object):
+    """ <<filter>>
+
+    Responsibilities:
+
+        - decide which paths are excluded from monitoring using
+          .gitignore-style patterns
+
+    Supported syntax: comments, blank lines, ``!`` negation, trailing ``/``
+    for directories only, leading or inner ``/`` anchoring pattern to root,
+    ``*``, ``?``, ``[...]`` and ``**``. Only .gitignore from monitored root
+    is read.
+    """
+    def __init__(self, patterns=()):
+        """
+        :param patterns: list of .gitignore-style patterns
+        """
+        self.patterns = list(patterns)
+        self._rules = []
+        for pattern in patterns:
+            rule = self._compile(pattern)
+            if rule is not None:
+                self._rules.append(rule)
+        # without negations first matching rule decides, so all of them
+        # can be checked with one regular expression
+        if not any(negate for regex, negate, dir_only in self._rules):
+            self._file_re = self._combine([regex for regex, negate, dir_only in self._rules if not dir_only])
+            self._dir_re = self._combine([regex for regex, negate, dir_only in self._rules])
+        else:
+            self._file_re = self._dir_re = None
+
+    @classmethod
+    def from_gitignore(cls, root='.', patterns=DEFAULT_IGNORE_PATTERNS, filename='.gitignore'):
+        """ Build rules from default patterns and .gitignore in root.
+
+        :param root: monitored directory
+        :param patterns: patterns applied before those read from file
+        :param filename: name of file with patterns
+        """
+        patterns = list(patterns)
+        try:
+            with open(os.path.join(root, filename)) as f:
+                patterns.extend(f.read().splitlines())
+        except (IOError, OSError):
+            pass
+        return cls(patterns)
+
+    def is_ignored(self, path, is_dir=False, parents=True):
+        """ Check if path should not be monitored.
+
+        Like in .gitignore, path inside ignored directory is ignored too.
+
+        :param path: path relative to monitored root
+        :param is_dir: whether path is a directory
+        :param parents: check parent directories too; walks skipping
+            ignored directories don't need it
+        """
+        path = self._normalize(path)
+        if parents:
+            parts = path.split('/')
+            for i in range(1, len(parts)):
+                if self._matches('/'.join(parts[:i]), True):
+                    return True
+        return self._matches(path, is_dir)
+
+    def _matches(self, path, is_dir):
+        if self._dir_re is not None:
+            regex = self._dir_re if is_dir else self._file_re
+            return regex is not None and regex.match(path) is not None
+        for regex, negate, dir_only in reversed(self._rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(path):
+                return not negate
+        return False
+
+    def _normalize(self, path):
+        path = path.replace(os.sep, '/')
+        while path.startswith('./'):
+            path = path[2:]
+        return path
+
+    def _combine(self, regexes):
+        if not regexes:
+            return None
+        return re.compile('|'.join('(?:%s)' % regex.pattern for regex in regexes))
+
+    def _compile(self, pattern):
+        pattern = pattern.rstrip()
+        if not pattern or pattern.startswith('#'):
+            return None
+        negate = pattern.startswith('!')
+        if negate:
+            pattern = pattern[1:]
+        elif pattern.startswith('\\'):
+            pattern = pattern[1:]
+        dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        if not pattern:
+            return None
+        anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+        prefix = '' if anchored else '(?:.*/)?'
+        return re.compile('%s%s$' % (prefix, self._translate(pattern))), negate, dir_only
+
+    def _translate(self, pattern):
+        i, n = 0, len(pattern)
+        result = []
+        while i < n:
+            c = pattern[i]
+            if pattern.startswith('**/', i):
+                result.append('(?:.*/)?')
+                i += 3
+                continue
+            elif pattern.startswith('**', i):
+                result.append('.*')
+                i += 2
+                continue
+            elif c == '*':
+                result.append('[^/]*')
+            elif c == '?':
+                result.append('[^/]')
+            elif c == '[':
+                end = pattern.find(']', i + 2)
+                if end == -1:
+                    result.append(re.escape(c))
+                else:
+                    chars = pattern[i + 1:end]
+                    if chars.startswith('!'):
+                        chars = '^' + chars[1:]
+                    result.append('[%s]' % chars.replace('\\', '\\\\'))
+                    i = end
+            elif c == '\\' and i + 1 < n:
+                i += 1
+                result.append(re.escape(pattern[i]))
+            else:
+                result.append(re.escape(c))
+            i += 1
+        return ''.join(result)
+
+
+def scan_directory(path):
+    """ List directory.
+
+    :param path: directory path
+    :returns: tuple of lists with names of files and subdirectories
+    """
+    filenames, dirnames = [], []
+    if hasattr(os, 'scandir'):
+        for entry in os.scandir(path):
+            # symlinked directories are not followed, like in os.walk
+            if entry.is_dir(follow_symlinks=False):
+                dirnames.append(entry.name)
+            else:
+                filenames.append(entry.name)
+    else:  # pragma nocover
+        for name in os.listdir(path):
+            if os.path.isdir(os.path.join(path, name)) and not os.path.islink(os.path.join(path, name)):
+                dirnames.append(name)
+            else:
+                filenames.append(name)
+    return filenames, dirnames
+
+
+def get_mtime(path):
+    stat = os.stat(path)
+    return getattr(stat, 'st_mtime_ns', stat.st_mtime)
+
+
+def hash_file(filename, chunk_size=64 * 1024):
+    """ Compute digest of file contents.
+
+    :param filename: file path
+    :returns: hex digest
+    """
+    if hasattr(hashlib, 'blake2b'):
+        digest = hashlib.blake2b(digest_size=16)
+    else:  # pragma nocover
+        digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        chunk = f.read(chunk_size)
+        while chunk:
+            digest.update(chunk)
+            chunk = f.read(chunk_size)
+    return digest.hexdigest()
+
+
+class DirectoryIndex(object):
+    """ <<index>>
+
+    Responsibilities:
+
+        - remember monitored files of every directory in a tree
+        - rescan only directories which modification time has changed
+    """
+    def __init__(self, top, should_monitor_file, ignore=None):
+        """
+        :param top: root directory
+        :param should_monitor_file: function telling if file name is monitored
+        :param ignore: IgnoreRules pruning paths from index
+        """
+        self._top = top
+        self._prefix_len = len(os.path.join(top, ''))
+        self._should_monitor_file = should_monitor_file
+        self._ignore = ignore if ignore is not None else IgnoreRules()
+        # dirpath -> [mtime, set of monitored filenames, set of subdirectories]
+        self._dirs = {}
+        self._scanned = False
+
+    def refresh(self):
+        """ Bring index up to date with the file system.
+
+        First call only builds the index.
+
+        :returns: tuple of sets with paths of added and removed files
+        """
+        added, removed = set(), set()
+        if not self._scanned:
+            self._scan(self._top, added)
+            self._scanned = True
+            return set(), set()
+        for dirpath in list(self._dirs):
+            if dirpath not in self._dirs:
+                # forgotten together with its parent
+                continue
+            try:
+                mtime = get_mtime(dirpath)
+            except OSError:
+                self._forget(dirpath, removed)
+                continue
+            if mtime != self._dirs[dirpath][0]:
+                self._rescan(dirpath, added, removed)
+        return added, removed
+
+    def dump(self):
+        """ Return index state as JSON serializable dict. """
+        if not self._scanned:
+            return None
+        return dict((dirpath, [mtime, sorted(filenames), sorted(dirnames)])
+                    for dirpath, (mtime, filenames, dirnames) in self._dirs.items())
+
+    def load(self, data):
+        """ Restore state returned by dump.
+
+        Next refresh compares file system with restored state instead of
+        building index from scratch.
+        """
+        self._dirs = dict((dirpath, [mtime, set(filenames), set(dirnames)])
+                          for dirpath, (mtime, filenames, dirnames) in data.items())
+        self._scanned = True
+
+    def files(self):
+        for dirpath in sorted(self._dirs):
+            for filename in sorted(self._dirs[dirpath][1]):
+                yield os.path.join(dirpath, filename)
+
+    def _list(self, dirpath):
+        mtime = get_mtime(dirpath)
+        filenames, dirnames = scan_directory(dirpath)
+        filenames = set(filename for filename in filenames
+                        if self._should_monitor_file(filename) and
+                        not self._is_ignored(os.path.join(dirpath, filename)))
+        dirnames = set(dirname for dirname in dirnames
+                       if not self._is_ignored(os.path.join(dirpath, dirname), is_dir=True))
+        return [mtime, filenames, dirnames]
+
+    def _is_ignored(self, path, is_dir=False):
+        # rules are relative to indexed tree; ignored directories aren't listed
+        return self._ignore.is_ignored(path[self._prefix_len:], is_dir, parents=False)
+
+    def _scan(self, top, added):
+        stack = [top]
+        while stack:
+            dirpath = stack.pop()
+            try:
+                entry = self._list(dirpath)
+            except OSError:
+                continue
+            self._dirs[dirpath] = entry
+            added.update(os.path.join(dirpath, filename) for filename in entry[1])
+            stack.extend(os.path.join(dirpath, dirname) for dirname in entry[2])
+
+    def _rescan(self, dirpath, added, removed):
+        try:
+            entry = self._list(dirpath)
+        except OSError:
+            self._forget(dirpath, removed)
+            return
+        old_mtime, old_filenames, old_dirnames = self._dirs[dirpath]
+        self._dirs[dirpath] = entry
+        mtime, filenames, dirnames = entry
+        added.update(os.path.join(dirpath, filename) for filename in filenames - old_filenames)
+        removed.update(os.path.join(dirpath, filename) for filename in old_filenames - filenames)
+        for dirname in dirnames - old_dirnames:
+            self._scan(os.path.join(dirpath, dirname), added)
+        for dirname in old_dirnames - dirnames:
+            self._forget(os.path.join(dirpath, dirname), removed)
+
+    def _forget(self, top, removed):
+        stack = [top]
+        while stack:
+            dirpath = stack.pop()
+            entry = self._dirs.pop(dirpath, None)
+            if entry is None:
+                continue
+            removed.update(os.path.join(dirpath, filename) for filename in entry[1])
+            stack.extend(os.path.join(dirpath, dirname) for dirname in entry[2])
+
+
+class FileMonitor(object):
+    """ <<source>>
+
+    Responsibilities:
+
+        - monitor file changes
+    """
+    DETECT_MTIME = 'mtime'
+    DETECT_CONTENT = 'content'
+
+    def __init__(self, timeout=60, interval=2, monitored_extensions=['.py'], detect=DETECT_MTIME,
+                 settle=0, max_wait=2, ignore=None, max_interval=None, roots=('.',),
+                 ignore_patterns=DEFAULT_IGNORE_PATTERNS, scan_threads=8, snapshot=None):
+        """
+        :param timeout: seconds after which FileMonitorTimeoutError is raised
+        :param interval: seconds between checks; with max_interval it is
+            the interval used right after a change
+        :param max_interval: while nothing changes interval is doubled after
+            every check up to max_interval; None keeps interval fixed
+        :param monitored_extensions: extensions of monitored files
+        :param detect: 'mtime' - change of modification time is a change;
+            'content' - file is hashed when its size, mtime or inode
+            has changed and only different contents is a change
+        :param settle: seconds without changes after which burst of changes
+            is over; 0 returns on first change
+        :param max_wait: maximum seconds to wait for burst of changes to settle
+        :param ignore: IgnoreRules used for all roots; by default every root
+            gets ignore_patterns and patterns from its .gitignore
+        :param roots: monitored directories
+        :param ignore_patterns: patterns used when ignore is not given
+        :param scan_threads: maximum number of roots scanned concurrently
+        :param snapshot: path of file in which state of monitored files is
+            kept between runs; None disables it
+        """
+        self._mtimes = {}
+        self._digests = {}
+        # filename -> (stat signature, digest) used by tree_digest
+        self._tree_digests = {}
+        self._timeout = timeout
+        self._interval = interval
+        self._max_interval = max_interval
+        self._current_interval = interval
+        self._monitored_extensions = monitored_extensions
+        self._detect = detect
+        self._settle_time = settle
+        self._max_wait = max_wait
+        self._roots = [os.path.normpath(root) for root in roots]
+        self._ignores = dict(
+            (root, ignore if ignore is not None else IgnoreRules.from_gitignore(root, ignore_patterns))
+            for root in self._roots)
+        self._indexes = [DirectoryIndex(root, self.should_monitor_file, self._ignores[root])
+                         for root in self._roots]
+        self._scan_threads = min(scan_threads, len(self._roots))
+        self._pool = None
+        self._sources = []
+        self._snapshot = snapshot
+        self._snapshot_loaded = self.load_snapshot() if snapshot is not None else False
+        self._snapshot_dirty = False
+
+    def wait_for_change(self, timeout=None):
+        """ Wait for changes of monitored files.
+
+        :param timeout: seconds to wait instead of timeout given to constructor
+        :returns: ChangeSet with all changes seen
+        :raises FileMonitorTimeoutError: when nothing changed within timeout
+        """
+        timeout = self._timeout if timeout is None else timeout
+        time_passed = 0
+        changes = self.code_has_changed()
+        pushed = False
+        while not changes:
+            changes = self._wait(self._current_interval)
+            pushed = bool(changes)
+            if pushed:
+                break
+            time_passed += self._current_interval
+            self._back_off()
+            if time_passed > timeout:
+                raise FileMonitorTimeoutError
+            changes = self.code_has_changed()
+        self._current_interval = self._interval
+        if not pushed:
+            self.settle(changes)
+        self._snapshot_dirty = True
+        return changes
+
+    def poll_changes(self):
+        """ Check for changes without waiting, e.g. while tests run.
+
+        :returns: ChangeSet, empty when nothing has changed
+        """
+        pushed = self._wait(0) if self._sources else ChangeSet()
+        changes = self.code_has_changed()
+        if pushed:
+            changes.update(pushed)
+        elif changes:
+            self.settle(changes)
+        if changes:
+            self._snapshot_dirty = True
+        return changes
+
+    def tree_digest(self):
+        """ Compute digest of contents of all known monitored files.
+
+        The same tree (e.g. after a change was undone) has the same digest.
+        Files are hashed again only when their size, mtime or inode changes.
+
+        :returns: hex digest
+        """
+        tree = hashlib.sha1()
+        for filename in sorted(self._mtimes):
+            digest = self._file_digest(filename)
+            if digest is not None:
+                tree.update(('%s\0%s\n' % (filename, digest)).encode('utf-8'))
+        return tree.hexdigest()
+
+    def _file_digest(self, filename):
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        signature = (stat.st_size, getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_ino)
+        if self._detect == self.DETECT_CONTENT and self._mtimes.get(filename) == signature:
+            # hashed already while looking for changes
+            digest = self._digests.get(filename)
+            if digest is not None:
+                return digest
+        known = self._tree_digests.get(filename)
+        if known is not None and known[0] == signature:
+            return known[1]
+        try:
+            digest = hash_file(filename)
+        except (IOError, OSError):
+            return None
+        self._tree_digests[filename] = (signature, digest)
+        return digest
+
+    def add_source(self, source):
+        """ Add source pushing changes, e.g. EditorChannel.
+
+        Pushed changes wake monitor up immediately and are returned without
+        scanning or settling.
+
+        :param source: object with fileno(), read_changes() and close()
+        """
+        self._sources.append(source)
+
+    def _wait(self, seconds):
+        if not self._sources:
+            time.sleep(seconds)
+            return ChangeSet()
+        readable, _, _ = select.select(self._sources, [], [], seconds)
+        return self._read_sources(readable)
+
+    def _read_sources(self, readable):
+        pushed = ChangeSet()
+        for source in self._sources:
+            if source in readable:
+                pushed.update(source.read_changes())
+        changes = ChangeSet(unknown=pushed.unknown)
+        for action, paths in [(changes.delete, pushed.deleted), (changes.add, pushed.added),
+                              (changes.modify, pushed.modified)]:
+            for path in paths:
+                path = self.normalize_path(path)
+                if path is None or not self.should_monitor_file(path) or self.is_ignored(path):
+                    continue
+                # remember current state so scanning doesn't report it again
+                self.file_has_changed(path)
+                action(path)
+        return changes
+
+    def normalize_path(self, path):
+        """ Convert path to the form used by monitor.
+
+        :param path: absolute path or path relative to current directory
+        :returns: path starting with monitored root or None if path
+            is outside of roots
+        """
+        abspath = os.path.abspath(path)
+        for root in self._roots:
+            absroot = os.path.abspath(root)
+            if abspath.startswith(os.path.join(absroot, '')):
+                return os.path.join(root, os.path.relpath(abspath, absroot))
+        return None
+
+    def startup_changes(self):
+        """ Find changes made while tddmon was not running.
+
+        :returns: ChangeSet relative to stored snapshot; None when there was
+            no snapshot and anything might have changed
+        """
+        changes = self.code_has_changed()
+        self.save_snapshot()
+        return changes if self._snapshot_loaded else None
+
+    def _snapshot_key(self):
+        return {
+            'version': 1,
+            'roots': self._roots,
+            'detect': self._detect,
+            'extensions': sorted(self._monitored_extensions),
+            'ignore': dict((root, rules.patterns) for root, rules in self._ignores.items()),
+        }
+
+    def load_snapshot(self):
+        """ Restore state of monitored files saved by save_snapshot.
+
+        Snapshot made with different settings is ignored.
+
+        :returns: True if snapshot was loaded
+        """
+        try:
+            with open(self._snapshot, 'rb') as f:
+                data = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+        except (IOError, OSError, ValueError, zlib.error):
+            return False
+        if data.get('key') != json.loads(json.dumps(self._snapshot_key())):
+            return False
+        if self._detect == self.DETECT_CONTENT:
+            self._mtimes = dict((filename, tuple(signature)) for filename, signature in data['files'].items())
+        else:
+            self._mtimes = data['files']
+        self._digests = data['digests']
+        for index in self._indexes:
+            dirs = data['dirs'].get(index._top)
+            if dirs is not None:
+                index.load(dirs)
+        return True
+
+    def save_snapshot(self):
+        """ Atomically write state of monitored files to snapshot file. """
+        if self._snapshot is None:
+            return
+        dirs = dict((index._top, index.dump()) for index in self._indexes)
+        data = {
+            'key': self._snapshot_key(),
+            'files': self._mtimes,
+            'digests': self._digests,
+            'dirs': dict((top, entries) for top, entries in dirs.items() if entries is not None),
+        }
+        write_file_atomically(self._snapshot, zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), 1))
+        self._snapshot_dirty = False
+
+    @property
+    def current_interval(self):
+        """ Seconds between checks at the moment. """
+        return self._current_interval
+
+    def _back_off(self):
+        if self._max_interval is not None:
+            self._current_interval = min(self._current_interval * 2, self._max_interval)
+
+    def settle(self, changes):
+        """ Wait until tree is quiet for settle time but no longer than max_wait.
+
+        Changes seen meanwhile are merged into `changes`.
+
+        :param changes: ChangeSet already detected
+        """
+        if not self._settle_time:
+            return
+        deadline = time.time() + self._max_wait
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            more_changes = self._changed_within(min(self._settle_time, remaining))
+            if not more_changes:
+                return
+            changes.update(more_changes)
+
+    def _changed_within(self, seconds):
+        time.sleep(seconds)
+        return self.code_has_changed()
+
+    def code_has_changed(self):
+        """ Compare current state of all monitored files with previous one.
+
+        Roots are scanned concurrently; stat calls release the GIL so slow
+        (e.g. network) file systems are waited for in parallel.
+
+        :returns: ChangeSet
+        """
+        if self._scan_threads > 1:
+            if self._pool is None:
+                self._pool = ThreadPool(self._scan_threads)
+            results = self._pool.map(self._scan_index, self._indexes)
+        else:
+            results = [self._scan_index(index) for index in self._indexes]
+        changes = ChangeSet()
+        for result in results:
+            changes.update(result)
+        return changes
+
+    def _scan_index(self, index):
+        # roots don't overlap so threads never touch the same keys
+        changes = ChangeSet()
+        added, removed = index.refresh()
+        for filename in removed:
+            self._digests.pop(filename, None)
+            # files already noticed as gone by file_has_changed are not counted twice
+            if self._mtimes.pop(filename, None) is not None:
+                changes.delete(filename)
+        for filename in added:
+            if filename not in self._mtimes:
+                self.file_has_changed(filename)
+                changes.add(filename)
+        for filename in self.get_monitored_files(index):
+            if filename not in changes.added and self.file_has_changed(filename):
+                if filename in self._mtimes:
+                    changes.modify(filename)
+                else:
+                    changes.delete(filename)
+        return changes
+
+    def get_monitored_files(self, index=None):
+        indexes = [index] if index is not None else self._indexes
+        for index in indexes:
+            for filename in index.files():
+                yield filename
+
+    def should_monitor_file(self, filename):
+        file_extension = os.path.splitext(filename)[1]
+        return file_extension in self._monitored_extensions
+
+    def is_ignored(self, path, is_dir=False, parents=True):
+        for root in self._roots:
+            prefix = os.path.join(root, '')
+            if path.startswith(prefix):
+                return self._ignores[root].is_ignored(path[len(prefix):], is_dir, parents)
+        return False
+
+    def walk(self, top):
+        """ Walk tree skipping ignored directories.
+
+        :param top: directory to walk
+        :returns: generator of (dirpath, dirnames, monitored filenames)
+        """
+        for dirpath, dirnames, filenames in os.walk(top):
+            # ignored directories are skipped, so parents needn't be checked
+            dirnames[:] = [dirname for dirname in dirnames
+                           if not self.is_ignored(os.path.join(dirpath, dirname), is_dir=True, parents=False)]
+            filenames = [filename for filename in filenames
+                         if self.should_monitor_file(filename) and
+                         not self.is_ignored(os.path.join(dirpath, filename), parents=False)]
+            yield dirpath, dirnames, filenames
+
+    def file_has_changed(self, filename):
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            # removed after last index refresh
+            self._digests.pop(filename, None)
+            return self._mtimes.pop(filename, None) is not None
+        if self._detect == self.DETECT_CONTENT:
+            return self._content_has_changed(filename, stat)
+        curr_mtime = stat.st_mtime
+        last_mtime = self._mtimes.setdefault(filename, curr_mtime)
+        self._mtimes[filename] = curr_mtime
+        return (curr_mtime != last_mtime)
+
+    def _content_has_changed(self, filename, stat):
+        signature = (stat.st_size, getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_ino)
+        last_signature = self._mtimes.get(filename)
+        if signature == last_signature:
+            return False
+        self._mtimes[filename] = signature
+        try:
+            digest = hash_file(filename)
+        except (IOError, OSError):
+            self._digests.pop(filename, None)
+            return last_signature is not None
+        last_digest = self._digests.get(filename)
+        self._digests[filename] = digest
+        return last_signature is not None and digest != last_digest
+
+    def close(self):
+        for source in self._sources:
+            source.close()
+        self._sources = []
+        if self._snapshot_dirty:
+            self.save_snapshot()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+
+class InotifyFileMonitor(FileMonitor):
+    """ <<source>>
+
+    Responsibilities:
+
+        - monitor file changes with Linux inotify instead of polling
+    """
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                  IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+    EVENT_HEADER = struct.Struct('iIII')
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, *args, **kwargs):
+        super(InotifyFileMonitor, self).__init__(*args, **kwargs)
+        self._libc = self._load_libc()
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            self._raise_errno()
+        self._watches = {}
+        try:
+            for root in self._roots:
+                self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+        self._startup_changes = ChangeSet()
+        known = set(self._mtimes)
+        for root in self._roots:
+            known.difference_update(self._record_files(root, self._startup_changes))
+        for path in known:
+            self._mtimes.pop(path, None)
+            self._digests.pop(path, None)
+            self._startup_changes.delete(path)
+
+    def startup_changes(self):
+        """ Find changes made while tddmon was not running.
+
+        Files are compared with snapshot when they are first watched.
+        """
+        self.save_snapshot()
+        return self._startup_changes if self._snapshot_loaded else None
+
+    @classmethod
+    def is_available(cls):
+        if not sys.platform.startswith('linux'):
+            return False
+        try:
+            libc = cls._load_libc()
+        except OSError:
+            return False
+        return hasattr(libc, 'inotify_init1')
+
+    @staticmethod
+    def _load_libc():
+        return ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+
+    def _raise_errno(self):
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code))
+
+    def _watch_tree(self, top):
+        for dirpath, dirnames, filenames in self.walk(top):
+            self._add_watch(dirpath)
+
+    def _add_watch(self, path):
+        encoded = path.encode(sys.getfilesystemencoding()) if not isinstance(path, bytes) else path
+        wd = self._libc.inotify_add_watch(self._fd, encoded, self.WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            if code in (errno.ENOENT, errno.ENOTDIR):
+                # directory vanished before we could watch it
+                return
+            self._raise_errno()
+        self._watches[wd] = path
+
+    def wait_for_change(self, timeout=None):
+        """ Block until monitored file changes.
+
+        :param timeout: seconds to wait instead of timeout given to constructor
+        :returns: ChangeSet with all changes seen
+        :raises FileMonitorTimeoutError: when nothing changed within timeout
+        """
+        deadline = time.time() + (self._timeout if timeout is None else timeout)
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise FileMonitorTimeoutError
+            readable, _, _ = select.select([self._fd] + self._sources, [], [], remaining)
+            pushed = self._read_sources(readable)
+            changes = self.code_has_changed() if self._fd in readable else ChangeSet()
+            if pushed:
+                changes.update(pushed)
+            elif changes:
+                self.settle(changes)
+            if changes:
+                self._snapshot_dirty = True
+                return changes
+
+    def poll_changes(self):
+        readable, _, _ = select.select([self._fd] + self._sources, [], [], 0)
+        pushed = self._read_sources(readable)
+        changes = self.code_has_changed() if self._fd in readable else ChangeSet()
+        if pushed:
+            changes.update(pushed)
+        elif changes:
+            self.settle(changes)
+        if changes:
+            self._snapshot_dirty = True
+        return changes
+
+    @property
+    def current_interval(self):
+        """ Changes are reported by kernel, nothing is polled. """
+        return None
+
+    def _changed_within(self, seconds):
+        readable, _, _ = select.select([self._fd], [], [], seconds)
+        if not readable:
+            return ChangeSet()
+        return self.code_has_changed()
+
+    def code_has_changed(self):
+        """ Translate pending inotify events into changes.
+
+        :returns: ChangeSet
+        """
+        changes = ChangeSet()
+        for path, mask in self._read_events():
+            if mask & self.IN_Q_OVERFLOW:
+                changes.unknown = True
+            elif mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    if self.is_ignored(path, is_dir=True):
+                        continue
+                    self._watch_tree(path)
+                    self._record_files(path, changes)
+                elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                    prefix = os.path.join(path, '')
+                    for filename in [f for f in self._mtimes if f.startswith(prefix)]:
+                        self._file_event(filename, changes)
+            elif self.should_monitor_file(path) and not self.is_ignored(path):
+                self._file_event(path, changes)
+        return changes
+
+    def _file_event(self, path, changes):
+        known = path in self._mtimes
+        changed = self.file_has_changed(path)
+        if path not in self._mtimes:
+            if known:
+                changes.delete(path)
+        elif not known:
+            changes.add(path)
+        elif changed:
+            changes.modify(path)
+
+    def _record_files(self, top, changes):
+        recorded = []
+        for dirpath, dirnames, filenames in self.walk(top):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                known = path in self._mtimes
+                if self.file_has_changed(path) and known:
+                    changes.modify(path)
+                elif not known and path in self._mtimes:
+                    changes.add(path)
+                recorded.append(path)
+        return recorded
+
+    def _read_events(self):
+        while True:
+            try:
+                data = os.read(self._fd, self.READ_SIZE)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                raise
+            if not data:
+                return
+            offset = 0
+            header_size = self.EVENT_HEADER.size
+            while offset < len(data):
+                wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += header_size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & self.IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                dirpath = self._watches.get(wd, self._roots[0])
+                if name:
+                    path = os.path.join(dirpath, name.decode(sys.getfilesystemencoding()))
+                else:
+                    path = dirpath
+                yield path, mask
+
+    def close(self):
+        if self._fd is not None and self._fd >= 0:
+            os.close(self._fd)
+        self._fd = None
+        super(InotifyFileMonitor, self).close()
+
+
+class EditorChannel(object):
+    """ <<source>>
+
+    Responsibilities:
+
+        - receive notifications about saved files from editors
+
+    Editors connect to Unix domain socket and send lines like
+    ``saved: path/to/file.py`` (``added:`` and ``deleted:`` are understood
+    too). Relative paths are relative to tddmon's current directory.
+    """
+    ACTIONS = {
+        'saved': 'modify',
+        'added': 'add',
+        'deleted': 'delete',
+    }
+    MAX_MESSAGE_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        """
+        :param path: path of socket to create
+        """
+        self._path = path
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                # left by previous run
+                os.unlink(path)
+        except OSError:
+            pass
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(path)
+        self._socket.listen(16)
+        self._socket.setblocking(False)
+
+    def fileno(self):
+        return self._socket.fileno()
+
+    def read_changes(self):
+        """ Read notifications from all pending connections.
+
+        :returns: ChangeSet
+        """
+        changes = ChangeSet()
+        while True:
+            try:
+                connection, address = self._socket.accept()
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return changes
+                raise
+            try:
+                data = self._receive(connection)
+            finally:
+                connection.close()
+            for line in data.decode('utf-8', 'replace').splitlines():
+                action, separator, path = line.partition(':')
+                method = self.ACTIONS.get(action.strip().lower())
+                path = path.strip()
+                if separator and method and path:
+                    getattr(changes, method)(path)
+
+    def _receive(self, connection):
+        connection.settimeout(1.0)
+        chunks = []
+        size = 0
+        while size < self.MAX_MESSAGE_SIZE:
+            try:
+                chunk = connection.recv(4096)
+            except socket.timeout:
+                break
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        self._socket.close()
+        try:
+            os.unlink(self._path)
+        except OSError:
+            pass
+
+
+MONITOR_BACKENDS = {
+    'poll': FileMonitor,
+    'inotify': InotifyFileMonitor,
+}
+
+
+def create_file_monitor(backend='auto', **kwargs):
+    """ Create file monitor for given backend.
+
+    'auto' picks inotify when the platform supports it and falls back to
+    polling otherwise (also when inotify runs out of watches).
+
+    :param backend: 'auto', 'inotify' or 'poll'
+    :param kwargs: passed to monitor constructor
+    """
+    if backend == 'auto':
+        if InotifyFileMonitor.is_available():
+            try:
+                return InotifyFileMonitor(**kwargs)
+            except OSError:
+                pass
+        return FileMonitor(**kwargs)
+    return MONITOR_BACKENDS[backend](**kwargs)
+
+
+TestStage = collections.namedtuple('TestStage', [
+    'name', 'test_runner', 'measure_coverage', 'triggers', 'idle',
+])
+
+
+def read_stages(path, limits=None):
+    """ Read test stages run after main tests from configuration file.
+
+    Every ``stage:NAME`` section is a stage; stages run in order of file::
+
+        [stage:acceptance]
+        command = tests/test_acceptance.py
+        # measure coverage (yes by default)
+        coverage = no
+        # .gitignore-style patterns of files which changes run stage (all by default)
+        triggers = src/ features/*.feature
+        # seconds without changes after which stage runs (10 by default)
+        idle = 30
+
+    :param path: path of configuration file
+    :param limits: RunLimits of stage runs
+    :returns: list of TestStage
+    """
+    parser = configparser.RawConfigParser()
+    if not parser.read(path):
+        raise IOError(errno.ENOENT, 'No such file', path)
+    stages = []
+    for section in parser.sections():
+        if not section.startswith('stage:'):
+            continue
+        options = dict(parser.items(section))
+        triggers = options.get('triggers', '').split() or ['*']
+        stages.append(TestStage(
+            name=section[len('stage:'):],
+            test_runner=TestRunner(options['command'], limits=limits),
+            measure_coverage=options.get('coverage', 'yes').lower() not in ('no', 'false', 'off', '0'),
+            # like in .gitignore pattern matching directory matches files inside it
+            triggers=IgnoreRules([rule for pattern in triggers for rule in (pattern, pattern.rstrip('/') + '/**')]),
+            idle=float(options.get('idle', 10)),
+        ))
+    return stages
+
+
+class TddMon(IObservable, object):
+    """ <<controller>>
+
+    Collaborators:
+
+        - TestRunner - <<source>>
+        - TestResultParser - <<filter>>
+        - LogWriter - <<sink>>
+        - IObserver - <<sink>>
+        - FileMonitor - <<source>>
+    """
+    # seconds between checks for changes during run, when not polling
+    WATCH_INTERVAL = 0.1
+    # seconds given to cancelled run to terminate before it's killed
+    CANCEL_GRACE = 2
+
+    def __init__(self, filename, log=None, output=None, file_monitor=None, test_runner=None,
+                 failed_first=False, stop_early=False, restart_on_change=False, finish_threshold=None,
+                 result_cache=None, fast=False, backfill_idle=None, backfill_after=None, stages=()):
+        """
+        :param failed_first: run tests which failed in previous run first
+            and notify observers about their result before whole run
+        :param stop_early: don't run other tests while they still fail
+        :param restart_on_change: watch files during run, cancel it and
+            start again when they change
+        :param finish_threshold: fraction of usual run time after which
+            run is finished despite changes; they start next run then
+        :param result_cache: ResultCache; tree which was tested already
+            isn't tested again and cached result is shown instead
+        :param fast: run tests without coverage; last known coverage is
+            shown as stale until it is measured again by backfill run
+        :param backfill_idle: seconds without changes after which stale
+            coverage is measured; None never
+        :param backfill_after: number of green runs without coverage after
+            which coverage is measured; None never
+        :param stages: TestStage list run in order after main tests, each
+            only when files haven't changed for its idle time, tests before
+            it pass and its triggers match files changed since it ran
+        """
+        self.failed_first = failed_first
+        self.stop_early = stop_early
+        self.restart_on_change = restart_on_change
+        self.finish_threshold = finish_threshold
+        self.result_cache = result_cache
+        self.fast = fast
+        self.backfill_idle = backfill_idle
+        self.backfill_after = backfill_after
+        self._failed_tests = []
+        # changes not seen by coverage run, as result came from cache or
+        # tests ran without coverage
+        self._unmeasured_changes = None
+        # coverage percent and CoverageSummary of last run with coverage
+        self._last_coverage = (None, None)
+        self._coverage_stale = False
+        # green runs without coverage since coverage was measured
+        self._green_runs = 0
+        # changes not tested because of syntax error
+        self._broken_changes = None
+        self.stages = list(stages)
+        # main tests passed in last run
+        self._green = False
+        # stage name -> changes since stage ran (unknown before first run);
+        # None when there are none
+        self._stage_changes = dict((stage.name, ChangeSet(unknown=True)) for stage in self.stages)
+        # stage name -> 'ok', 'failed', 'pending' or None
+        self._stage_status = dict((stage.name, None) for stage in self.stages)
+        # changes seen during run which was let finish
+        self._pending_changes = None
+        # seconds taken by last full and failed-first runs
+        self._run_durations = {}
+        self.test_runner = test_runner if test_runner is not None else TestRunner(filename)
+        self.test_runner.progress_callback = self._notify_progress
+        self.log_writer = LogWriter(log) if log is not None else DummyWriter()
+        self.test_result_parser = TestResultParser()
+        self.file_monitor = file_monitor if file_monitor is not None else FileMonitor()
+        self.server = LogWriter(log) if log is not None else DummyWriter()
+        self._observers = []
+
+    def register(self, observer):
+        self._observers.append(observer)
+
+    def notify_observers(self, *args, **kwargs):
+        for observer in self._observers:
+            observer.notify(self, *args, **kwargs)
+
+    def _notify_status(self, *args, **kwargs):
+        """ Notify observers about result, with status of stages if there are any. """
+        if self.stages:
+            kwargs['stages'] = dict(self._stage_status)
+        self.notify_observers(*args, **kwargs)
+
+    def run(self, changes=None):
+        """ Run tests and notify observers about result.
+
+        Run cancelled because of changes starts again with them. In fast
+        mode tests run without coverage.
+
+        :param changes: ChangeSet which caused the run; None on first run
+        """
+        while True:
+            try:
+                return self._run(changes, measure_coverage=not self.fast)
+            except TestRunCancelled as cancelled:
+                if changes is not None:
+                    changes.update(cancelled.changes)
+            except TestRunLimitExceeded as exceeded:
+                return self._notify_limit(exceeded, changes)
+
+    def backfill(self):
+        """ Run tests with coverage to measure coverage of changes made in fast mode.
+
+        Run cancelled because of changes is not started again; changes are
+        run next in fast mode and coverage is measured later.
+        """
+        changes = ChangeSet()
+        try:
+            self._run(changes)
+        except TestRunCancelled as cancelled:
+            # changes of fast runs got merged into changes
+            self._remember_unmeasured(changes)
+            self._postpone(cancelled.changes)
+        except TestRunLimitExceeded as exceeded:
+            self._notify_limit(exceeded, changes)
+
+    def _backfill_due(self, idle=False):
+        if not self._coverage_stale:
+            return False
+        if idle:
+            return self.backfill_idle is not None
+        return self.backfill_after is not None and self._green_runs >= self.backfill_after
+
+    def _notify_progress(self, ran, failures, errors):
+        self.notify_observers(ran, failures, errors, None, progress=True)
+
+    def _run(self, changes, measure_coverage=True):
+        if self._broken_changes is not None:
+            if changes is not None:
+                changes.update(self._broken_changes)
+            self._broken_changes = None
+        if changes is not None and self._has_syntax_error(changes):
+            self._broken_changes = changes
+            return
+        digest = self.file_monitor.tree_digest() if self.result_cache is not None else None
+        if digest is not None:
+            entry = self.result_cache.get(digest)
+            if entry is not None:
+                self._notify_cached(entry, changes)
+                return
+        if not measure_coverage:
+            self._remember_unmeasured(changes)
+        elif self._unmeasured_changes is not None:
+            # impact index and coverage cache haven't seen them yet
+            if changes is not None:
+                changes.update(self._unmeasured_changes)
+            self._unmeasured_changes = None
+        if self.failed_first and self._failed_tests:
+            # coverage of a few tests is of no use, whole run measures it
+            stdoutdata, stderrdata = self._run_tests(changes, tests=self._failed_tests,
+                                                     measure_coverage=False)
+            ran, failures, errors, coverage = self.test_result_parser.parse(stderrdata)
+            self.notify_observers(ran, failures, errors, coverage, changes=changes, early=True)
+            if self.stop_early and (failures or errors):
+                if measure_coverage:
+                    self._remember_unmeasured(changes)
+                self.log_writer.write(stdoutdata, stderrdata)
+                self._failed_tests = self.test_result_parser.failed_tests(stderrdata)
+                self._track_stages(changes, False)
+                return
+        # whole run, so that result and coverage are the same as without early run
+        stdoutdata, stderrdata = self._run_tests(changes, measure_coverage=measure_coverage)
+        self.log_writer.write(stdoutdata, stderrdata)
+        ran, failures, errors, coverage = self.test_result_parser.parse(stderrdata)
+        self._failed_tests = self.test_result_parser.failed_tests(stderrdata)
+        if not measure_coverage:
+            self._coverage_stale = True
+            self._green_runs = 0 if failures or errors else self._green_runs + 1
+            last_coverage, summary = self._last_coverage
+            self._track_stages(changes, not failures and not errors)
+            self._notify_status(ran, failures, errors, last_coverage, changes=changes, stale_coverage=True)
+            return
+        summary = self.test_runner.coverage_summary
+        self._notify_result(ran, failures, errors, coverage, summary, changes)
+        # files changed during run could have been tested in either version;
+        # output spilled to disk is too big to be worth keeping
+        if digest is not None and not any(getattr(output, 'spilled', False) for output in (stdoutdata, stderrdata)) \
+                and digest == self.file_monitor.tree_digest():
+            self.result_cache.put(digest, {
+                'output': ''.join(chunk for output in (stdoutdata, stderrdata) for chunk in output_chunks(output)),
+                'result': [ran, failures, errors, coverage],
+                'failed_tests': self._failed_tests,
+                'coverage_summary': summary.dump() if summary is not None else None,
+            })
+
+    def _has_syntax_error(self, changes):
+        """ Compile changed files and notify observers about syntax error.
+
+        Tests aren't run then, as they would only fail to import.
+        """
+        errors = check_syntax(changes.added | changes.modified)
+        if not errors:
+            return False
+        self.log_writer.write(''.join(''.join(traceback.format_exception_only(type(error), error))
+                                      for error in errors))
+        self._track_stages(changes, False)
+        self._notify_status(0, 0, len(errors), self._last_coverage[0], changes=changes,
+                            syntax_error=format_syntax_error(errors[0]))
+        return True
+
+    def _notify_result(self, ran, failures, errors, coverage, summary, changes):
+        self._coverage_stale = False
+        self._green_runs = 0
+        self._track_stages(changes, not failures and not errors)
+        if summary is None:
+            self._last_coverage = (coverage, None)
+            self._notify_status(ran, failures, errors, coverage, changes=changes)
+        else:
+            self._last_coverage = (summary.percent, summary)
+            self._notify_status(ran, failures, errors, summary.percent, changes=changes, coverage_summary=summary)
+
+    def _track_stages(self, changes, green):
+        """ Remember result of main tests and changes which later stages should test. """
+        self._green = green
+        for stage in self.stages:
+            if changes is not None and not changes.unknown and \
+                    not any(stage.triggers.is_ignored(path) for path in changes.paths):
+                continue
+            if self._stage_changes[stage.name] is None:
+                self._stage_changes[stage.name] = ChangeSet()
+            self._stage_changes[stage.name].update(changes if changes is not None else ChangeSet(unknown=True))
+            if self._stage_status[stage.name] is not None:
+                self._stage_status[stage.name] = 'pending'
+
+    def _next_stage(self):
+        """ Stage which should run next; None when all stages before it haven't passed. """
+        if not self._green:
+            return None
+        for stage in self.stages:
+            if self._stage_changes[stage.name] is not None:
+                return stage
+            if self._stage_status[stage.name] != 'ok':
+                return None
+        return None
+
+    def run_stage(self, stage):
+        """ Run tests of later stage and notify observers about result.
+
+        Run cancelled because of changes is not started again; main tests
+        run next with the changes.
+        """
+        changes, self._stage_changes[stage.name] = self._stage_changes[stage.name], None
+        try:
+            stdoutdata, stderrdata = self._run_tests(None if changes.unknown else changes, runner=stage.test_runner,
+                                                     measure_coverage=stage.measure_coverage, kind=stage.name)
+        except TestRunCancelled as cancelled:
+            if self._stage_changes[stage.name] is not None:
+                changes.update(self._stage_changes[stage.name])
+            self._stage_changes[stage.name] = changes
+            self._postpone(cancelled.changes)
+            return
+        except TestRunLimitExceeded as exceeded:
+            self.log_writer.write(*(exceeded.outputs + ('\n%s\n' % exceeded,)))
+            self._stage_status[stage.name] = 'failed'
+            self._notify_status(0, 0, 1, None, stage=stage.name, limit_exceeded=exceeded.status)
+            return
+        self.log_writer.write(stdoutdata, stderrdata)
+        ran, failures, errors, coverage = self.test_result_parser.parse(stderrdata)
+        if not stage.measure_coverage:
+            coverage = None
+        elif stage.test_runner.coverage_summary is not None:
+            coverage = stage.test_runner.coverage_summary.percent
+        self._stage_status[stage.name] = 'failed' if failures or errors else 'ok'
+        self._notify_status(ran, failures, errors, coverage, stage=stage.name)
+
+    def _postpone(self, changes):
+        """ Let loop run tests with changes next. """
+        if self._pending_changes is None:
+            self._pending_changes = ChangeSet()
+        self._pending_changes.update(changes)
+
+    def _notify_limit(self, exceeded, changes):
+        """ Notify observers about run stopped for breaking limits; it counts as error.
+
+        Coverage of run wasn't recorded, so changes are measured again by next run.
+        """
+        self.log_writer.write(*(exceeded.outputs + ('\n%s\n' % exceeded,)))
+        test_output = exceeded.outputs[-1] if exceeded.outputs else ''
+        ran, failures, errors, coverage = self.test_result_parser.parse(test_output)
+        self._failed_tests = self.test_result_parser.failed_tests(test_output)
+        self._remember_unmeasured(changes)
+        self._track_stages(changes, False)
+        self._notify_status(ran, failures, max(errors, 1), self._last_coverage[0], changes=changes,
+                            limit_exceeded=exceeded.status)
+
+    def _remember_unmeasured(self, changes):
+        if self._unmeasured_changes is None:
+            self._unmeasured_changes = ChangeSet()
+        self._unmeasured_changes.update(changes if changes is not None else ChangeSet(unknown=True))
+
+    def _notify_cached(self, entry, changes):
+        self._remember_unmeasured(changes)
+        self.log_writer.write(entry['output'])
+        self._failed_tests = entry['failed_tests']
+        summary = entry['coverage_summary']
+        ran, failures, errors, coverage = entry['result']
+        self._notify_result(ran, failures, errors, coverage,
+                            CoverageSummary.load(summary) if summary is not None else None, changes)
+
+    def _run_tests(self, changes, tests=None, measure_coverage=True, runner=None, kind=None):
+        """
+        :param runner: TestRunner of later stage; main one by default
+        :param kind: name under which duration of run is remembered
+        """
+        runner = runner if runner is not None else self.test_runner
+        kwargs = {'tests': tests} if tests else {}
+        if not measure_coverage:
+            kwargs['measure_coverage'] = False
+        if not self.restart_on_change:
+            return runner.run(changes, **kwargs)
+        result = {}
+
+        def run():
+            try:
+                result['output'] = runner.run(changes, **kwargs)
+            except BaseException as e:
+                result['error'] = e
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        if kind is None:
+            kind = ('failed' if tests else 'all') + ('' if measure_coverage else '-fast')
+        started = time.time()
+        thread.start()
+        try:
+            new_changes = self._watch(thread, started, self._run_durations.get(kind))
+        except BaseException:
+            self._cancel(thread, runner)
+            raise
+        if new_changes is not None:
+            self._cancel(thread, runner)
+            raise TestRunCancelled(new_changes)
+        if 'error' in result:
+            raise result['error']
+        self._run_durations[kind] = time.time() - started
+        return result['output']
+
+    def _watch(self, thread, started, usual_duration):
+        """ Wait for run in thread to end, watching files meanwhile.
+
+        :returns: ChangeSet for which run should be cancelled; None when
+            run has ended
+        """
+        interval = self.file_monitor.current_interval or self.WATCH_INTERVAL
+        while True:
+            thread.join(interval)
+            if not thread.is_alive():
+                return None
+            changes = self.file_monitor.poll_changes()
+            if not changes:
+                continue
+            if not self._nearly_done(started, usual_duration):
+                return changes
+            if self._pending_changes is None:
+                self._pending_changes = changes
+            else:
+                self._pending_changes.update(changes)
+
+    def _nearly_done(self, started, usual_duration):
+        if self.finish_threshold is None or usual_duration is None:
+            return False
+        return time.time() - started >= self.finish_threshold * usual_duration
+
+    def _cancel(self, thread, runner):
+        runner.cancel()
+        thread.join(self.CANCEL_GRACE)
+        if thread.is_alive():
+            runner.cancel(kill=True)
+            thread.join()
+
+    def loop(self):
+        self.run(self.file_monitor.startup_changes())
+        try:
+            while True:
+                if self._pending_changes is not None:
+                    changes, self._pending_changes = self._pending_changes, None
+                    self.run(changes)
+                    continue
+                if self._backfill_due():
+                    self.backfill()
+                    continue
+                idle_task = self._idle_task()
+                try:
+                    changes = self.file_monitor.wait_for_change(
+                        timeout=idle_task[0] if idle_task is not None else None)
+                except FileMonitorTimeoutError:
+                    if idle_task is not None:
+                        idle_task[1]()
+                    else:
+                        self.notify_observers(None, None, None, None,
+                                              interval=self.file_monitor.current_interval)
+                else:
+                    self.run(changes)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.file_monitor.close()
+            self.test_runner.close()
+            for stage in self.stages:
+                stage.test_runner.close()
+
+    def _idle_task(self):
+        """ Work done when files don't change for a while.
+
+        :returns: tuple of seconds to wait and function to call; None when
+            there's nothing to do
+        """
+        if self._backfill_due(idle=True):
+            return self.backfill_idle, self.backfill
+        stage = self._next_stage()
+        if stage is not None:
+            return stage.idle, lambda: self.run_stage(stage)
+        return None
+
+
+def main(*args):
+    """ Run test monitor
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('filename')
+    parser.add_argument('-l', '--log', dest='log', type=argparse.FileType('a'))
+    parser.add_argument('-s', '--server', dest='server')
+    parser.add_argument('-n', '--name', dest='name')
     default_color = (sys.platform != 'win32')
     parser.add_argument('--nocolor', dest='color', default=default_color, action='store_false')
+    parser.add_argument('--monitor', dest='monitor', default='auto',
+                        choices=['auto'] + sorted(MONITOR_BACKENDS))
+    parser.add_argument('--detect', dest='detect', default=FileMonitor.DETECT_MTIME,
+                        choices=[FileMonitor.DETECT_MTIME, FileMonitor.DETECT_CONTENT])
+    parser.add_argument('--settle', dest='settle', default=200, type=int,
+                        help='milliseconds without changes before tests are run')
+    parser.add_argument('--max-wait', dest='max_wait', default=2000, type=int,
+                        help='maximum milliseconds to wait for changes to settle')
+    parser.add_argument('--interval', dest='interval', default=200, type=int,
+                        help='milliseconds between checks right after a change (polling only)')
+    parser.add_argument('--max-interval', dest='max_interval', default=5000, type=int,
+                        help='milliseconds between checks when idle (polling only)')
+    parser.add_argument('-i', '--ignore', dest='ignore', action='append', default=[],
+                        help='.gitignore-style pattern of paths not to monitor')
+    parser.add_argument('-r', '--root', dest='roots', action='append',
+                        help='monitored directory (may be repeated; current directory by default)')
+    parser.add_argument('--snapshot', dest='snapshot', default=os.path.join('.tddmon', 'snapshot'),
+                        help='file keeping state of monitored files between runs')
+    parser.add_argument('--no-snapshot', dest='snapshot', action='store_const', const=None)
+    parser.add_argument('--socket', dest='socket',
+                        help='Unix domain socket on which editors can send "saved: path" notifications')
+    parser.add_argument('--impact', dest='impact', action='store_true',
+                        help='run only tests which executed changed files in previous runs')
+    parser.add_argument('--no-import-graph', dest='import_graph', default=True, action='store_false',
+                        help="with --impact, don't select tests by imports when coverage of earlier runs can't")
+    parser.add_argument('--fork-server', dest='fork_server', action='store_true',
+                        help='run tests in process forked from server with third-party modules imported')
+    parser.add_argument('--preload', dest='preload', action='append', default=[],
+                        help='module imported by fork server when it starts (may be repeated)')
+    parser.add_argument('-j', '--jobs', dest='jobs', default=1, type=int,
+                        help='number of test processes run in parallel')
+    parser.add_argument('--failed-first', dest='failed_first', action='store_true',
+                        help='run tests which failed in previous run first and show their result at once')
+    parser.add_argument('--stop-early', dest='stop_early', action='store_true',
+                        help='with --failed-first, skip other tests while failed ones still fail')
+    parser.add_argument('--no-restart', dest='restart', default=True, action='store_false',
+                        help="don't cancel and restart test run when files change during it")
+    parser.add_argument('--finish-threshold', dest='finish_threshold', default=80, type=int,
+                        help='percent of usual run time after which run is finished despite changes')
+    parser.add_argument('--fast', dest='fast', action='store_true',
+                        help='run tests without coverage; measure it when idle or after some green runs')
+    parser.add_argument('--backfill-idle', dest='backfill_idle', default=10, type=float,
+                        help='with --fast, seconds without changes after which coverage is measured (0 never)')
+    parser.add_argument('--backfill-after', dest='backfill_after', default=5, type=int,
+                        help='with --fast, number of green runs after which coverage is measured (0 never)')
+    parser.add_argument('--timeout', dest='timeout', type=float,
+                        help='seconds after which test process is killed and run reported as timeout')
+    parser.add_argument('--memory-limit', dest='memory_limit', type=int,
+                        help='megabytes of address space of every test process; run breaking it is reported as OOM')
+    parser.add_argument('--cpu-limit', dest='cpu_limit', type=int,
+                        help='CPU seconds of every test process; run breaking it is reported as timeout')
+    parser.add_argument('--stages', dest='stages',
+                        help='configuration file with test stages run after main tests pass and files are idle')
+    parser.add_argument('--result-cache', dest='result_cache', action='store_true',
+                        help='show cached result instead of running tests when files are as in earlier run')
+    parser.add_argument('--result-cache-size', dest='result_cache_size', default=64, type=int,
+                        help='megabytes of results kept by --result-cache')
     result = parser.parse_args(*args)
-    controller = TddMon(result.filename, log=result.log)
+    file_monitor = create_file_monitor(result.monitor, detect=result.detect,
+                                       snapshot=result.snapshot,
+                                       settle=result.settle / 1000.0,
+                                       max_wait=result.max_wait / 1000.0,
+                                       roots=result.roots or ['.'],
+                                       ignore_patterns=DEFAULT_IGNORE_PATTERNS + result.ignore,
+                                       interval=result.interval / 1000.0,
+                                       max_interval=result.max_interval / 1000.0)
+    if result.socket:
+        file_monitor.add_source(EditorChannel(result.socket))
+    runner_kwargs = {}
+    limits = None
+    if result.timeout or result.memory_limit or result.cpu_limit:
+        limits = RunLimits(timeout=result.timeout or None,
+                           memory=result.memory_limit * 1024 * 1024 if result.memory_limit else None,
+                           cpu=result.cpu_limit or None)
+        runner_kwargs['limits'] = limits
+    if result.impact:
+        runner_kwargs['impact_index'] = ImpactIndex(os.path.join('.tddmon', 'impact'), command=result.filename)
+        runner_kwargs['coverage_config'] = os.path.join('.tddmon', 'coveragerc')
+        runner_kwargs['coverage_cache'] = CoverageCache(os.path.join('.tddmon', 'coverage'))
+        if result.import_graph:
+            runner_kwargs['import_graph'] = ImportGraph(result.filename, os.path.join('.tddmon', 'imports'))
+    if result.jobs > 1 and result.fork_server:
+        parser.error('--jobs and --fork-server can not be used together')
+    if result.jobs > 1:
+        test_runner = ParallelTestRunner(result.filename, jobs=result.jobs,
+                                         durations=TestDurations(os.path.join('.tddmon', 'durations')),
+                                         **runner_kwargs)
+    elif result.fork_server and hasattr(os, 'fork'):
+        test_runner = ForkServerTestRunner(result.filename, preload=result.preload, **runner_kwargs)
+    else:
+        test_runner = TestRunner(result.filename, **runner_kwargs)
+    result_cache = None
+    if result.result_cache:
+        result_cache = ResultCache(os.path.join('.tddmon', 'results'), max_size=result.result_cache_size * 1024 * 1024,
+                                   key=result.filename)
+    stages = []
+    if result.stages:
+        try:
+            stages = read_stages(result.stages, limits)
+        except (IOError, OSError, KeyError, ValueError, configparser.Error) as e:
+            parser.error('can not read stages from %s: %s' % (result.stages, e))
+    controller = TddMon(result.filename, log=result.log, file_monitor=file_monitor, test_runner=test_runner,
+                        failed_first=result.failed_first or result.stop_early, stop_early=result.stop_early,
+                        restart_on_change=result.restart, finish_threshold=result.finish_threshold / 100.0,
+                        result_cache=result_cache, fast=result.fast,
+                        backfill_idle=result.backfill_idle or None, backfill_after=result.backfill_after or None,
+                        stages=stages)
     if result.color:
-        controller.register(ColorDisplay())
+        controller.register(ColorDisplay(stages=[stage.name for stage in stages]))
     else:
         controller.register(BWDisplay())
     if result.server and result.name:
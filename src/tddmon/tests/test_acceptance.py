@@ -7,7 +7,7 @@ from morelia import Parser
 from six.moves import StringIO
 from smarttest.decorators import test_type
 
-from tddmon import DEFAULT_COLORS, TddMon, ColorDisplay
+from tddmon import DEFAULT_COLORS, TddMon, ColorDisplay, CoverageSummary, CoverageNumbers
 
 
 @test_type('acceptance')
@@ -51,8 +51,9 @@ class RunMonitorTestCase(unittest.TestCase):
 
         self.modified_file = modified_file
 
-    @patch('tddmon.subprocess.Popen')
-    def step_wykona_sie_test(self, Popen):
+    @patch('tddmon.__main__.read_coverage_summary')
+    @patch('tddmon.__main__.TestRunner._run_command')
+    def step_wykona_sie_test(self, _run_command, read_coverage_summary):
         u'wykona się test'
         if self.failures_num or self.errors_num:
             failures = []
@@ -64,10 +65,9 @@ class RunMonitorTestCase(unittest.TestCase):
         else:
             status = 'OK'
         stderrdata = 'Ran %d test in 0.038s\n\n%s\n' % (self.tests_num, status)
-        test_result = ('', stderrdata)
-        stdoutdata = 'TOTAL 1619 750 584 405 %d%%\n' % self.coverage
-        coverage_result = (stdoutdata, '')
-        Popen().communicate.side_effect = [test_result, coverage_result]
+        _run_command.return_value = (b'', stderrdata.encode('utf-8'))
+        totals = CoverageNumbers(1619, 750, 584, 405, self.coverage)
+        read_coverage_summary.return_value = CoverageSummary({}, totals)
 
         self.controller.run()
 
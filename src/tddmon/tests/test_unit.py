@@ -1,10 +1,22 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import types
+from io import BytesIO
+import json
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+import zlib
 
-from mock import patch, call, sentinel, Mock
+from mock import patch, call, sentinel, Mock, ANY
 from six.moves import StringIO
 from six.moves.urllib.parse import urlencode
 from smarttest.decorators import test_type
@@ -12,7 +24,43 @@ from smarttest.decorators import test_type
 from tddmon import (main, ColorDisplay, DEFAULT_COLORS, LogWriter,
                     TestRunner, TestResultParser, FileMonitor,
                     FileMonitorTimeoutError, TddMon, RemoteDisplay,
-                    BWDisplay)
+                    BWDisplay, InotifyFileMonitor, create_file_monitor,
+                    DirectoryIndex, ChangeSet, IgnoreRules,
+                    DEFAULT_IGNORE_PATTERNS, EditorChannel, ImpactIndex,
+                    read_coverage_contexts, write_coverage_config, ForkServerTestRunner,
+                    is_project_module, ParallelTestRunner, TestDurations, split_into_shards,
+                    merge_test_outputs, list_test_names, CoverageSummary, CoverageNumbers,
+                    display_percent, TestRunCancelled, TestProgressParser, ProgressReporter,
+                    CoverageCache, ResultCache, ImportGraph, check_syntax, format_syntax_error,
+                    TestStage, read_stages, SpillBuffer, output_lines,
+                    RunLimits, TestRunLimitExceeded, apply_resource_limits, limited_command,
+                    read_coverage_summary)
+
+
+def fake_processes(Popen, outputs, returncode=0):
+    """ Make patched Popen start processes which wrote outputs to pipes.
+
+    :param outputs: tuples of standard and error output of processes
+        started one after another; None (or no more outputs) gives
+        Popen.return_value
+    """
+    outputs = list(outputs)
+
+    def pipe(data):
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, data if isinstance(data, bytes) else data.encode('utf-8'))
+        os.close(write_fd)
+        return os.fdopen(read_fd, 'rb')
+
+    def start(*args, **kwargs):
+        output = outputs.pop(0) if outputs else None
+        if output is None:
+            return Popen.return_value
+        process = Mock()
+        process.stdout, process.stderr = pipe(output[0]), pipe(output[1])
+        process.returncode = returncode
+        return process
+    Popen.side_effect = start
 
 
 @test_type('unit')
@@ -27,79 +75,112 @@ class MainTestCase(unittest.TestCase):
         # Assert
         self.assertRaises(SystemExit, main, [])
 
+    @patch('tddmon.__main__.create_file_monitor')
     @patch('tddmon.__main__.TddMon')
     @patch('tddmon.__main__.ColorDisplay')
-    def test_should_return_filename_when_filename_given(self, ColorDisplay, TddMon):
+    def test_should_return_filename_when_filename_given(self, ColorDisplay, TddMon, create_file_monitor):
         """ Scenariusz: podany tylko plik """
         # Arrange
         # Act
         filename = 'plik.py'
         main([filename])
         # Assert
-        TddMon.assert_called_once_with(filename, log=None)
+        TddMon.assert_called_once_with(filename, log=None, file_monitor=create_file_monitor(),
+                                       test_runner=ANY, failed_first=False, stop_early=False,
+                                       restart_on_change=True, finish_threshold=0.8, result_cache=None,
+                                       fast=False, backfill_idle=10, backfill_after=5, stages=[])
         tddmon = TddMon()
         tddmon.loop.assert_called_once_with()
         tddmon.register.assert_has_calls([call(ColorDisplay())])
 
+    @patch('tddmon.__main__.create_file_monitor')
     @patch('tddmon.__main__.TddMon')
     @patch('tddmon.__main__.ColorDisplay')
     @patch('tddmon.__main__.RemoteDisplay')
-    def test_should_register_remote_display_on_url_and_name(self, RemoteDisplay, ColorDisplay, TddMon):
+    def test_should_register_remote_display_on_url_and_name(self, RemoteDisplay, ColorDisplay, TddMon, create_file_monitor):
         """ Scenariusz: wysylanie do zdalnego serwera """
         # Arrange
         # Act
         filename = 'plik.py'
         main(['-s', 'example.com', '-n', 'username', filename])
         # Assert
-        TddMon.assert_called_once_with(filename, log=None)
+        TddMon.assert_called_once_with(filename, log=None, file_monitor=create_file_monitor(),
+                                       test_runner=ANY, failed_first=False, stop_early=False,
+                                       restart_on_change=True, finish_threshold=0.8, result_cache=None,
+                                       fast=False, backfill_idle=10, backfill_after=5, stages=[])
         tddmon = TddMon()
         tddmon.loop.assert_called_once_with()
         tddmon.register.assert_has_calls([call(ColorDisplay()), call(RemoteDisplay())])
 
+    @patch('tddmon.__main__.create_file_monitor')
     @patch('tddmon.__main__.TddMon')
     @patch('tddmon.__main__.ColorDisplay')
     @patch('tddmon.__main__.RemoteDisplay')
-    def test_should_not_register_remote_display_if_no_url(self, RemoteDisplay, ColorDisplay, TddMon):
+    def test_should_not_register_remote_display_if_no_url(self, RemoteDisplay, ColorDisplay, TddMon, create_file_monitor):
         """ Scenariusz: brak parametru url """
         # Arrange
         # Act
         filename = 'plik.py'
         main(['-n', 'username', filename])
         # Assert
-        TddMon.assert_called_once_with(filename, log=None)
+        TddMon.assert_called_once_with(filename, log=None, file_monitor=create_file_monitor(),
+                                       test_runner=ANY, failed_first=False, stop_early=False,
+                                       restart_on_change=True, finish_threshold=0.8, result_cache=None,
+                                       fast=False, backfill_idle=10, backfill_after=5, stages=[])
         tddmon = TddMon()
         tddmon.loop.assert_called_once_with()
         tddmon.register.assert_has_calls([call(ColorDisplay())])
 
+    @patch('tddmon.__main__.create_file_monitor')
     @patch('tddmon.__main__.TddMon')
     @patch('tddmon.__main__.ColorDisplay')
     @patch('tddmon.__main__.RemoteDisplay')
-    def test_should_not_register_remote_display_if_no_name(self, RemoteDisplay, ColorDisplay, TddMon):
+    def test_should_not_register_remote_display_if_no_name(self, RemoteDisplay, ColorDisplay, TddMon, create_file_monitor):
         """ Scenariusz: brak parametru name """
         # Arrange
         # Act
         filename = 'plik.py'
         main(['-n', 'username', filename])
         # Assert
-        TddMon.assert_called_once_with(filename, log=None)
+        TddMon.assert_called_once_with(filename, log=None, file_monitor=create_file_monitor(),
+                                       test_runner=ANY, failed_first=False, stop_early=False,
+                                       restart_on_change=True, finish_threshold=0.8, result_cache=None,
+                                       fast=False, backfill_idle=10, backfill_after=5, stages=[])
         tddmon = TddMon()
         tddmon.loop.assert_called_once_with()
         tddmon.register.assert_has_calls([call(ColorDisplay())])
 
+    @patch('tddmon.__main__.create_file_monitor')
     @patch('tddmon.__main__.TddMon')
     @patch('tddmon.__main__.BWDisplay')
-    def test_should_register_bwdisplay_if_no_color_param(self, BWDisplay, TddMon):
+    def test_should_register_bwdisplay_if_no_color_param(self, BWDisplay, TddMon, create_file_monitor):
         """ Scenariusz: brak koloru """
         # Arrange
         # Act
         filename = 'plik.py'
         main(['--nocolor', filename])
         # Assert
-        TddMon.assert_called_once_with(filename, log=None)
+        TddMon.assert_called_once_with(filename, log=None, file_monitor=create_file_monitor(),
+                                       test_runner=ANY, failed_first=False, stop_early=False,
+                                       restart_on_change=True, finish_threshold=0.8, result_cache=None,
+                                       fast=False, backfill_idle=10, backfill_after=5, stages=[])
         tddmon = TddMon()
         tddmon.loop.assert_called_once_with()
         tddmon.register.assert_has_calls([call(BWDisplay())])
 
+    @patch('tddmon.__main__.create_file_monitor')
+    @patch('tddmon.__main__.TddMon')
+    @patch('tddmon.__main__.ColorDisplay')
+    @patch('tddmon.__main__.TestRunner')
+    def test_should_pass_limits_to_test_runner(self, TestRunner, ColorDisplay, TddMon, create_file_monitor):
+        """ Scenariusz: limity zasobów """
+        # Arrange
+        # Act
+        filename = 'plik.py'
+        main(['--timeout', '30', '--memory-limit', '512', filename])
+        # Assert
+        TestRunner.assert_called_once_with(filename, limits=RunLimits(timeout=30.0, memory=512 * 1024 * 1024))
+
 
 @test_type('unit')
 class ColorDisplayNotifyTestCase(unittest.TestCase):
@@ -130,6 +211,16 @@ class ColorDisplayNotifyTestCase(unittest.TestCase):
         result = self.output.getvalue()
         self.assertTrue(result.endswith(expected))
 
+    def test_should_print_polling_interval_when_idle(self):
+        """ Scenariusz: brak zmian - timeout podczas odpytywania """
+        # Arrange
+        # Act
+        self.obj.notify(sentinel.observable, None, None, None, None, interval=2.5)
+        # Assert
+        expected = 'idle, checking every 2.5s\n'
+        result = self.output.getvalue()
+        self.assertTrue(result.endswith(expected))
+
     def test_should_write_in_green_on_successful_run(self):
         """ Scenariusz: testy zakończone sukcesem """
         # Arrange
@@ -209,6 +300,62 @@ class ColorDisplayNotifyTestCase(unittest.TestCase):
         result = self.output.getvalue()
         self.assertTrue(result.endswith(expected))
 
+    def test_should_write_early_result_without_coverage(self):
+        """ Scenariusz: wynik testów, które wcześniej nie przeszły """
+        # Arrange
+        # Act
+        self.obj.notify(sentinel.observable, 2, 1, 0, 50, early=True)
+        # Assert
+        expected = '\033[%sm        2        1       0\033[0m  failed first\n' % DEFAULT_COLORS['red']
+        result = self.output.getvalue()
+        self.assertTrue(result.endswith(expected))
+
+    def test_should_not_count_early_result_as_repeated_green(self):
+        """ Scenariusz: zielony wynik wstępny """
+        # Arrange
+        num, failures, errors, coverage = 1, 0, 0, 100
+        # Act
+        self.obj.notify(sentinel.observable, num, failures, errors, coverage, early=True)
+        self.obj.notify(sentinel.observable, num, failures, errors, coverage)
+        # Assert
+        color = DEFAULT_COLORS['green']
+        expected = self._prepare_expected(color, failures, errors, num, coverage)
+        result = self.output.getvalue()
+        self.assertTrue(result.endswith(expected))
+
+    def test_should_write_progress_in_place_of_next_status(self):
+        """ Scenariusz: postęp testów """
+        # Arrange
+        # Act
+        self.obj.notify(sentinel.observable, 3, 1, 0, None, progress=True)
+        self.obj.notify(sentinel.observable, 4, 1, 0, 100)
+        # Assert
+        expected = '\r\033[%sm        3        1       0\033[0m  running\r\033[K' % DEFAULT_COLORS['red']
+        expected += self._prepare_expected(DEFAULT_COLORS['red'], 1, 0, 4, 100)
+        result = self.output.getvalue()
+        self.assertTrue(result.endswith(expected))
+
+    def test_should_mark_coverage_of_run_without_coverage_stale(self):
+        """ Scenariusz: szybki tryb bez pokrycia """
+        # Arrange
+        # Act
+        self.obj.notify(sentinel.observable, 4, 0, 0, 90, stale_coverage=True)
+        self.obj.notify(sentinel.observable, 4, 0, 0, None, stale_coverage=True)
+        # Assert
+        expected = '\033[%sm        4        0       0\033[0m      90%%  stale\n' % DEFAULT_COLORS['green']
+        expected += '\033[%sm        4        0       0\033[0m       ?%%  stale\n' % DEFAULT_COLORS['blue']
+        result = self.output.getvalue()
+        self.assertTrue(result.endswith(expected))
+
+    def test_should_print_location_of_syntax_error(self):
+        """ Scenariusz: błąd składni """
+        # Arrange
+        # Act
+        self.obj.notify(sentinel.observable, 0, 0, 1, 90, syntax_error='file1.py:3: invalid syntax')
+        # Assert
+        expected = '\033[%sm SyntaxError: file1.py:3: invalid syntax\033[0m\n' % DEFAULT_COLORS['red']
+        self.assertTrue(self.output.getvalue().endswith(expected))
+
     def _prepare_expected(self, color, failures, errors, num, coverage, coverage_color=None):
         coverage_color = coverage_color if coverage_color is not None else color
         expected = ColorDisplay.pattern % {
@@ -222,6 +369,16 @@ class ColorDisplayNotifyTestCase(unittest.TestCase):
         }
         return expected
 
+    def test_should_print_status_of_run_breaking_limits(self):
+        """ Scenariusz: przekroczony czas testów """
+        # Arrange
+        # Act
+        self.obj.notify(sentinel.observable, 3, 0, 1, 90, limit_exceeded='timeout')
+        # Assert
+        expected = '\033[%sm        3        0       1\033[0m  TIMEOUT\n' % DEFAULT_COLORS['red']
+        self.assertTrue(self.output.getvalue().endswith(expected))
+        self.assertEqual(self.obj._last_run_color, DEFAULT_COLORS['red'])
+
 
 @test_type('unit')
 class BWDisplayNotifyTestCase(unittest.TestCase):
@@ -252,6 +409,16 @@ class BWDisplayNotifyTestCase(unittest.TestCase):
         result = self.output.getvalue()
         self.assertTrue(result.endswith(expected))
 
+    def test_should_print_polling_interval_when_idle(self):
+        """ Scenariusz: brak zmian - timeout podczas odpytywania """
+        # Arrange
+        # Act
+        self.obj.notify(sentinel.observable, None, None, None, None, interval=2.5)
+        # Assert
+        expected = 'idle, checking every 2.5s\n'
+        result = self.output.getvalue()
+        self.assertTrue(result.endswith(expected))
+
     def test_should_write_in_green_on_successful_run(self):
         """ Scenariusz: testy zakończone sukcesem """
         # Arrange
@@ -342,6 +509,19 @@ class BWDisplayNotifyTestCase(unittest.TestCase):
 class LogWriterWriteTestCase(unittest.TestCase):
     """ Test :py:meth:`LogWriter.write`. """
 
+    def test_should_write_outputs_one_after_another(self):
+        """ Scenariusz: wyjście programu i testów """
+        # Arrange
+        output = StringIO()
+        obj = LogWriter(output)
+        test_output = SpillBuffer(max_memory=4)
+        test_output.write(b'some traceback\nRan 1 test in 0.1s\n')
+        # Act
+        obj.write('program output\n', test_output)
+        obj.write('program output\n', 'some traceback\nRan 1 test in 0.2s\n')
+        # Assert
+        self.assertEqual(output.getvalue(), 'program output\nsome traceback\nRan 1 test in 0.1s\n')
+
     def test_should_write_traceback_to_file_on_first_run(self):
         """ Scenariusz: pierwszy zapis """
         # Arrange
@@ -411,20 +591,141 @@ FAILED (failures=1)'''
 class TestRunnerRunTestCase(unittest.TestCase):
     """ Test :py:meth:`TestRunner.run`. """
 
+    @patch('tddmon.__main__.read_coverage_summary')
+    @patch('subprocess.Popen')
+    def test_should_run_tests_without_coverage(self, Popen, read_coverage_summary):
+        """ Scenariusz: uruchomienie testu bez pokrycia kodu """
+        # Arrange
+        fake_processes(Popen, [('', 'OK')])
+        impact_index = Mock()
+        impact_index.select.return_value = None
+        obj = TestRunner('test_command.py', impact_index=impact_index, coverage_config=os.devnull)
+        # Act
+        stdoutdata, stderrdata = obj.run(measure_coverage=False)
+        # Assert
+        self.assertEqual(stderrdata.getvalue(), 'OK')
+        self.assertEqual(Popen.call_args_list[0][0][0], [sys.executable, 'test_command.py'])
+        self.assertFalse(read_coverage_summary.called)
+        self.assertFalse(impact_index.update.called)
+        self.assertEqual(obj.coverage_summary, None)
+
+    @patch('tddmon.__main__.read_coverage_summary')
     @patch('subprocess.Popen')
-    def test_should_return_program_output_with_coverage_report(self, Popen):
+    def test_should_return_program_output_with_coverage_report(self, Popen, read_coverage_summary):
         """ Scenariusz: uruchomienie testu z pokryciem kodu """
         # Arrange
-        process = Popen.return_value
-        process.communicate.side_effect = [('', 'OK'), ('TOTAL', '')]
+        fake_processes(Popen, [('', 'OK')])
+        read_coverage_summary.return_value.format.return_value = 'TOTAL'
         command = 'test_command.py'
         obj = TestRunner(command)
         # Act
         stdoutdata, stderrdata = obj.run()
         # Assert
-        self.assertEqual(stderrdata, 'OKTOTAL')
-        self.assertEqual(len(Popen.call_args_list), 2)
+        self.assertEqual(stderrdata.getvalue(), 'OKTOTAL')
+        self.assertEqual(len(Popen.call_args_list), 1)
         self.assertTrue(command in Popen.call_args_list[0][0][0])
+        self.assertEqual(obj.coverage_summary, read_coverage_summary.return_value)
+        read_coverage_summary.assert_called_once_with('.coverage', True)
+
+    @patch('tddmon.__main__.read_coverage_summary')
+    @patch('subprocess.Popen')
+    def test_should_run_coverage_report_without_coverage_module(self, Popen, read_coverage_summary):
+        """ Scenariusz: brak modułu coverage """
+        # Arrange
+        fake_processes(Popen, [('', 'OK'), ('TOTAL', '')])
+        read_coverage_summary.side_effect = ImportError
+        obj = TestRunner('test_command.py')
+        # Act
+        stdoutdata, stderrdata = obj.run()
+        # Assert
+        self.assertEqual(stderrdata.getvalue(), 'OKTOTAL')
+        self.assertEqual(Popen.call_args_list[1][0][0], [sys.executable, '-m', 'coverage', 'report'])
+        self.assertEqual(obj.coverage_summary, None)
+
+
+@test_type('unit')
+class CoverageSummaryTestCase(unittest.TestCase):
+    """ Test :py:class:`CoverageSummary`. """
+
+    def setUp(self):
+        self.obj = CoverageSummary.from_json_report({
+            'files': {
+                'calc.py': {'summary': {'num_statements': 10, 'missing_lines': 1, 'num_branches': 4,
+                                        'num_partial_branches': 1, 'percent_covered': 85.71}},
+                'app/models.py': {'summary': {'num_statements': 2, 'missing_lines': 0, 'num_branches': 0,
+                                              'num_partial_branches': 0, 'percent_covered': 100.0}},
+            },
+            'totals': {'num_statements': 12, 'missing_lines': 1, 'num_branches': 4,
+                       'num_partial_branches': 1, 'percent_covered': 99.6},
+        })
+        super(CoverageSummaryTestCase, self).setUp()
+
+    def test_should_keep_numbers_of_every_file(self):
+        """ Scenariusz: pokrycie plików """
+        # Arrange
+        # Act
+        result = self.obj.files['calc.py']
+        # Assert
+        self.assertEqual(result, CoverageNumbers(10, 1, 4, 1, 85.71))
+        self.assertEqual(result.missing, 1)
+
+    def test_should_not_round_partial_coverage_to_100(self):
+        """ Scenariusz: prawie pełne pokrycie """
+        # Arrange
+        # Act
+        # Assert
+        self.assertEqual(self.obj.percent, 99)
+        self.assertEqual(display_percent(0.2), 1)
+        self.assertEqual(display_percent(0), 0)
+        self.assertEqual(display_percent(50.5), 50 if round(50.5) == 50 else 51)
+
+    def test_should_format_report_understood_by_parser(self):
+        """ Scenariusz: raport w logu """
+        # Arrange
+        # Act
+        result = self.obj.format()
+        # Assert
+        self.assertEqual(result.splitlines(), [
+            'Name           Stmts   Miss Branch BrPart  Cover',
+            '------------------------------------------------',
+            'app/models.py      2      0      0      0   100%',
+            'calc.py           10      1      4      1    86%',
+            '------------------------------------------------',
+            'TOTAL             12      1      4      1    99%',
+        ])
+        self.assertEqual(TestResultParser().parse(result), (0, 0, 0, 99))
+
+
+@test_type('unit')
+class TestResultParserFailedTestsTestCase(unittest.TestCase):
+    """ Test :py:meth:`TestResultParser.failed_tests`. """
+
+    def test_should_return_names_of_failed_tests(self):
+        """ Scenariusz: błędy i niepowodzenia """
+        # Arrange
+        obj = TestResultParser()
+        input_data = '''
+======================================================================
+FAIL: test_a (__main__.A)
+----------------------------------------------------------------------
+ERROR: test_b (__main__.A.test_b)
+----------------------------------------------------------------------
+ERROR: setUpClass (__main__.B)
+----------------------------------------------------------------------
+ERROR: setUpModule (__main__)
+----------------------------------------------------------------------
+FAIL: test_c (tests.test_c.C.test_c) [subtest]
+----------------------------------------------------------------------
+FAIL: test_a (__main__.A)
+----------------------------------------------------------------------
+Ran 5 tests in 0.001s
+
+FAILED (failures=3, errors=3)
+'''
+        # Act
+        result = obj.failed_tests(input_data)
+        # Assert
+        self.assertEqual(result, ['A.test_a', 'A.test_b', 'B', 'tests.test_c.C.test_c'])
 
 
 @test_type('unit')
@@ -514,6 +815,18 @@ class FileMonitorWaitForChangeTestCase(unittest.TestCase):
         # Assert
         self.assertRaises(FileMonitorTimeoutError, obj.wait_for_change)
 
+    @patch('tddmon.__main__.time')
+    @patch.object(FileMonitor, 'code_has_changed')
+    def test_should_use_given_timeout(self, code_has_changed, time):
+        """ Scenariusz: krótszy timeout """
+        # Arrange
+        code_has_changed.return_value = ChangeSet()
+        obj = FileMonitor(timeout=60, interval=2)
+        # Act
+        # Assert
+        self.assertRaises(FileMonitorTimeoutError, obj.wait_for_change, timeout=3)
+        self.assertEqual(time.sleep.call_count, 2)
+
     @patch('tddmon.__main__.time')
     @patch.object(FileMonitor, 'code_has_changed')
     def test_should_return_true_if_code_has_changed(self, code_has_changed, time):
@@ -526,21 +839,85 @@ class FileMonitorWaitForChangeTestCase(unittest.TestCase):
         # Assert
         self.assertTrue(result)
 
+    @patch('tddmon.__main__.time')
+    @patch.object(FileMonitor, 'code_has_changed')
+    def test_should_back_off_while_idle(self, code_has_changed, time):
+        """ Scenariusz: brak zmian """
+        # Arrange
+        code_has_changed.side_effect = [ChangeSet()] * 5 + [ChangeSet(modified=['file1.py'])]
+        obj = FileMonitor(interval=0.2, max_interval=1)
+        # Act
+        obj.wait_for_change()
+        # Assert
+        time.sleep.assert_has_calls([call(0.2), call(0.4), call(0.8), call(1), call(1)])
+
+    @patch('tddmon.__main__.time')
+    @patch.object(FileMonitor, 'code_has_changed')
+    def test_should_reset_interval_after_change(self, code_has_changed, time):
+        """ Scenariusz: zmiana po okresie bezczynności """
+        # Arrange
+        code_has_changed.side_effect = [ChangeSet()] * 3 + [ChangeSet(modified=['file1.py'])]
+        obj = FileMonitor(interval=0.2, max_interval=1)
+        # Act
+        obj.wait_for_change()
+        # Assert
+        self.assertEqual(obj.current_interval, 0.2)
+
+    @patch('tddmon.__main__.time')
+    @patch.object(FileMonitor, 'code_has_changed')
+    def test_should_wait_until_changes_settle(self, code_has_changed, time):
+        """ Scenariusz: seria zmian """
+        # Arrange
+        time.time.return_value = 0
+        code_has_changed.side_effect = [ChangeSet(modified=['file1.py']), ChangeSet(added=['file2.py']),
+                                        ChangeSet(deleted=['file3.py']), ChangeSet()]
+        obj = FileMonitor(settle=0.2, max_wait=10)
+        # Act
+        result = obj.wait_for_change()
+        # Assert
+        expected = ChangeSet(added=['file2.py'], modified=['file1.py'], deleted=['file3.py'])
+        self.assertEqual(result, expected)
+        self.assertEqual(code_has_changed.call_count, 4)
+        time.sleep.assert_has_calls([call(0.2)] * 3)
+
+    @patch('tddmon.__main__.time')
+    @patch.object(FileMonitor, 'code_has_changed')
+    def test_should_stop_waiting_for_settle_after_max_wait(self, code_has_changed, time):
+        """ Scenariusz: ciągłe zmiany """
+        # Arrange
+        time.time.side_effect = [0, 0, 0.6, 1.2]
+        code_has_changed.side_effect = lambda: ChangeSet(modified=['file1.py'])
+        obj = FileMonitor(settle=0.5, max_wait=1)
+        # Act
+        result = obj.wait_for_change()
+        # Assert
+        self.assertTrue(result)
+        self.assertEqual(code_has_changed.call_count, 3)
+        time.sleep.assert_has_calls([call(0.5), call(0.4)])
+
 
 @test_type('unit')
 class FileMonitorCodeHasChangedTestCase(unittest.TestCase):
     """ Test :py:meth:`FileMonitor.code_has_changed`. """
 
+    def setUp(self):
+        patcher = patch.object(DirectoryIndex, 'refresh')
+        self.refresh = patcher.start()
+        self.refresh.return_value = (set(), set())
+        self.addCleanup(patcher.stop)
+        self.obj = FileMonitor()
+        self.obj._mtimes = {'file1.py': 1, 'file2.py': 1}
+        super(FileMonitorCodeHasChangedTestCase, self).setUp()
+
     @patch.object(FileMonitor, 'file_has_changed')
     @patch.object(FileMonitor, 'get_monitored_files')
     def test_should_return_true_if_code_has_changed(self, get_monitored_files, file_has_changed):
         """ Scenariusz: zmienił się plik """
         # Arrange
         get_monitored_files.side_effect = [['file1.py', 'file2.py']]
-        file_has_changed.side_effect = [True]
-        obj = FileMonitor()
+        file_has_changed.side_effect = [True, False]
         # Act
-        result = obj.code_has_changed()
+        result = self.obj.code_has_changed()
         # Assert
         self.assertTrue(result)
 
@@ -549,9 +926,8 @@ class FileMonitorCodeHasChangedTestCase(unittest.TestCase):
         """ Scenariusz: brak plików """
         # Arrange
         get_monitored_files.side_effect = [[]]
-        obj = FileMonitor()
         # Act
-        result = obj.code_has_changed()
+        result = self.obj.code_has_changed()
         # Assert
         self.assertFalse(result)
 
@@ -562,216 +938,2703 @@ class FileMonitorCodeHasChangedTestCase(unittest.TestCase):
         # Arrange
         get_monitored_files.side_effect = [['file1.py', 'file2.py']]
         file_has_changed.side_effect = [False, True]
-        obj = FileMonitor()
         # Act
-        result = obj.code_has_changed()
+        result = self.obj.code_has_changed()
         # Assert
         self.assertTrue(result)
 
+    @patch.object(FileMonitor, 'file_has_changed')
+    @patch.object(FileMonitor, 'get_monitored_files')
+    def test_should_return_all_changed_files(self, get_monitored_files, file_has_changed):
+        """ Scenariusz: wiele zmienionych plików """
+        # Arrange
+        get_monitored_files.side_effect = [['file1.py', 'file2.py']]
+        file_has_changed.side_effect = [True, True]
+        # Act
+        result = self.obj.code_has_changed()
+        # Assert
+        self.assertEqual(result, ChangeSet(modified=['file1.py', 'file2.py']))
+
+
+@test_type('unit')
+class ChangeSetUpdateTestCase(unittest.TestCase):
+    """ Test :py:meth:`ChangeSet.update`. """
+
+    def test_should_merge_changes(self):
+        """ Scenariusz: połączenie zmian """
+        # Arrange
+        obj = ChangeSet(added=['a.py'], modified=['b.py'])
+        # Act
+        obj.update(ChangeSet(modified=['c.py'], deleted=['d.py']))
+        # Assert
+        self.assertEqual(obj, ChangeSet(added=['a.py'], modified=['b.py', 'c.py'], deleted=['d.py']))
+
+    def test_should_drop_file_added_and_deleted(self):
+        """ Scenariusz: plik tymczasowy """
+        # Arrange
+        obj = ChangeSet(added=['a.py'])
+        # Act
+        obj.update(ChangeSet(deleted=['a.py']))
+        # Assert
+        self.assertFalse(obj)
+
+    def test_should_keep_added_file_modified_later_as_added(self):
+        """ Scenariusz: nowy plik zmieniony """
+        # Arrange
+        obj = ChangeSet(added=['a.py'])
+        # Act
+        obj.update(ChangeSet(modified=['a.py']))
+        # Assert
+        self.assertEqual(obj, ChangeSet(added=['a.py']))
+
+    def test_should_treat_file_deleted_and_added_as_modified(self):
+        """ Scenariusz: plik zapisany przez zamianę """
+        # Arrange
+        obj = ChangeSet(deleted=['a.py'])
+        # Act
+        obj.update(ChangeSet(added=['a.py']))
+        # Assert
+        self.assertEqual(obj, ChangeSet(modified=['a.py']))
+
+
+@test_type('unit')
+class TemporaryDirectoryMixin(object):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        super(TemporaryDirectoryMixin, self).setUp()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+        super(TemporaryDirectoryMixin, self).tearDown()
+
+    def touch(self, *path):
+        dirname = os.path.join(*path[:-1]) if len(path) > 1 else '.'
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(os.path.join(*path), 'a'):
+            pass
+
+    def bump_mtime(self, path):
+        # directory mtime resolution may be coarser than test run time
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 1))
+
 
 @test_type('unit')
-class FileMonitorGetMonitoredFilesTestCase(unittest.TestCase):
+class FileMonitorGetMonitoredFilesTestCase(TemporaryDirectoryMixin, unittest.TestCase):
     """ Test :py:meth:`FileMonitor.get_monitored_files`. """
 
-    @patch('tddmon.__main__.os.walk')
-    def test_should_return_generator_with_files(self, walk):
-        """ Scenariusz: generator plików """
+    def test_should_return_files(self):
+        """ Scenariusz: lista plików """
         # Arrange
-        files_list = [['dir', [], ['file1.py', 'file2.py']]]
-        files = ['dir/file1.py', 'dir/file2.py']
-        walk.side_effect = [files_list]
+        self.touch('dir', 'file1.py')
+        self.touch('dir', 'file2.py')
+        files = [os.path.join('.', 'dir', 'file1.py'), os.path.join('.', 'dir', 'file2.py')]
         obj = FileMonitor()
+        obj.code_has_changed()
         # Act
         result = obj.get_monitored_files()
         # Assert
-        self.assertTrue(isinstance(result, types.GeneratorType))
         self.assertEqual(list(result), files)
 
-    @patch('tddmon.__main__.os.walk')
-    def test_should_return_filter_out_not_monitored_extensions(self, walk):
+    def test_should_return_filter_out_not_monitored_extensions(self):
         """ Scenariusz: odfiltrowanie niemonitorowanych rozszerzeń """
         # Arrange
-        files_list = [['dir', [], ['file1.html', 'file2.py']]]
-        files = ['dir/file2.py']
-        walk.side_effect = [files_list]
+        self.touch('dir', 'file1.html')
+        self.touch('dir', 'file2.py')
+        files = [os.path.join('.', 'dir', 'file2.py')]
         obj = FileMonitor()
+        obj.code_has_changed()
         # Act
         result = obj.get_monitored_files()
         # Assert
-        self.assertTrue(isinstance(result, types.GeneratorType))
         self.assertEqual(list(result), files)
 
 
 @test_type('unit')
-class FileMonitorFileHasChagnedTestCase(unittest.TestCase):
-    """ Test :py:meth:`FileMonitor.file_has_changed`. """
+class DirectoryIndexRefreshTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`DirectoryIndex.refresh`. """
 
     def setUp(self):
-        self.obj = FileMonitor()
-        super(FileMonitorFileHasChagnedTestCase, self).setUp()
+        super(DirectoryIndexRefreshTestCase, self).setUp()
+        self.touch('pkg', 'file1.py')
+        self.obj = DirectoryIndex('.', lambda filename: filename.endswith('.py'))
+        self.obj.refresh()
 
-    @patch('tddmon.__main__.os.stat')
-    def test_should_return_true_if_file_mtime_has_changed(self, stat):
-        """ Scenariusz: mtime zmienione """
+    def test_should_return_nothing_on_first_scan(self):
+        """ Scenariusz: pierwsze skanowanie """
         # Arrange
-        stat().st_mtime = 124
-        filename = 'file1.py'
-        self.obj._mtimes = {filename: 123}
+        obj = DirectoryIndex('.', lambda filename: True)
         # Act
-        result = self.obj.file_has_changed(filename)
+        result = obj.refresh()
         # Assert
-        self.assertTrue(result)
+        self.assertEqual(result, (set(), set()))
 
-    @patch('tddmon.__main__.os.stat')
-    def test_should_return_false_if_new_file(self, stat):
-        """ Scenariusz: mtime zmienione """
+    def test_should_return_added_files(self):
+        """ Scenariusz: nowy plik """
         # Arrange
-        mtime = 124
-        stat().st_mtime = mtime
-        filename = 'file1.py'
+        self.touch('pkg', 'file2.py')
+        self.touch('pkg', 'file2.html')
+        self.bump_mtime('pkg')
         # Act
-        result = self.obj.file_has_changed(filename)
+        result = self.obj.refresh()
         # Assert
-        self.assertFalse(result)
+        self.assertEqual(result, (set([os.path.join('.', 'pkg', 'file2.py')]), set()))
 
-    @patch('tddmon.__main__.os.stat')
-    def test_should_return_false_if_mtime_not_changed(self, stat):
-        """ Scenariusz: mtime zmienione """
+    def test_should_return_removed_files(self):
+        """ Scenariusz: usunięty plik """
         # Arrange
-        mtime = 124
-        stat().st_mtime = mtime
-        filename = 'file1.py'
-        self.obj._mtimes = {filename: mtime}
+        os.remove(os.path.join('pkg', 'file1.py'))
+        self.bump_mtime('pkg')
         # Act
-        result = self.obj.file_has_changed(filename)
+        result = self.obj.refresh()
         # Assert
-        self.assertFalse(result)
+        self.assertEqual(result, (set(), set([os.path.join('.', 'pkg', 'file1.py')])))
 
+    def test_should_scan_new_directories(self):
+        """ Scenariusz: nowy katalog """
+        # Arrange
+        self.touch('pkg', 'sub', 'file2.py')
+        self.bump_mtime('pkg')
+        # Act
+        result = self.obj.refresh()
+        # Assert
+        self.assertEqual(result, (set([os.path.join('.', 'pkg', 'sub', 'file2.py')]), set()))
 
-@test_type('unit')
-class FileMonitorShouldMonitorFileTestCase(unittest.TestCase):
-    """ Test :py:meth:`FileMonitor.should_monitor_file`. """
+    def test_should_forget_removed_directories(self):
+        """ Scenariusz: usunięty katalog """
+        # Arrange
+        shutil.rmtree('pkg')
+        self.bump_mtime('.')
+        # Act
+        result = self.obj.refresh()
+        # Assert
+        self.assertEqual(result, (set(), set([os.path.join('.', 'pkg', 'file1.py')])))
+        self.assertEqual(list(self.obj.files()), [])
 
-    def test_should_return_false_on_not_monitored_extensions(self):
-        """ Scenariusz: niemonitorowane pliki """
+    @patch('tddmon.__main__.scan_directory')
+    def test_should_not_rescan_unchanged_directories(self, scan_directory):
+        """ Scenariusz: katalogi bez zmian """
         # Arrange
-        filename = 'test.py'
-        obj = FileMonitor(monitored_extensions=['.html'])
         # Act
-        result = obj.should_monitor_file(filename)
+        self.obj.refresh()
         # Assert
-        self.assertFalse(result)
+        self.assertFalse(scan_directory.called)
 
 
 @test_type('unit')
-class TddMonRunTestCase(unittest.TestCase):
-    """ Test :py:meth:`TddMon.run`. """
+class FileMonitorMultipleRootsTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`FileMonitor.code_has_changed` with many roots. """
 
-    def test_should_run_tests_and_display_result(self):
-        """ Scenariusz: pojedyncze uruchomienie """
+    def setUp(self):
+        super(FileMonitorMultipleRootsTestCase, self).setUp()
+        self.touch('root1', 'file1.py')
+        self.touch('root2', 'file2.py')
+        self.obj = FileMonitor(roots=['root1', 'root2/'])
+        self.addCleanup(self.obj.close)
+        self.obj.code_has_changed()
+
+    def test_should_merge_changes_from_all_roots(self):
+        """ Scenariusz: zmiany w wielu katalogach """
         # Arrange
-        stdoutdata = ''
-        stderrdata = ''
-        status_display = Mock()
-        obj = TddMon('test_file.py')
-        obj.register(status_display)
-        with patch.object(obj, 'test_runner') as test_runner:
-            test_runner.run.return_value = (stdoutdata, stderrdata)
-            # Act
-            obj.run()
-            # Assert
-            status_display.notify(0, 0, 0, 0)
+        self.touch('root1', 'file3.py')
+        self.bump_mtime('root1')
+        self.bump_mtime(os.path.join('root2', 'file2.py'))
+        # Act
+        result = self.obj.code_has_changed()
+        # Assert
+        expected = ChangeSet(added=[os.path.join('root1', 'file3.py')],
+                             modified=[os.path.join('root2', 'file2.py')])
+        self.assertEqual(result, expected)
+
+    @patch('tddmon.__main__.ThreadPool')
+    def test_should_scan_roots_in_thread_pool(self, ThreadPool):
+        """ Scenariusz: równoległe skanowanie """
+        # Arrange
+        ThreadPool().map.return_value = [ChangeSet(), ChangeSet()]
+        obj = FileMonitor(roots=['root1', 'root2'], scan_threads=4)
+        # Act
+        obj.code_has_changed()
+        # Assert
+        ThreadPool.assert_called_with(2)
+        self.assertEqual(ThreadPool().map.call_args[0][1], obj._indexes)
+
+    def test_should_apply_gitignore_of_each_root(self):
+        """ Scenariusz: .gitignore w katalogu """
+        # Arrange
+        with open(os.path.join('root2', '.gitignore'), 'w') as f:
+            f.write('/generated/\n')
+        self.touch('root2', 'generated', 'file4.py')
+        obj = FileMonitor(roots=['root1', 'root2'])
+        self.addCleanup(obj.close)
+        # Act
+        obj.code_has_changed()
+        # Assert
+        expected = [os.path.join('root1', 'file1.py'), os.path.join('root2', 'file2.py')]
+        self.assertEqual(list(obj.get_monitored_files()), expected)
 
 
 @test_type('unit')
-class TddMonLoopTestCase(unittest.TestCase):
-    """ Test :py:meth:`TddMon.loop`. """
+class FileMonitorSnapshotTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`FileMonitor.startup_changes` with snapshot. """
 
-    @patch('tddmon.__main__.FileMonitor')
-    def test_should_stop_on_keayboard_interrupt(self, FileMonitor):
-        """ Scenariusz: przerwanie działania """
+    def setUp(self):
+        super(FileMonitorSnapshotTestCase, self).setUp()
+        self.touch('pkg', 'file1.py')
+        self.touch('pkg', 'file2.py')
+        self.snapshot = os.path.join('.tddmon', 'snapshot')
+
+    def test_should_return_none_without_snapshot(self):
+        """ Scenariusz: pierwsze uruchomienie """
         # Arrange
-        output = StringIO()
-        obj = TddMon('test_file.py', output=output)
-        with patch.object(obj, 'run'):
-            FileMonitor().wait_for_change.side_effect = [KeyboardInterrupt]
+        obj = FileMonitor(snapshot=self.snapshot)
+        # Act
+        result = obj.startup_changes()
+        # Assert
+        self.assertEqual(result, None)
+        self.assertTrue(os.path.exists(self.snapshot))
+
+    def test_should_return_changes_made_while_not_running(self):
+        """ Scenariusz: zmiany pomiędzy uruchomieniami """
+        # Arrange
+        FileMonitor(snapshot=self.snapshot).startup_changes()
+        self.touch('pkg', 'file3.py')
+        os.remove(os.path.join('pkg', 'file2.py'))
+        self.bump_mtime('pkg')
+        self.bump_mtime(os.path.join('pkg', 'file1.py'))
+        obj = FileMonitor(snapshot=self.snapshot)
+        # Act
+        result = obj.startup_changes()
+        # Assert
+        expected = ChangeSet(added=[os.path.join('.', 'pkg', 'file3.py')],
+                             modified=[os.path.join('.', 'pkg', 'file1.py')],
+                             deleted=[os.path.join('.', 'pkg', 'file2.py')])
+        self.assertEqual(result, expected)
+
+    def test_should_not_list_directories_when_snapshot_loaded(self):
+        """ Scenariusz: brak zmian pomiędzy uruchomieniami """
+        # Arrange
+        os.mkdir('.tddmon')
+        FileMonitor(snapshot=self.snapshot).startup_changes()
+        obj = FileMonitor(snapshot=self.snapshot)
+        with patch('tddmon.__main__.scan_directory') as scan_directory:
             # Act
-            obj.loop()
+            result = obj.startup_changes()
             # Assert
+            self.assertEqual(result, ChangeSet())
+            self.assertFalse(scan_directory.called)
 
-    @patch('tddmon.__main__.FileMonitor')
-    def test_should_run_tests(self, FileMonitor):
-        """ Scenariusz: run """
+    def test_should_ignore_snapshot_made_with_other_settings(self):
+        """ Scenariusz: zmienione ustawienia """
         # Arrange
-        obj = TddMon('test_file.py')
-        FileMonitor().wait_for_change.side_effect = [True, KeyboardInterrupt]
+        FileMonitor(snapshot=self.snapshot).startup_changes()
+        obj = FileMonitor(snapshot=self.snapshot, detect=FileMonitor.DETECT_CONTENT)
         # Act
-        with patch.object(TddMon, 'run') as run:
-            obj.loop()
-            # Assert
-            run.assert_has_calls([call(), call()])
+        result = obj.startup_changes()
+        # Assert
+        self.assertEqual(result, None)
 
-    @patch('tddmon.__main__.FileMonitor')
-    def test_should_notify_with_no_values_on_timeout(self, FileMonitor):
-        """ Scenariusz: timeout """
+
+@test_type('unit')
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'Unix domain sockets not available')
+class EditorChannelReadChangesTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`EditorChannel.read_changes`. """
+
+    def setUp(self):
+        super(EditorChannelReadChangesTestCase, self).setUp()
+        self.obj = EditorChannel('tddmon.sock')
+        self.addCleanup(self.obj.close)
+
+    def send(self, message):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect('tddmon.sock')
+        client.sendall(message)
+        client.close()
+
+    def test_should_return_saved_files(self):
+        """ Scenariusz: zapisane pliki """
         # Arrange
-        output = StringIO()
-        obj = TddMon('test_file.py', output=output)
-        status_display = Mock()
-        obj.register(status_display)
-        with patch.object(obj, 'run'):
-            with patch.object(obj, 'file_monitor') as file_monitor:
-                file_monitor.wait_for_change.side_effect = [FileMonitorTimeoutError, KeyboardInterrupt]
-                # Act
-                obj.loop()
-                # Assert
-                status_display.notify.assert_called_once_with(obj, None, None, None, None)
+        self.send(b'saved: pkg/file1.py\nsaved: pkg/file2.py\n')
+        self.send(b'deleted: pkg/file3.py\n')
+        # Act
+        result = self.obj.read_changes()
+        # Assert
+        self.assertEqual(result, ChangeSet(modified=['pkg/file1.py', 'pkg/file2.py'], deleted=['pkg/file3.py']))
+
+    def test_should_skip_malformed_lines(self):
+        """ Scenariusz: niepoprawne komunikaty """
+        # Arrange
+        self.send(b'hello\nopened: file1.py\nsaved:\n')
+        # Act
+        result = self.obj.read_changes()
+        # Assert
+        self.assertFalse(result)
+
+    def test_should_remove_socket_on_close(self):
+        """ Scenariusz: zamknięcie """
+        # Arrange
+        # Act
+        self.obj.close()
+        # Assert
+        self.assertFalse(os.path.exists('tddmon.sock'))
 
 
 @test_type('unit')
-class TddMonRegister(unittest.TestCase):
-    """ Test :py:meth:`TddMon.register`. """
+class FileMonitorPushedChangesTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`FileMonitor.wait_for_change` with pushed changes. """
 
-    def test_should_register_status_monitor(self):
-        """ Scenariusz: rejestracja monitora """
+    def setUp(self):
+        super(FileMonitorPushedChangesTestCase, self).setUp()
+        self.touch('pkg', 'file1.py')
+        self.source = Mock()
+        read, write = os.pipe()
+        self.addCleanup(os.close, read)
+        self.addCleanup(os.close, write)
+        os.write(write, b'x')
+        self.source.fileno.return_value = read
+        self.obj = FileMonitor(settle=10, max_wait=10)
+        self.obj.add_source(self.source)
+        self.obj.code_has_changed()
+
+    def test_should_return_pushed_changes_immediately(self):
+        """ Scenariusz: powiadomienie z edytora """
         # Arrange
-        monitor = sentinel.monitor
-        obj = TddMon('test_file.py')
-        self.assertTrue(monitor not in obj._observers)
+        def read_changes():
+            self.bump_mtime(os.path.join('pkg', 'file1.py'))
+            return ChangeSet(modified=[os.path.join(self.tmpdir, 'pkg', 'file1.py')])
+        self.source.read_changes.side_effect = read_changes
         # Act
-        obj.register(monitor)
+        with patch.object(self.obj, 'settle') as settle:
+            result = self.obj.wait_for_change()
         # Assert
-        self.assertTrue(monitor in obj._observers)
+        self.assertEqual(result, ChangeSet(modified=[os.path.join('.', 'pkg', 'file1.py')]))
+        self.assertFalse(settle.called)
+        self.assertFalse(self.obj.code_has_changed())
+
+    def test_should_skip_files_outside_roots_and_not_monitored(self):
+        """ Scenariusz: pliki spoza monitorowanych katalogów """
+        # Arrange
+        self.source.read_changes.return_value = ChangeSet(modified=['/elsewhere/file1.py', 'README.rst'])
+        # Act
+        result = self.obj._read_sources([self.source])
+        # Assert
+        self.assertFalse(result)
 
 
 @test_type('unit')
-class RemoteDisplayNotifyTestCase(unittest.TestCase):
-    """ Test :py:meth:`RemoteDisplay.notify`. """
+class IgnoreRulesIsIgnoredTestCase(unittest.TestCase):
+    """ Test :py:meth:`IgnoreRules.is_ignored`. """
+
+    def test_should_ignore_default_directories_at_any_level(self):
+        """ Scenariusz: domyślnie ignorowane katalogi """
+        # Arrange
+        obj = IgnoreRules(DEFAULT_IGNORE_PATTERNS)
+        # Act
+        # Assert
+        self.assertTrue(obj.is_ignored('./.git', is_dir=True))
+        self.assertTrue(obj.is_ignored('./src/.tox', is_dir=True))
+        self.assertTrue(obj.is_ignored('./src/tddmon.egg-info', is_dir=True))
+        self.assertFalse(obj.is_ignored('./src', is_dir=True))
+
+    def test_should_ignore_files_inside_ignored_directories(self):
+        """ Scenariusz: plik w ignorowanym katalogu """
+        # Arrange
+        obj = IgnoreRules(DEFAULT_IGNORE_PATTERNS)
+        # Act
+        # Assert
+        self.assertTrue(obj.is_ignored('./.git/hooks/x.py'))
+        self.assertTrue(obj.is_ignored('.tox/py3/x.py'))
+        self.assertTrue(obj.is_ignored('src/build/lib/x.py'))
+        self.assertTrue(obj.is_ignored('src/build/lib', is_dir=True))
+        self.assertFalse(obj.is_ignored('src/build/lib/x.py', parents=False))
+        self.assertFalse(obj.is_ignored('src/tddmon/x.py'))
+
+    def test_should_match_directory_only_patterns_only_against_directories(self):
+        """ Scenariusz: wzorzec katalogu """
+        # Arrange
+        obj = IgnoreRules(['build/'])
+        # Act
+        # Assert
+        self.assertTrue(obj.is_ignored('./build', is_dir=True))
+        self.assertFalse(obj.is_ignored('./build'))
+
+    def test_should_anchor_patterns_with_slash(self):
+        """ Scenariusz: wzorzec zakotwiczony """
+        # Arrange
+        obj = IgnoreRules(['/docs/_build', 'src/**/generated'])
+        # Act
+        # Assert
+        self.assertTrue(obj.is_ignored('./docs/_build', is_dir=True))
+        self.assertFalse(obj.is_ignored('./pkg/docs/_build', is_dir=True))
+        self.assertTrue(obj.is_ignored('./src/generated', is_dir=True))
+        self.assertTrue(obj.is_ignored('./src/a/b/generated', is_dir=True))
+
+    def test_should_respect_negation(self):
+        """ Scenariusz: negacja """
+        # Arrange
+        obj = IgnoreRules(['# comment', '', '*_pb2.py', '!keep_pb2.py'])
+        # Act
+        # Assert
+        self.assertTrue(obj.is_ignored('./pkg/x_pb2.py'))
+        self.assertFalse(obj.is_ignored('./pkg/keep_pb2.py'))
+
+
+@test_type('unit')
+class IgnoreRulesFromGitignoreTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`IgnoreRules.from_gitignore`. """
+
+    def test_should_read_patterns_from_gitignore(self):
+        """ Scenariusz: plik .gitignore """
+        # Arrange
+        with open('.gitignore', 'w') as f:
+            f.write('generated/\n')
+        # Act
+        obj = IgnoreRules.from_gitignore('.')
+        # Assert
+        self.assertTrue(obj.is_ignored('./generated', is_dir=True))
+        self.assertTrue(obj.is_ignored('./.git', is_dir=True))
+
+    def test_should_use_defaults_without_gitignore(self):
+        """ Scenariusz: brak pliku .gitignore """
+        # Arrange
+        # Act
+        obj = IgnoreRules.from_gitignore('.')
+        # Assert
+        self.assertTrue(obj.is_ignored('./.tox', is_dir=True))
+
+
+@test_type('unit')
+class FileMonitorIgnoresPathsTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test ignoring paths by :py:class:`FileMonitor`. """
+
+    def test_should_not_index_ignored_directories(self):
+        """ Scenariusz: pominięcie ignorowanych katalogów """
+        # Arrange
+        self.touch('pkg', 'file1.py')
+        self.touch('.tox', 'py27', 'lib', 'six.py')
+        self.touch('pkg', 'file1_pb2.py')
+        obj = FileMonitor(ignore=IgnoreRules(DEFAULT_IGNORE_PATTERNS + ['*_pb2.py']))
+        # Act
+        obj.code_has_changed()
+        # Assert
+        self.assertEqual(list(obj.get_monitored_files()), [os.path.join('.', 'pkg', 'file1.py')])
+
+
+@test_type('unit')
+class FileMonitorDetectsAddedAndRemovedFilesTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`FileMonitor.code_has_changed` on real files. """
 
     def setUp(self):
-        self.output = StringIO()
-        self._name = sentinel.name
-        self._url = sentinel.url
-        self.obj = RemoteDisplay(self._url, self._name)
-        super(RemoteDisplayNotifyTestCase, self).setUp()
+        super(FileMonitorDetectsAddedAndRemovedFilesTestCase, self).setUp()
+        self.touch('pkg', 'file1.py')
+        self.obj = FileMonitor()
+        self.obj.code_has_changed()
 
-    @patch('tddmon.__main__.urlopen')
-    def test_should_send_status_information(self, urlopen):
-        """ Scenariusz: wysyla wynik """
+    def test_should_return_true_if_file_added(self):
+        """ Scenariusz: nowy plik """
         # Arrange
+        self.touch('pkg', 'file2.py')
+        self.bump_mtime('pkg')
         # Act
-        self.obj.notify(sentinel.observable, sentinel.ran, sentinel.failures,
-                        sentinel.errors, sentinel.coverage)
+        result = self.obj.code_has_changed()
         # Assert
-        data = {
-            'name': self._name,
-            'ran': sentinel.ran,
-            'failures': sentinel.failures,
-            'errors': sentinel.errors,
-            'coverage': sentinel.coverage
-        }
-        data = urlencode(data)
-        urlopen.assert_called_once_with(self._url, data)
+        self.assertTrue(result)
+        self.assertFalse(self.obj.code_has_changed())
+
+    def test_should_return_true_if_file_removed(self):
+        """ Scenariusz: usunięty plik """
+        # Arrange
+        os.remove(os.path.join('pkg', 'file1.py'))
+        self.bump_mtime('pkg')
+        # Act
+        result = self.obj.code_has_changed()
+        # Assert
+        self.assertTrue(result)
+        self.assertFalse(self.obj.code_has_changed())
+
+
+@test_type('unit')
+class FileMonitorFileHasChagnedTestCase(unittest.TestCase):
+    """ Test :py:meth:`FileMonitor.file_has_changed`. """
+
+    def setUp(self):
+        self.obj = FileMonitor()
+        super(FileMonitorFileHasChagnedTestCase, self).setUp()
+
+    @patch('tddmon.__main__.os.stat')
+    def test_should_return_true_if_file_mtime_has_changed(self, stat):
+        """ Scenariusz: mtime zmienione """
+        # Arrange
+        stat().st_mtime = 124
+        filename = 'file1.py'
+        self.obj._mtimes = {filename: 123}
+        # Act
+        result = self.obj.file_has_changed(filename)
+        # Assert
+        self.assertTrue(result)
+
+    @patch('tddmon.__main__.os.stat')
+    def test_should_return_false_if_new_file(self, stat):
+        """ Scenariusz: mtime zmienione """
+        # Arrange
+        mtime = 124
+        stat().st_mtime = mtime
+        filename = 'file1.py'
+        # Act
+        result = self.obj.file_has_changed(filename)
+        # Assert
+        self.assertFalse(result)
+
+    @patch('tddmon.__main__.os.stat')
+    def test_should_return_false_if_mtime_not_changed(self, stat):
+        """ Scenariusz: mtime zmienione """
+        # Arrange
+        mtime = 124
+        stat().st_mtime = mtime
+        filename = 'file1.py'
+        self.obj._mtimes = {filename: mtime}
+        # Act
+        result = self.obj.file_has_changed(filename)
+        # Assert
+        self.assertFalse(result)
+
+
+@test_type('unit')
+class FileMonitorFileHasChangedContentTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`FileMonitor.file_has_changed` comparing contents. """
+
+    def setUp(self):
+        super(FileMonitorFileHasChangedContentTestCase, self).setUp()
+        self.filename = 'file1.py'
+        self.write('x = 1')
+        self.obj = FileMonitor(detect=FileMonitor.DETECT_CONTENT)
+        self.obj.file_has_changed(self.filename)
+
+    def write(self, content):
+        with open(self.filename, 'w') as f:
+            f.write(content)
+        self.bump_mtime(self.filename)
+
+    def test_should_return_true_if_content_has_changed(self):
+        """ Scenariusz: zmieniona zawartość """
+        # Arrange
+        self.write('x = 2')
+        # Act
+        result = self.obj.file_has_changed(self.filename)
+        # Assert
+        self.assertTrue(result)
+
+    def test_should_return_false_if_only_mtime_has_changed(self):
+        """ Scenariusz: touch """
+        # Arrange
+        self.bump_mtime(self.filename)
+        # Act
+        result = self.obj.file_has_changed(self.filename)
+        # Assert
+        self.assertFalse(result)
+
+    @patch('tddmon.__main__.hash_file')
+    def test_should_not_hash_file_if_stat_not_changed(self, hash_file):
+        """ Scenariusz: brak zmian """
+        # Arrange
+        # Act
+        result = self.obj.file_has_changed(self.filename)
+        # Assert
+        self.assertFalse(result)
+        self.assertFalse(hash_file.called)
+
+    def test_should_return_true_if_file_removed(self):
+        """ Scenariusz: usunięty plik """
+        # Arrange
+        os.remove(self.filename)
+        # Act
+        result = self.obj.file_has_changed(self.filename)
+        # Assert
+        self.assertTrue(result)
+
+
+@test_type('unit')
+class FileMonitorShouldMonitorFileTestCase(unittest.TestCase):
+    """ Test :py:meth:`FileMonitor.should_monitor_file`. """
+
+    def test_should_return_false_on_not_monitored_extensions(self):
+        """ Scenariusz: niemonitorowane pliki """
+        # Arrange
+        filename = 'test.py'
+        obj = FileMonitor(monitored_extensions=['.html'])
+        # Act
+        result = obj.should_monitor_file(filename)
+        # Assert
+        self.assertFalse(result)
+
+
+@test_type('unit')
+@unittest.skipUnless(InotifyFileMonitor.is_available(), 'inotify not available')
+class InotifyFileMonitorWaitForChangeTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`InotifyFileMonitor.wait_for_change`. """
+
+    def setUp(self):
+        super(InotifyFileMonitorWaitForChangeTestCase, self).setUp()
+        os.mkdir('pkg')
+        self.obj = InotifyFileMonitor(timeout=0.1)
+
+    def tearDown(self):
+        self.obj.close()
+        super(InotifyFileMonitorWaitForChangeTestCase, self).tearDown()
+
+    def test_should_return_added_file(self):
+        """ Scenariusz: zapis nowego pliku """
+        # Arrange
+        with open(os.path.join('pkg', 'file1.py'), 'w') as f:
+            f.write('x = 1')
+        # Act
+        result = self.obj.wait_for_change()
+        # Assert
+        self.assertEqual(result, ChangeSet(added=[os.path.join('.', 'pkg', 'file1.py')]))
+
+    def test_should_return_modified_and_deleted_files(self):
+        """ Scenariusz: zmiana i usunięcie plików """
+        # Arrange
+        self.touch('pkg', 'file1.py')
+        self.touch('pkg', 'file2.py')
+        self.obj.wait_for_change()
+        with open(os.path.join('pkg', 'file1.py'), 'w') as f:
+            f.write('x = 1')
+        os.remove(os.path.join('pkg', 'file2.py'))
+        # Act
+        result = self.obj.wait_for_change()
+        # Assert
+        expected = ChangeSet(modified=[os.path.join('.', 'pkg', 'file1.py')],
+                             deleted=[os.path.join('.', 'pkg', 'file2.py')])
+        self.assertEqual(result, expected)
+
+    def test_should_raise_exception_if_not_monitored_file_written(self):
+        """ Scenariusz: zapis niemonitorowanego pliku """
+        # Arrange
+        with open(os.path.join('pkg', 'file1.html'), 'w') as f:
+            f.write('<p>')
+        # Act
+        # Assert
+        self.assertRaises(FileMonitorTimeoutError, self.obj.wait_for_change)
+
+    def test_should_return_changes_made_while_not_running(self):
+        """ Scenariusz: zmiany pomiędzy uruchomieniami """
+        # Arrange
+        snapshot = os.path.join('.tddmon', 'snapshot')
+        self.touch('pkg', 'file1.py')
+        obj = InotifyFileMonitor(snapshot=snapshot)
+        obj.startup_changes()
+        obj.close()
+        self.bump_mtime(os.path.join('pkg', 'file1.py'))
+        obj = InotifyFileMonitor(snapshot=snapshot)
+        self.addCleanup(obj.close)
+        # Act
+        result = obj.startup_changes()
+        # Assert
+        self.assertEqual(result, ChangeSet(modified=[os.path.join('.', 'pkg', 'file1.py')]))
+
+    def test_should_watch_newly_created_directories(self):
+        """ Scenariusz: nowy katalog """
+        # Arrange
+        os.mkdir(os.path.join('pkg', 'sub'))
+        self.assertRaises(FileMonitorTimeoutError, self.obj.wait_for_change)
+        with open(os.path.join('pkg', 'sub', 'file1.py'), 'w') as f:
+            f.write('x = 1')
+        # Act
+        result = self.obj.wait_for_change()
+        # Assert
+        self.assertTrue(result)
+
+
+@test_type('unit')
+class CreateFileMonitorTestCase(unittest.TestCase):
+    """ Test :py:func:`create_file_monitor`. """
+
+    def test_should_return_polling_monitor_for_poll_backend(self):
+        """ Scenariusz: wybrany polling """
+        # Arrange
+        # Act
+        result = create_file_monitor('poll')
+        # Assert
+        self.assertEqual(type(result), FileMonitor)
+
+    @patch.object(InotifyFileMonitor, 'is_available')
+    def test_should_fall_back_to_polling_if_inotify_not_available(self, is_available):
+        """ Scenariusz: brak inotify """
+        # Arrange
+        is_available.return_value = False
+        # Act
+        result = create_file_monitor('auto')
+        # Assert
+        self.assertEqual(type(result), FileMonitor)
+
+    @patch.object(InotifyFileMonitor, '__init__')
+    @patch.object(InotifyFileMonitor, 'is_available')
+    def test_should_fall_back_to_polling_if_inotify_fails(self, is_available, __init__):
+        """ Scenariusz: błąd inotify """
+        # Arrange
+        is_available.return_value = True
+        __init__.side_effect = OSError(28, 'No space left on device')
+        # Act
+        result = create_file_monitor('auto')
+        # Assert
+        self.assertEqual(type(result), FileMonitor)
+
+
+@test_type('unit')
+class TddMonRunTestCase(unittest.TestCase):
+    """ Test :py:meth:`TddMon.run`. """
+
+    def test_should_run_tests_and_display_result(self):
+        """ Scenariusz: pojedyncze uruchomienie """
+        # Arrange
+        stdoutdata = ''
+        stderrdata = ''
+        status_display = Mock()
+        obj = TddMon('test_file.py')
+        obj.register(status_display)
+        with patch.object(obj, 'test_runner') as test_runner:
+            test_runner.run.return_value = (stdoutdata, stderrdata)
+            # Act
+            obj.run()
+            # Assert
+            status_display.notify(0, 0, 0, 0)
+
+    def test_should_pass_changes_to_runner_and_observers(self):
+        """ Scenariusz: uruchomienie po zmianie """
+        # Arrange
+        status_display = Mock()
+        obj = TddMon('test_file.py')
+        obj.register(status_display)
+        changes = ChangeSet(modified=['file1.py'])
+        with patch.object(obj, 'test_runner') as test_runner:
+            test_runner.run.return_value = ('', '')
+            test_runner.coverage_summary = None
+            # Act
+            obj.run(changes)
+            # Assert
+            test_runner.run.assert_called_once_with(changes)
+            status_display.notify.assert_called_once_with(obj, 0, 0, 0, 0, changes=changes)
+
+    def test_should_notify_with_coverage_computed_by_runner(self):
+        """ Scenariusz: pokrycie z danych coverage """
+        # Arrange
+        status_display = Mock()
+        obj = TddMon('test_file.py')
+        obj.register(status_display)
+        with patch.object(obj, 'test_runner') as test_runner:
+            test_runner.run.return_value = ('', 'Ran 1 test in 0.1s\nOK\n')
+            test_runner.coverage_summary.percent = 75
+            # Act
+            obj.run()
+            # Assert
+            status_display.notify.assert_called_once_with(obj, 1, 0, 0, 75, changes=None,
+                                                          coverage_summary=test_runner.coverage_summary)
+
+    def test_should_run_failed_tests_first(self):
+        """ Scenariusz: najpierw testy, które nie przeszły """
+        # Arrange
+        status_display = Mock()
+        obj = TddMon('test_file.py', failed_first=True)
+        obj.register(status_display)
+        changes = ChangeSet(modified=['file1.py'])
+        failed = 'FAIL: test_a (__main__.A)\nRan 2 tests in 0.1s\nFAILED (failures=1)\n'
+        early = 'Ran 1 test in 0.1s\nOK\n'
+        passed = 'Ran 2 tests in 0.1s\nOK\nTOTAL 1 0 0 0 100%\n'
+        with patch.object(obj, 'test_runner') as test_runner:
+            test_runner.run.side_effect = [('', failed), ('', early), ('', passed)]
+            test_runner.coverage_summary = None
+            obj.run()
+            # Act
+            obj.run(changes)
+            # Assert
+            test_runner.run.assert_has_calls([call(None), call(changes, tests=['A.test_a'], measure_coverage=False),
+                                              call(changes)])
+            status_display.notify.assert_has_calls([
+                call(obj, 1, 0, 0, 0, changes=changes, early=True),
+                call(obj, 2, 0, 0, 100, changes=changes),
+            ])
+
+    def test_should_stop_early_when_failed_tests_still_fail(self):
+        """ Scenariusz: testy nadal nie przechodzą """
+        # Arrange
+        status_display = Mock()
+        obj = TddMon('test_file.py', failed_first=True, stop_early=True)
+        obj.register(status_display)
+        changes = ChangeSet(modified=['file1.py'])
+        failed = 'FAIL: test_a (__main__.A)\nRan 2 tests in 0.1s\nFAILED (failures=1)\n'
+        with patch.object(obj, 'test_runner') as test_runner:
+            test_runner.run.side_effect = [('', failed), ('', failed)]
+            test_runner.coverage_summary = None
+            obj.run()
+            # Act
+            obj.run(changes)
+            # Assert
+            self.assertEqual(test_runner.run.call_count, 2)
+            status_display.notify.assert_called_with(obj, 2, 1, 0, 0, changes=changes, early=True)
+
+    def test_should_measure_changes_of_stopped_run_in_next_one(self):
+        """ Scenariusz: zmiany z przerwanego przebiegu w kolejnym pomiarze pokrycia """
+        # Arrange
+        obj = TddMon('test_file.py', failed_first=True, stop_early=True)
+        changes = ChangeSet(modified=['file1.py'])
+        next_changes = ChangeSet(modified=['file2.py'])
+        failed = 'FAIL: test_a (__main__.A)\nRan 2 tests in 0.1s\nFAILED (failures=1)\n'
+        passed = 'Ran 2 tests in 0.1s\nOK\n'
+        with patch.object(obj, 'test_runner') as test_runner:
+            test_runner.run.side_effect = [('', failed), ('', failed), ('', passed), ('', passed)]
+            test_runner.coverage_summary = None
+            obj.run()
+            obj.run(changes)
+            # Act
+            obj.run(next_changes)
+            # Assert
+            self.assertEqual(test_runner.run.call_args, call(next_changes))
+            self.assertEqual(next_changes, ChangeSet(modified=['file1.py', 'file2.py']))
+
+
+@test_type('unit')
+class TddMonLoopTestCase(unittest.TestCase):
+    """ Test :py:meth:`TddMon.loop`. """
+
+    @patch('tddmon.__main__.FileMonitor')
+    def test_should_stop_on_keayboard_interrupt(self, FileMonitor):
+        """ Scenariusz: przerwanie działania """
+        # Arrange
+        output = StringIO()
+        obj = TddMon('test_file.py', output=output)
+        with patch.object(obj, 'run'):
+            FileMonitor().wait_for_change.side_effect = [KeyboardInterrupt]
+            # Act
+            obj.loop()
+            # Assert
+
+    @patch('tddmon.__main__.FileMonitor')
+    def test_should_run_tests(self, FileMonitor):
+        """ Scenariusz: run """
+        # Arrange
+        obj = TddMon('test_file.py')
+        FileMonitor().wait_for_change.side_effect = [sentinel.changes, KeyboardInterrupt]
+        # Act
+        with patch.object(TddMon, 'run') as run:
+            obj.loop()
+            # Assert
+            run.assert_has_calls([call(FileMonitor().startup_changes()), call(sentinel.changes)])
+
+    @patch('tddmon.__main__.FileMonitor')
+    def test_should_notify_with_no_values_on_timeout(self, FileMonitor):
+        """ Scenariusz: timeout """
+        # Arrange
+        output = StringIO()
+        obj = TddMon('test_file.py', output=output)
+        status_display = Mock()
+        obj.register(status_display)
+        with patch.object(obj, 'run'):
+            with patch.object(obj, 'file_monitor') as file_monitor:
+                file_monitor.wait_for_change.side_effect = [FileMonitorTimeoutError, KeyboardInterrupt]
+                # Act
+                obj.loop()
+                # Assert
+                status_display.notify.assert_called_once_with(obj, None, None, None, None,
+                                                              interval=file_monitor.current_interval)
+
+
+@test_type('unit')
+class TddMonRegister(unittest.TestCase):
+    """ Test :py:meth:`TddMon.register`. """
+
+    def test_should_register_status_monitor(self):
+        """ Scenariusz: rejestracja monitora """
+        # Arrange
+        monitor = sentinel.monitor
+        obj = TddMon('test_file.py')
+        self.assertTrue(monitor not in obj._observers)
+        # Act
+        obj.register(monitor)
+        # Assert
+        self.assertTrue(monitor in obj._observers)
+
+
+@test_type('unit')
+class RemoteDisplayNotifyTestCase(unittest.TestCase):
+    """ Test :py:meth:`RemoteDisplay.notify`. """
+
+    def setUp(self):
+        self.output = StringIO()
+        self._name = sentinel.name
+        self._url = sentinel.url
+        self.obj = RemoteDisplay(self._url, self._name)
+        super(RemoteDisplayNotifyTestCase, self).setUp()
+
+    @patch('tddmon.__main__.urlopen')
+    def test_should_send_status_information(self, urlopen):
+        """ Scenariusz: wysyla wynik """
+        # Arrange
+        # Act
+        self.obj.notify(sentinel.observable, sentinel.ran, sentinel.failures,
+                        sentinel.errors, sentinel.coverage)
+        # Assert
+        data = {
+            'name': self._name,
+            'ran': sentinel.ran,
+            'failures': sentinel.failures,
+            'errors': sentinel.errors,
+            'coverage': sentinel.coverage
+        }
+        data = urlencode(data)
+        urlopen.assert_called_once_with(self._url, data)
+
+    @patch('tddmon.__main__.urlopen')
+    def test_should_not_send_result_of_later_stage(self, urlopen):
+        """ Scenariusz: wynik etapu """
+        # Arrange
+        # Act
+        self.obj.notify(sentinel.observable, 5, 0, 0, None, stage='slow', stages={'slow': 'ok'})
+        # Assert
+        self.assertFalse(urlopen.called)
+
+
+@test_type('unit')
+class TestRunnerRunWithImpactIndexTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`TestRunner.run` with impact analysis. """
+
+    def setUp(self):
+        super(TestRunnerRunWithImpactIndexTestCase, self).setUp()
+        self.impact_index = Mock()
+        self.obj = TestRunner('test_file.py', impact_index=self.impact_index, coverage_config='coveragerc')
+
+    @patch('subprocess.Popen')
+    def test_should_run_only_selected_tests(self, Popen):
+        """ Scenariusz: wybrane testy """
+        # Arrange
+        fake_processes(Popen, [('', 'OK'), ('TOTAL', '')])
+        self.impact_index.select.return_value = ['__main__.TestCase.test_a', 'tests.TestCase.test_b']
+        changes = ChangeSet(modified=['file1.py'])
+        # Act
+        self.obj.run(changes)
+        # Assert
+        command = Popen.call_args_list[0][0][0]
+        self.assertEqual(command[-3:], ['test_file.py', 'TestCase.test_a', 'tests.TestCase.test_b'])
+        self.assertEqual(command[:6], [sys.executable, '-m', 'coverage', 'run', '--rcfile', 'coveragerc'])
+        self.impact_index.update.assert_called_once_with('.coverage', self.impact_index.select.return_value)
+
+    @patch('subprocess.Popen')
+    def test_should_run_all_tests_if_nothing_selected(self, Popen):
+        """ Scenariusz: brak wyboru testów """
+        # Arrange
+        fake_processes(Popen, [('', 'OK'), ('TOTAL', '')])
+        self.impact_index.select.return_value = None
+        # Act
+        self.obj.run(None)
+        # Assert
+        command = Popen.call_args_list[0][0][0]
+        self.assertEqual(command[-1], 'test_file.py')
+        self.impact_index.update.assert_called_once_with('.coverage', None)
+
+    def test_should_write_coverage_config_recording_test_contexts(self):
+        """ Scenariusz: konfiguracja coverage """
+        # Arrange
+        # Act
+        # Assert
+        with open('coveragerc') as f:
+            self.assertTrue('dynamic_context = test_function' in f.read())
+
+
+@test_type('unit')
+class WriteCoverageConfigTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:func:`write_coverage_config`. """
+
+    def test_should_preserve_user_settings(self):
+        """ Scenariusz: konfiguracja użytkownika """
+        # Arrange
+        with open('.coveragerc', 'w') as f:
+            f.write('[run]\nomit = setup.py\n[report]\nshow_missing = True\n')
+        # Act
+        write_coverage_config('coveragerc')
+        # Assert
+        with open('coveragerc') as f:
+            content = f.read()
+        self.assertTrue('omit = setup.py' in content)
+        self.assertTrue('show_missing = True' in content)
+        self.assertTrue('dynamic_context = test_function' in content)
+
+
+@test_type('unit')
+class ReadCoverageContextsTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:func:`read_coverage_contexts`. """
+
+    def test_should_return_tests_of_every_file(self):
+        """ Scenariusz: dane coverage z kontekstami """
+        # Arrange
+        connection = sqlite3.connect('.coverage')
+        connection.executescript('''
+            CREATE TABLE file (id INTEGER PRIMARY KEY, path TEXT);
+            CREATE TABLE context (id INTEGER PRIMARY KEY, context TEXT);
+            CREATE TABLE line_bits (file_id INTEGER, context_id INTEGER, numbits BLOB);
+            CREATE TABLE arc (file_id INTEGER, context_id INTEGER, fromno INTEGER, tono INTEGER);
+            INSERT INTO file VALUES (1, '/src/a.py'), (2, '/src/b.py');
+            INSERT INTO context VALUES (1, ''), (2, 'tests.T.test_a'), (3, 'tests.T.test_b');
+            INSERT INTO arc VALUES (1, 1, -1, 1), (1, 2, 1, 2), (1, 3, 1, 2), (2, 3, 2, 3);
+        ''')
+        connection.commit()
+        connection.close()
+        # Act
+        result = read_coverage_contexts('.coverage')
+        # Assert
+        expected = {
+            '/src/a.py': set(['tests.T.test_a', 'tests.T.test_b']),
+            '/src/b.py': set(['tests.T.test_b']),
+        }
+        self.assertEqual(result, expected)
+
+    def test_should_return_nothing_without_data_file(self):
+        """ Scenariusz: brak danych """
+        # Arrange
+        # Act
+        result = read_coverage_contexts('.coverage')
+        # Assert
+        self.assertEqual(result, {})
+        self.assertFalse(os.path.exists('.coverage'))
+
+
+@test_type('unit')
+class ImpactIndexSelectTestCase(unittest.TestCase):
+    """ Test :py:meth:`ImpactIndex.select`. """
+
+    def setUp(self):
+        self.obj = ImpactIndex()
+        self.obj._tests_by_file = {
+            os.path.abspath('a.py'): set(['__main__.T.test_a', '__main__.T.test_b']),
+            os.path.abspath('b.py'): set(['__main__.T.test_b']),
+            os.path.abspath('c.py'): set(['__main__.T.test_c']),
+            os.path.abspath('mod.py'): set(['__main__.T.test_a', 'test_mod.T.test_d']),
+        }
+        super(ImpactIndexSelectTestCase, self).setUp()
+
+    def test_should_return_tests_which_executed_changed_files(self):
+        """ Scenariusz: zmienione pliki """
+        # Arrange
+        changes = ChangeSet(modified=['./b.py', 'c.py'])
+        # Act
+        result = self.obj.select(changes)
+        # Assert
+        self.assertEqual(result, ['__main__.T.test_b', '__main__.T.test_c'])
+
+    def test_should_return_none_when_script_with_tests_changed(self):
+        """ Scenariusz: nowy test dopisany do zaindeksowanego skryptu """
+        # Arrange
+        obj = ImpactIndex(command='test_mod.py')
+        obj._tests_by_file = {
+            os.path.abspath('test_mod.py'): set(['__main__.T.test_a']),
+            os.path.abspath('mod.py'): set(['__main__.T.test_a']),
+        }
+        # Act
+        result = obj.select(ChangeSet(modified=['./test_mod.py']))
+        # Assert
+        self.assertEqual(result, None)
+        self.assertEqual(obj.select(ChangeSet(modified=['./mod.py'])), ['__main__.T.test_a'])
+
+    def test_should_find_script_of_module_run_as_main(self):
+        """ Scenariusz: skrypt uruchamiany przez -m """
+        # Arrange
+        obj = ImpactIndex(command='-m tests.run')
+        obj._tests_by_file = {os.path.abspath(os.path.join('tests', 'run.py')): set(['__main__.T.test_a'])}
+        # Act
+        result = obj.select(ChangeSet(modified=['tests/run.py']))
+        # Assert
+        self.assertEqual(result, None)
+
+    def test_should_return_none_for_tests_not_defined_in_script(self):
+        """ Scenariusz: testy modułu importowanego przez skrypt """
+        # Arrange
+        changes = ChangeSet(modified=['b.py', 'mod.py'])
+        # Act
+        result = self.obj.select(changes)
+        # Assert
+        self.assertEqual(result, None)
+
+    def test_should_return_none_for_file_not_executed_by_tests(self):
+        """ Scenariusz: nowy plik """
+        # Arrange
+        changes = ChangeSet(modified=['b.py'], added=['test_new.py'])
+        # Act
+        result = self.obj.select(changes)
+        # Assert
+        self.assertEqual(result, None)
+
+    def test_should_return_none_without_index(self):
+        """ Scenariusz: brak indeksu """
+        # Arrange
+        obj = ImpactIndex()
+        # Act
+        result = obj.select(ChangeSet(modified=['b.py']))
+        # Assert
+        self.assertEqual(result, None)
+
+    def test_should_return_none_for_unknown_changes(self):
+        """ Scenariusz: nieznane zmiany """
+        # Arrange
+        # Act
+        # Assert
+        self.assertEqual(self.obj.select(None), None)
+        self.assertEqual(self.obj.select(ChangeSet(unknown=True)), None)
+
+
+@test_type('unit')
+class ImpactIndexUpdateTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`ImpactIndex.update`. """
+
+    @patch('tddmon.__main__.read_coverage_contexts')
+    def test_should_replace_index_after_full_run(self, read_coverage_contexts):
+        """ Scenariusz: wszystkie testy """
+        # Arrange
+        read_coverage_contexts.return_value = {'/a.py': set(['T.test_a'])}
+        obj = ImpactIndex('impact', command='test_file.py')
+        obj._tests_by_file = {'/b.py': set(['T.test_b'])}
+        # Act
+        obj.update('.coverage')
+        # Assert
+        self.assertEqual(obj._tests_by_file, {'/a.py': set(['T.test_a'])})
+
+    @patch('tddmon.__main__.read_coverage_contexts')
+    def test_should_refresh_only_tests_which_ran(self, read_coverage_contexts):
+        """ Scenariusz: wybrane testy """
+        # Arrange
+        read_coverage_contexts.return_value = {'/b.py': set(['T.test_a'])}
+        obj = ImpactIndex('impact', command='test_file.py')
+        obj._tests_by_file = {'/a.py': set(['T.test_a', 'T.test_c']), '/c.py': set(['T.test_gone'])}
+        # Act
+        obj.update('.coverage', ['T.test_a', 'T.test_gone'])
+        # Assert
+        self.assertEqual(obj._tests_by_file, {'/a.py': set(['T.test_c']), '/b.py': set(['T.test_a'])})
+
+    @patch('tddmon.__main__.read_coverage_contexts')
+    def test_should_save_index_for_next_session(self, read_coverage_contexts):
+        """ Scenariusz: zapis indeksu """
+        # Arrange
+        read_coverage_contexts.return_value = {'/a.py': set(['T.test_a'])}
+        ImpactIndex('impact', command='test_file.py').update('.coverage')
+        # Act
+        obj = ImpactIndex('impact', command='test_file.py')
+        other = ImpactIndex('impact', command='other_file.py')
+        # Assert
+        self.assertEqual(obj._tests_by_file, {'/a.py': set(['T.test_a'])})
+        self.assertEqual(other._tests_by_file, {})
+
+
+@test_type('unit')
+class ForkServerTestRunnerRunTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`ForkServerTestRunner.run`. """
+
+    def setUp(self):
+        super(ForkServerTestRunnerRunTestCase, self).setUp()
+        self.obj = ForkServerTestRunner('test_file.py -v', preload=['django'])
+        self.addCleanup(self.obj.close)
+
+    def respond(self, Popen, preload=()):
+        lines = []
+
+        def readline():
+            lines.append(None)
+            if len(lines) % 2:
+                return b'{"pid": 123}\n'
+            request = json.loads(Popen.return_value.stdin.write.call_args[0][0].decode('utf-8'))
+            with open(request['stdout'], 'wb') as f:
+                f.write(b'program')
+            with open(request['stderr'], 'wb') as f:
+                f.write(b'OK\nTOTAL')
+            return (json.dumps({'preload': list(preload)}) + '\n').encode('utf-8')
+        Popen.return_value.stdout.readline.side_effect = readline
+
+    @patch('subprocess.Popen')
+    def test_should_return_output_of_forked_run(self, Popen):
+        """ Scenariusz: uruchomienie testów """
+        # Arrange
+        self.respond(Popen)
+        # Act
+        result = self.obj.run()
+        # Assert
+        self.assertEqual(tuple(output.getvalue() for output in result), ('program', 'OK\nTOTAL'))
+        self.assertEqual(self.obj.coverage_summary, None)
+        request = json.loads(Popen.return_value.stdin.write.call_args[0][0].decode('utf-8'))
+        self.assertEqual(request['argv'], ['test_file.py', '-v'])
+        self.assertEqual(request['config_file'], True)
+        self.assertTrue("'django'" in Popen.call_args[0][0][-1])
+
+    @patch('subprocess.Popen')
+    def test_should_start_server_once(self, Popen):
+        """ Scenariusz: kolejne uruchomienia """
+        # Arrange
+        self.respond(Popen)
+        # Act
+        self.obj.run()
+        self.obj.run(ChangeSet(modified=['module.py']))
+        # Assert
+        self.assertEqual(Popen.call_count, 1)
+
+    @patch('subprocess.Popen')
+    def test_should_restart_server_when_preloaded_module_changes(self, Popen):
+        """ Scenariusz: zmiana wczytanego modułu """
+        # Arrange
+        self.respond(Popen, preload=[os.path.abspath('lib.py')])
+        self.obj.run()
+        # Act
+        self.obj.run(ChangeSet(modified=['lib.py']))
+        # Assert
+        self.assertEqual(Popen.call_count, 2)
+        Popen.return_value.stdin.close.assert_called_once_with()
+
+    @patch('subprocess.Popen')
+    def test_should_run_tests_in_new_process_when_server_dies(self, Popen):
+        """ Scenariusz: awaria serwera """
+        # Arrange
+        Popen.return_value.stdout.readline.return_value = b''
+        # first one is fork server
+        fake_processes(Popen, [None, ('', 'OK')])
+        # Act
+        result = self.obj.run()
+        # Assert
+        self.assertEqual(tuple(output.getvalue() for output in result), ('', 'OK'))
+        self.assertEqual(Popen.call_args_list[1][0][0][:4], [sys.executable, '-m', 'coverage', 'run'])
+        self.assertEqual(self.obj._server, None)
+
+
+@test_type('unit')
+class IsProjectModuleTestCase(unittest.TestCase):
+    """ Test :py:func:`is_project_module`. """
+
+    def test_should_recognize_modules_from_project_directory(self):
+        """ Scenariusz: moduły projektu i zewnętrzne """
+        # Arrange
+        project_dir = os.path.join(os.sep, 'project')
+        module = Mock()
+        # Act
+        # Assert
+        module.__file__ = os.path.join(project_dir, 'app', 'models.py')
+        self.assertTrue(is_project_module(module, project_dir))
+        module.__file__ = os.path.join(project_dir, '.venv', 'lib', 'site-packages', 'django', '__init__.py')
+        self.assertFalse(is_project_module(module, project_dir))
+        module.__file__ = os.path.join(os.sep, 'usr', 'lib', 'json', '__init__.py')
+        self.assertFalse(is_project_module(module, project_dir))
+        module.__file__ = None
+        self.assertFalse(is_project_module(module, project_dir))
+
+
+@test_type('unit')
+class SplitIntoShardsTestCase(unittest.TestCase):
+    """ Test :py:func:`split_into_shards`. """
+
+    def test_should_balance_shards_by_duration(self):
+        """ Scenariusz: znane czasy testów """
+        # Arrange
+        durations = TestDurations()
+        durations.record(['A.test_1'], 3.0)
+        durations.record(['B.test_1', 'B.test_2'], 4.0)
+        durations.record(['C.test_1'], 1.0)
+        durations.record(['D.test_1'], 1.0)
+        names = ['A.test_1', 'B.test_1', 'B.test_2', 'C.test_1', 'D.test_1']
+        # Act
+        result = split_into_shards(names, 2, durations)
+        # Assert
+        self.assertEqual(result, [['B.test_1', 'B.test_2', 'D.test_1'], ['A.test_1', 'C.test_1']])
+
+    def test_should_not_create_more_shards_than_test_cases(self):
+        """ Scenariusz: jeden przypadek testowy """
+        # Arrange
+        # Act
+        result = split_into_shards(['A.test_1', 'A.test_2'], 4, TestDurations())
+        # Assert
+        self.assertEqual(result, [['A.test_1', 'A.test_2']])
+
+
+@test_type('unit')
+class TestDurationsTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:class:`TestDurations`. """
+
+    def test_should_estimate_unknown_test_with_average(self):
+        """ Scenariusz: nowy test """
+        # Arrange
+        obj = TestDurations()
+        # Act
+        default = obj.estimate('A.test_1')
+        obj.record(['A.test_1', 'A.test_2'], 2.0)
+        obj.record(['B.test_1'], 4.0)
+        # Assert
+        self.assertEqual(default, TestDurations.DEFAULT_DURATION)
+        self.assertEqual(obj.estimate('A.test_1'), 1.0)
+        self.assertEqual(obj.estimate('C.test_1'), 2.0)
+
+    def test_should_keep_durations_between_sessions(self):
+        """ Scenariusz: zapis czasów """
+        # Arrange
+        obj = TestDurations('durations')
+        obj.record(['A.test_1'], 2.0)
+        # Act
+        obj.save()
+        # Assert
+        self.assertEqual(TestDurations('durations').estimate('A.test_1'), 2.0)
+
+
+@test_type('unit')
+class MergeTestOutputsTestCase(unittest.TestCase):
+    """ Test :py:func:`merge_test_outputs`. """
+
+    def test_should_sum_results_of_shards(self):
+        """ Scenariusz: wyniki kilku procesów """
+        # Arrange
+        outputs = [
+            ('..\nRan 2 tests in 0.1s\n\nOK\n', 0),
+            ('F.E\nRan 3 tests in 0.1s\n\nFAILED (failures=1, errors=1)\n', 1),
+            ('.F\nRan 2 tests in 0.1s\n\nFAILED (failures=1)\n', 1),
+        ]
+        # Act
+        result = merge_test_outputs(outputs, 0.5)
+        # Assert
+        self.assertEqual(TestResultParser().parse(result.getvalue() + 'TOTAL 1 0 0 0 100%'), (7, 2, 1, 100))
+        self.assertTrue(result.getvalue().endswith('Ran 7 tests in 0.500s\n\nFAILED (failures=2, errors=1)\n'))
+
+    def test_should_count_crashed_shard_as_error(self):
+        """ Scenariusz: błąd importu """
+        # Arrange
+        outputs = [
+            ('.\nRan 1 test in 0.1s\n\nOK\n', 0),
+            ('Traceback (most recent call last):\nImportError\n', 1),
+        ]
+        # Act
+        result = merge_test_outputs(outputs, 0.5)
+        # Assert
+        self.assertEqual(TestResultParser().parse(result), (1, 0, 1, 0))
+
+
+@test_type('unit')
+class ListTestNamesTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:func:`list_test_names`. """
+
+    @patch('tddmon.__main__.sys.stdout')
+    def test_should_list_tests_by_names_in_script(self, stdout):
+        """ Scenariusz: testy w skrypcie """
+        # Arrange
+        with open('test_script.py', 'w') as f:
+            f.write('import unittest\n'
+                    'from unittest import TestCase as Base\n'
+                    'class B(Base):\n'
+                    '    def test_2(self): pass\n'
+                    '    def test_1(self): pass\n'
+                    'class A(unittest.TestCase):\n'
+                    '    def test_3(self): pass\n'
+                    'if __name__ == "__main__":\n'
+                    '    raise SystemExit(1)\n')
+        self.addCleanup(sys.path.remove, os.path.abspath('.'))
+        # Act
+        list_test_names('test_script.py')
+        # Assert
+        stdout.write.assert_called_once_with(json.dumps(['A.test_3', 'B.test_1', 'B.test_2']))
+
+
+@test_type('unit')
+class ParallelTestRunnerRunTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`ParallelTestRunner.run`. """
+
+    @patch('subprocess.Popen')
+    def test_should_run_tests_at_once_if_they_can_not_be_listed(self, Popen):
+        """ Scenariusz: testy nie dają się wylistować """
+        # Arrange
+        obj = ParallelTestRunner('-m pytest', jobs=4)
+        fake_processes(Popen, [(b'', b'ImportError'), (b'', b'OK')])
+        # Act
+        result = obj.run()
+        # Assert
+        self.assertEqual(tuple(output.getvalue() for output in result), ('', 'OK'))
+        self.assertEqual(Popen.call_args_list[1][0][0][:4], [sys.executable, '-m', 'coverage', 'run'])
+
+    @patch('subprocess.Popen')
+    @patch('tddmon.__main__.time.sleep')
+    def test_should_run_shard_in_every_worker(self, sleep, Popen):
+        """ Scenariusz: równoległe uruchomienie """
+        # Arrange
+        obj = ParallelTestRunner('test_file.py', jobs=2)
+        fake_processes(Popen, [(b'["A.test_1", "B.test_1"]', b'')])
+        Popen.return_value.poll.return_value = 0
+        # Act
+        obj.run()
+        # Assert
+        commands = [args[0][0] for args in Popen.call_args_list]
+        self.assertEqual(commands[1][-2:], ['test_file.py', 'A.test_1'])
+        self.assertEqual(commands[2][-2:], ['test_file.py', 'B.test_1'])
+        self.assertEqual(commands[1][:5], [sys.executable, '-m', 'coverage', 'run', '--parallel-mode'])
+        self.assertEqual(len(commands), 3)
+
+
+@test_type('unit')
+class FileMonitorPollChangesTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`FileMonitor.poll_changes`. """
+
+    def setUp(self):
+        super(FileMonitorPollChangesTestCase, self).setUp()
+        self.touch('file1.py')
+        self.obj = FileMonitor(settle=0)
+        self.obj.code_has_changed()
+
+    def test_should_return_changes_without_waiting(self):
+        """ Scenariusz: zmiana w trakcie testów """
+        # Arrange
+        self.bump_mtime('file1.py')
+        # Act
+        with patch('tddmon.__main__.time.sleep') as sleep:
+            result = self.obj.poll_changes()
+        # Assert
+        self.assertEqual(result, ChangeSet(modified=[os.path.join('.', 'file1.py')]))
+        self.assertFalse(sleep.called)
+
+    def test_should_return_no_changes(self):
+        """ Scenariusz: brak zmian """
+        # Arrange
+        # Act
+        result = self.obj.poll_changes()
+        # Assert
+        self.assertFalse(result)
+
+
+@test_type('unit')
+class TestRunnerCancelTestCase(unittest.TestCase):
+    """ Test :py:meth:`TestRunner.cancel`. """
+
+    def test_should_terminate_running_command(self):
+        """ Scenariusz: przerwanie uruchomionych testów """
+        # Arrange
+        obj = TestRunner('test_file.py')
+        result = []
+        command = [sys.executable, '-c', 'import time; time.sleep(30)']
+        thread = threading.Thread(target=lambda: result.append(obj._run_command(command)))
+        thread.start()
+        while not obj._processes and thread.is_alive():
+            time.sleep(0.01)
+        # Act
+        obj.cancel()
+        thread.join(10)
+        # Assert
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(obj._processes, [])
+        self.assertRaises(TestRunCancelled, obj._check_cancelled)
+
+    @patch('subprocess.Popen')
+    def test_should_not_start_command_after_cancel(self, Popen):
+        """ Scenariusz: przerwanie przed uruchomieniem """
+        # Arrange
+        obj = TestRunner('test_file.py')
+        # Act
+        obj.cancel()
+        # Assert
+        self.assertRaises(TestRunCancelled, obj._run_command, ['coverage', 'report'])
+        self.assertFalse(Popen.called)
+
+
+@test_type('unit')
+class TddMonRestartOnChangeTestCase(unittest.TestCase):
+    """ Test :py:meth:`TddMon.run` with restart on change. """
+
+    def setUp(self):
+        self.file_monitor = Mock()
+        self.file_monitor.current_interval = 0.01
+        self.test_runner = Mock()
+        self.test_runner.coverage_summary = None
+        self.obj = TddMon('test_file.py', file_monitor=self.file_monitor, test_runner=self.test_runner,
+                          restart_on_change=True, finish_threshold=0.5)
+        self.status_display = Mock()
+        self.obj.register(self.status_display)
+        self.cancelled = threading.Event()
+        self.test_runner.cancel.side_effect = lambda kill=False: self.cancelled.set()
+        super(TddMonRestartOnChangeTestCase, self).setUp()
+
+    def test_should_cancel_run_and_start_again_with_new_changes(self):
+        """ Scenariusz: zmiana w trakcie testów """
+        # Arrange
+        def run(changes):
+            if self.test_runner.run.call_count == 1:
+                self.cancelled.wait(10)
+                raise TestRunCancelled()
+            return ('', 'Ran 1 test in 0.1s\nOK\n')
+        self.test_runner.run.side_effect = run
+        self.file_monitor.poll_changes.side_effect = [ChangeSet(modified=['file2.py'])]
+        changes = ChangeSet(modified=['file1.py'])
+        # Act
+        self.obj.run(changes)
+        # Assert
+        self.assertEqual(self.test_runner.run.call_count, 2)
+        self.assertEqual(changes, ChangeSet(modified=['file1.py', 'file2.py']))
+        self.status_display.notify.assert_called_once_with(self.obj, 1, 0, 0, 0, changes=changes)
+
+    def test_should_finish_nearly_done_run_and_keep_changes_for_next_one(self):
+        """ Scenariusz: zmiana pod koniec testów """
+        # Arrange
+        started = []
+
+        def run(changes):
+            started.append(time.time())
+            self.cancelled.wait(0.2)
+            return ('', 'Ran 1 test in 0.1s\nOK\n')
+
+        def poll_changes():
+            if len(started) == 2 and time.time() - started[1] > 0.15:
+                return ChangeSet(modified=['file2.py'])
+            return ChangeSet()
+        self.test_runner.run.side_effect = run
+        self.file_monitor.poll_changes.side_effect = poll_changes
+        self.obj.run()
+        # Act
+        self.obj.run()
+        # Assert
+        self.assertFalse(self.test_runner.cancel.called)
+        self.assertEqual(self.test_runner.run.call_count, 2)
+        self.assertEqual(self.obj._pending_changes, ChangeSet(modified=['file2.py']))
+
+    def test_should_kill_run_ignoring_termination(self):
+        """ Scenariusz: testy nie kończą się po przerwaniu """
+        # Arrange
+        killed = threading.Event()
+        self.test_runner.cancel.side_effect = lambda kill=False: kill and killed.set()
+        self.obj.CANCEL_GRACE = 0.01
+
+        def run(changes):
+            if self.test_runner.run.call_count == 1:
+                killed.wait(10)
+                raise TestRunCancelled()
+            return ('', '')
+        self.test_runner.run.side_effect = run
+        self.file_monitor.poll_changes.side_effect = [ChangeSet(modified=['file2.py'])]
+        # Act
+        self.obj.run(ChangeSet(modified=['file1.py']))
+        # Assert
+        self.test_runner.cancel.assert_has_calls([call(), call(kill=True)])
+
+
+@test_type('unit')
+class BWDisplayProgressTestCase(unittest.TestCase):
+    """ Test :py:meth:`BWDisplay.notify` with progress. """
+
+    def test_should_clear_progress_before_status(self):
+        """ Scenariusz: postęp testów """
+        # Arrange
+        output = StringIO()
+        obj = BWDisplay(output)
+        # Act
+        obj.notify(sentinel.observable, 2, 0, 0, None, progress=True)
+        obj.notify(sentinel.observable, 2, 0, 0, 100)
+        # Assert
+        progress = '\r              2        0       0  running'
+        expected = progress + '\r%s\r' % (' ' * (len(progress) - 1)) + 'OK:           2        0       0     100%\n'
+        self.assertTrue(output.getvalue().endswith(expected))
+
+
+@test_type('unit')
+class BWDisplayStaleCoverageTestCase(unittest.TestCase):
+    """ Test :py:meth:`BWDisplay.notify` with stale coverage. """
+
+    def test_should_mark_coverage_stale(self):
+        """ Scenariusz: szybki tryb bez pokrycia """
+        # Arrange
+        output = StringIO()
+        obj = BWDisplay(output)
+        # Act
+        obj.notify(sentinel.observable, 2, 1, 0, 90, stale_coverage=True)
+        # Assert
+        self.assertTrue(output.getvalue().endswith('FAIL:         2        1       0      90%  stale\n'))
+
+
+@test_type('unit')
+class BWDisplaySyntaxErrorTestCase(unittest.TestCase):
+    """ Test :py:meth:`BWDisplay.notify` with syntax error. """
+
+    def test_should_print_location_of_syntax_error(self):
+        """ Scenariusz: błąd składni """
+        # Arrange
+        output = StringIO()
+        obj = BWDisplay(output)
+        # Act
+        obj.notify(sentinel.observable, 0, 0, 1, None, syntax_error='file1.py:3: invalid syntax')
+        # Assert
+        self.assertTrue(output.getvalue().endswith('FAIL:  SyntaxError: file1.py:3: invalid syntax\n'))
+
+    def test_should_print_status_of_run_breaking_limits(self):
+        """ Scenariusz: brak pamięci """
+        # Arrange
+        output = StringIO()
+        obj = BWDisplay(output)
+        # Act
+        obj.notify(sentinel.observable, 0, 0, 1, None, limit_exceeded='oom')
+        # Assert
+        self.assertTrue(output.getvalue().endswith('FAIL:         0        0       1  OUT OF MEMORY\n'))
+
+
+@test_type('unit')
+class TestProgressParserFeedTestCase(unittest.TestCase):
+    """ Test :py:meth:`TestProgressParser.feed`. """
+
+    def setUp(self):
+        self.obj = TestProgressParser()
+        super(TestProgressParserFeedTestCase, self).setUp()
+
+    def result(self):
+        return (self.obj.ran, self.obj.failures, self.obj.errors)
+
+    def test_should_count_result_characters_as_they_come(self):
+        """ Scenariusz: wyniki testów w kolejnych porcjach """
+        # Arrange
+        # Act
+        changed = [self.obj.feed(data) for data in (b'..', b'F', b'', b'sE')]
+        # Assert
+        self.assertEqual(changed, [True, True, False, True])
+        self.assertEqual(self.result(), (5, 1, 1))
+
+    def test_should_count_verbose_results(self):
+        """ Scenariusz: unittest z opcją -v """
+        # Arrange
+        # Act
+        self.obj.feed(b'test_a (__main__.A) ... ok\ntest_b (__main__.A) ... ')
+        self.obj.feed(b'FAIL\ntest_c (__main__.A.test_c) ... ERROR\ntest_d (__main__.A) ... skipped "x"\n')
+        # Assert
+        self.assertEqual(self.result(), (4, 1, 1))
+
+    def test_should_ignore_output_of_tests_and_summary(self):
+        """ Scenariusz: wydruki testów i podsumowanie """
+        # Arrange
+        # Act
+        self.obj.feed(b'.')
+        self.obj.feed(b'Starting server\n.')
+        self.obj.feed(b'F\nFAIL: test_b (__main__.A)\n' + b'=' * 70 + b'\nERROR: test_c\n.E\nRan 3 tests\n')
+        # Assert
+        self.assertEqual(self.result(), (3, 1, 0))
+
+
+@test_type('unit')
+class ProgressReporterTestCase(unittest.TestCase):
+    """ Test :py:class:`ProgressReporter`. """
+
+    def test_should_sum_streams_and_report_failure_at_once(self):
+        """ Scenariusz: kilka procesów """
+        # Arrange
+        callback = Mock()
+        obj = ProgressReporter(callback, interval=60)
+        first, second = obj.stream(), obj.stream()
+        # Act
+        first(b'..')
+        second(b'.')
+        second(b'F')
+        first(b'.')
+        # Assert
+        self.assertEqual(callback.call_args_list, [call(2, 0, 0), call(4, 1, 0)])
+
+
+@test_type('unit')
+class TestRunnerRunCommandTestCase(unittest.TestCase):
+    """ Test :py:meth:`TestRunner._run_command`. """
+
+    @unittest.skipIf(os.name == 'nt', 'streaming needs select() on pipes')
+    def test_should_pass_error_output_while_command_runs(self):
+        """ Scenariusz: strumieniowanie wyników """
+        # Arrange
+        obj = TestRunner('test_file.py')
+        chunks = []
+        code = 'import sys; sys.stdout.write("out"); sys.stderr.write("..");sys.stderr.flush(); sys.stderr.write("F")'
+        # Act
+        result = obj._run_command([sys.executable, '-c', code], chunks.append)
+        # Assert
+        self.assertEqual(tuple(output.getvalue() for output in result), ('out', '..F'))
+        self.assertEqual(b''.join(chunks), b'..F')
+
+    @unittest.skipIf(os.name == 'nt', 'streaming needs select() on pipes')
+    def test_should_stream_output_to_spill_buffer_without_listener(self):
+        """ Scenariusz: dużo wyjścia bez śledzenia postępu """
+        # Arrange
+        obj = TestRunner('test_file.py')
+        obj.OUTPUT_MEMORY_LIMIT = 16
+        code = 'import sys; sys.stderr.write("x" * 1000)'
+        # Act
+        with patch('subprocess.Popen.communicate', side_effect=AssertionError('output read at once')):
+            result = obj._run_command([sys.executable, '-c', code])
+        # Assert
+        self.assertTrue(result[1].spilled)
+        self.assertEqual(result[1].getvalue(), 'x' * 1000)
+
+
+@test_type('unit')
+class TddMonProgressTestCase(unittest.TestCase):
+    """ Test progress notifications of :py:class:`TddMon`. """
+
+    def test_should_notify_observers_about_progress_of_runner(self):
+        """ Scenariusz: postęp testów """
+        # Arrange
+        test_runner = Mock()
+        obj = TddMon('test_file.py', file_monitor=Mock(), test_runner=test_runner)
+        status_display = Mock()
+        obj.register(status_display)
+        # Act
+        test_runner.progress_callback(3, 1, 0)
+        # Assert
+        status_display.notify.assert_called_once_with(obj, 3, 1, 0, None, progress=True)
+
+
+
+@test_type('unit')
+class CoverageCacheUpdateTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`CoverageCache.update`. """
+
+    def write_data(self, path, lines_by_context):
+        from coverage import CoverageData
+        data = CoverageData(basename=path)
+        for context, lines in sorted(lines_by_context.items()):
+            data.set_context(context)
+            data.add_lines(dict((os.path.abspath(name), numbers) for name, numbers in lines.items()))
+        data.write()
+
+    def read_lines(self, path):
+        from coverage import CoverageData
+        data = CoverageData(basename=path)
+        data.read()
+        return dict((os.path.basename(name), sorted(data.lines(name))) for name in data.measured_files())
+
+    def read_contexts(self, path, name):
+        from coverage import CoverageData
+        data = CoverageData(basename=path)
+        data.read()
+        return dict((line, sorted(contexts)) for line, contexts in data.contexts_by_lineno(os.path.abspath(name)).items())
+
+    def test_should_replace_cache_after_full_run(self):
+        """ Scenariusz: wszystkie testy """
+        # Arrange
+        self.write_data('cache', {'T.test_a': {'a.py': [1, 2]}})
+        self.write_data('.coverage', {'T.test_b': {'b.py': [1]}})
+        obj = CoverageCache('cache')
+        # Act
+        result = obj.update('.coverage')
+        # Assert
+        self.assertEqual(result, 'cache')
+        self.assertEqual(self.read_lines('cache'), {'b.py': [1]})
+
+    def test_should_start_cache_with_partial_run(self):
+        """ Scenariusz: brak pamięci podręcznej """
+        # Arrange
+        self.write_data('.coverage', {'T.test_b': {'b.py': [1]}})
+        obj = CoverageCache(os.path.join('.tddmon', 'coverage'))
+        # Act
+        result = obj.update('.coverage', ['T.test_b'], ChangeSet(modified=['b.py']))
+        # Assert
+        self.assertEqual(result, os.path.join('.tddmon', 'coverage'))
+        self.assertEqual(self.read_lines(result), {'b.py': [1]})
+
+    def test_should_keep_data_of_tests_which_did_not_run(self):
+        """ Scenariusz: wybrane testy """
+        # Arrange
+        self.write_data('cache', {
+            '': {'a.py': [1], 'b.py': [1]},
+            'T.test_a': {'a.py': [2, 3]},
+            'T.test_b': {'a.py': [2, 4], 'b.py': [2, 3]},
+        })
+        self.write_data('.coverage', {
+            '': {'b.py': [1]},
+            'T.test_b': {'b.py': [2, 5]},
+        })
+        obj = CoverageCache('cache')
+        # Act
+        result = obj.update('.coverage', ['T.test_b'], ChangeSet(modified=['b.py']))
+        # Assert
+        self.assertEqual(self.read_lines(result), {'a.py': [1, 2, 3], 'b.py': [1, 2, 5]})
+        self.assertEqual(self.read_contexts(result, 'a.py'), {1: [''], 2: ['T.test_a'], 3: ['T.test_a']})
+
+    def test_should_drop_data_of_changed_files(self):
+        """ Scenariusz: zmieniony plik nie wykonany już przez testy """
+        # Arrange
+        self.write_data('cache', {'T.test_a': {'a.py': [1, 2]}, 'T.test_b': {'b.py': [1, 2]}})
+        self.write_data('.coverage', {'T.test_a': {'a.py': [1]}})
+        obj = CoverageCache('cache')
+        # Act
+        result = obj.update('.coverage', ['T.test_a'], ChangeSet(modified=['b.py']))
+        # Assert
+        self.assertEqual(self.read_lines(result), {'a.py': [1], 'b.py': []})
+
+    def test_should_forget_deleted_files(self):
+        """ Scenariusz: usunięty plik """
+        # Arrange
+        self.write_data('cache', {'T.test_a': {'a.py': [1]}, 'T.test_b': {'b.py': [1]}})
+        self.write_data('.coverage', {'T.test_a': {'a.py': [1]}})
+        obj = CoverageCache('cache')
+        # Act
+        result = obj.update('.coverage', ['T.test_a'], ChangeSet(deleted=['b.py']))
+        # Assert
+        self.assertEqual(list(self.read_lines(result)), ['a.py'])
+
+    def test_should_replace_cache_which_is_not_coverage_data(self):
+        """ Scenariusz: uszkodzona pamięć podręczna """
+        # Arrange
+        with open('cache', 'wb') as f:
+            f.write(b'garbage')
+        self.write_data('.coverage', {'T.test_a': {'a.py': [1]}})
+        obj = CoverageCache('cache')
+        # Act
+        result = obj.update('.coverage', ['T.test_a'], ChangeSet(modified=['a.py']))
+        # Assert
+        self.assertEqual(self.read_lines(result), {'a.py': [1]})
+
+    def test_should_return_data_file_when_run_wrote_no_data(self):
+        """ Scenariusz: brak danych """
+        # Arrange
+        obj = CoverageCache('cache')
+        # Act
+        result = obj.update('.coverage', ['T.test_a'])
+        # Assert
+        self.assertEqual(result, '.coverage')
+        self.assertFalse(os.path.exists('cache'))
+
+
+@test_type('unit')
+class TestRunnerRunWithCoverageCacheTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`TestRunner.run` with coverage cache. """
+
+    @patch('tddmon.__main__.read_coverage_summary')
+    @patch('subprocess.Popen')
+    def test_should_report_coverage_of_whole_suite(self, Popen, read_coverage_summary):
+        """ Scenariusz: częściowe uruchomienie """
+        # Arrange
+        fake_processes(Popen, [('', 'OK')])
+        read_coverage_summary.return_value.format.return_value = 'TOTAL'
+        impact_index = Mock()
+        impact_index.select.return_value = ['T.test_a']
+        coverage_cache = Mock()
+        coverage_cache.update.return_value = 'cache'
+        obj = TestRunner('test_file.py', impact_index=impact_index, coverage_config='coveragerc',
+                         coverage_cache=coverage_cache)
+        changes = ChangeSet(modified=['a.py'])
+        # Act
+        obj.run(changes)
+        # Assert
+        coverage_cache.update.assert_called_once_with('.coverage', ['T.test_a'], changes)
+        read_coverage_summary.assert_called_once_with('cache', 'coveragerc')
+
+
+
+@test_type('unit')
+class ResultCacheTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:class:`ResultCache`. """
+
+    def test_should_return_stored_result(self):
+        """ Scenariusz: powrót do przetestowanego stanu """
+        # Arrange
+        obj = ResultCache('results', key='test_file.py')
+        obj.put('digest', {'output': 'OK'})
+        # Act
+        result = ResultCache('results', key='test_file.py').get('digest')
+        # Assert
+        self.assertEqual(result, {'output': 'OK'})
+
+    def test_should_return_nothing_for_other_tree_or_key(self):
+        """ Scenariusz: inny stan lub inne polecenie """
+        # Arrange
+        ResultCache('results', key='test_file.py').put('digest', {'output': 'OK'})
+        # Act
+        other_tree = ResultCache('results', key='test_file.py').get('other')
+        other_key = ResultCache('results', key='other_file.py').get('digest')
+        # Assert
+        self.assertEqual(other_tree, None)
+        self.assertEqual(other_key, None)
+
+    def test_should_evict_least_recently_used_results(self):
+        """ Scenariusz: przekroczony rozmiar """
+        # Arrange
+        obj = ResultCache('results', max_size=2 * len(zlib.compress(b'{"output":"OK"}', 1)))
+        for digest in ('a', 'b'):
+            obj.put(digest, {'output': 'OK'})
+        os.utime(obj._entry_path('a'), (0, 0))
+        obj.get('a')
+        os.utime(obj._entry_path('b'), (1, 1))
+        # Act
+        obj.put('c', {'output': 'OK'})
+        # Assert
+        self.assertNotEqual(obj.get('a'), None)
+        self.assertEqual(obj.get('b'), None)
+        self.assertNotEqual(obj.get('c'), None)
+
+
+@test_type('unit')
+class FileMonitorTreeDigestTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`FileMonitor.tree_digest`. """
+
+    def setUp(self):
+        super(FileMonitorTreeDigestTestCase, self).setUp()
+        with open('file1.py', 'w') as f:
+            f.write('a = 1\n')
+        self.obj = FileMonitor(settle=0)
+        self.obj.code_has_changed()
+
+    def test_should_return_same_digest_when_change_is_undone(self):
+        """ Scenariusz: cofnięta zmiana """
+        # Arrange
+        before = self.obj.tree_digest()
+        with open('file1.py', 'w') as f:
+            f.write('a = 2\n')
+        self.bump_mtime('file1.py')
+        changed = self.obj.tree_digest()
+        # Act
+        with open('file1.py', 'w') as f:
+            f.write('a = 1\n')
+        result = self.obj.tree_digest()
+        # Assert
+        self.assertNotEqual(changed, before)
+        self.assertEqual(result, before)
+
+    def test_should_not_hash_unchanged_files_again(self):
+        """ Scenariusz: brak zmian """
+        # Arrange
+        before = self.obj.tree_digest()
+        # Act
+        with patch('tddmon.__main__.hash_file') as hash_file:
+            result = self.obj.tree_digest()
+        # Assert
+        self.assertEqual(result, before)
+        self.assertFalse(hash_file.called)
+
+
+@test_type('unit')
+class TddMonResultCacheTestCase(unittest.TestCase):
+    """ Test :py:meth:`TddMon.run` with result cache. """
+
+    def setUp(self):
+        self.file_monitor = Mock()
+        self.file_monitor.tree_digest.return_value = 'digest'
+        self.test_runner = Mock()
+        self.test_runner.coverage_summary = CoverageSummary({}, CoverageNumbers(10, 1, 0, 0, 90.0))
+        self.result_cache = Mock()
+        self.obj = TddMon('test_file.py', file_monitor=self.file_monitor, test_runner=self.test_runner,
+                          result_cache=self.result_cache)
+        self.status_display = Mock()
+        self.obj.register(self.status_display)
+
+    def test_should_store_result_of_run(self):
+        """ Scenariusz: nowy stan plików """
+        # Arrange
+        self.result_cache.get.return_value = None
+        self.test_runner.run.return_value = ('', 'FAIL: test_a (tests.T)\nRan 2 tests in 0.1s\nFAILED (failures=1)\n')
+        # Act
+        self.obj.run()
+        # Assert
+        self.result_cache.put.assert_called_once_with('digest', {
+            'output': self.test_runner.run.return_value[1],
+            'result': [2, 1, 0, 0],
+            'failed_tests': ['tests.T.test_a'],
+            'coverage_summary': {'files': {}, 'totals': [10, 1, 0, 0, 90.0]},
+        })
+
+    def test_should_not_store_result_with_output_spilled_to_disk(self):
+        """ Scenariusz: bardzo dużo wyjścia """
+        # Arrange
+        self.result_cache.get.return_value = None
+        output = SpillBuffer(max_memory=8)
+        output.write('debug output\nRan 1 test in 0.1s\nOK\n')
+        self.test_runner.run.return_value = ('', output)
+        # Act
+        self.obj.run()
+        # Assert
+        self.assertFalse(self.result_cache.put.called)
+
+    def test_should_not_store_result_when_files_changed_during_run(self):
+        """ Scenariusz: zmiana w trakcie testów """
+        # Arrange
+        self.result_cache.get.return_value = None
+        self.file_monitor.tree_digest.side_effect = ['digest', 'other']
+        self.test_runner.run.return_value = ('', 'Ran 1 test in 0.1s\nOK\n')
+        # Act
+        self.obj.run()
+        # Assert
+        self.assertFalse(self.result_cache.put.called)
+
+    def test_should_notify_cached_result_without_running_tests(self):
+        """ Scenariusz: powrót do przetestowanego stanu """
+        # Arrange
+        self.result_cache.get.return_value = {
+            'output': 'OK',
+            'result': [2, 1, 0, 0],
+            'failed_tests': ['tests.T.test_a'],
+            'coverage_summary': {'files': {}, 'totals': [10, 1, 0, 0, 90.0]},
+        }
+        changes = ChangeSet(modified=['file1.py'])
+        # Act
+        self.obj.run(changes)
+        # Assert
+        self.assertFalse(self.test_runner.run.called)
+        self.status_display.notify.assert_called_once_with(self.obj, 2, 1, 0, 90, changes=changes,
+                                                           coverage_summary=ANY)
+        self.assertEqual(self.obj._failed_tests, ['tests.T.test_a'])
+
+    def test_should_pass_changes_of_cached_runs_to_next_run(self):
+        """ Scenariusz: zmiany pominięte dzięki pamięci podręcznej """
+        # Arrange
+        self.result_cache.get.side_effect = [{
+            'output': 'OK',
+            'result': [1, 0, 0, 0],
+            'failed_tests': [],
+            'coverage_summary': None,
+        }, None]
+        self.test_runner.run.return_value = ('', 'Ran 1 test in 0.1s\nOK\n')
+        self.obj.run(ChangeSet(modified=['file1.py']))
+        changes = ChangeSet(modified=['file2.py'])
+        # Act
+        self.obj.run(changes)
+        # Assert
+        self.test_runner.run.assert_called_once_with(changes)
+        self.assertEqual(changes, ChangeSet(modified=['file1.py', 'file2.py']))
+
+
+
+@test_type('unit')
+class TddMonFastTestCase(unittest.TestCase):
+    """ Test :py:class:`TddMon` in fast mode. """
+
+    def setUp(self):
+        self.file_monitor = Mock()
+        self.file_monitor.startup_changes.return_value = None
+        self.test_runner = Mock()
+        self.test_runner.coverage_summary = CoverageSummary({}, CoverageNumbers(10, 1, 0, 0, 90.0))
+        self.test_runner.run.return_value = ('', 'Ran 2 tests in 0.1s\nOK\n')
+        self.obj = TddMon('test_file.py', file_monitor=self.file_monitor, test_runner=self.test_runner,
+                          fast=True, backfill_idle=5, backfill_after=2)
+        self.status_display = Mock()
+        self.obj.register(self.status_display)
+
+    def test_should_run_tests_without_coverage_and_show_last_coverage_as_stale(self):
+        """ Scenariusz: szybki tryb """
+        # Arrange
+        self.obj.backfill()
+        self.status_display.reset_mock()
+        changes = ChangeSet(modified=['file1.py'])
+        # Act
+        self.obj.run(changes)
+        # Assert
+        self.test_runner.run.assert_called_with(changes, measure_coverage=False)
+        self.status_display.notify.assert_called_once_with(self.obj, 2, 0, 0, 90, changes=changes,
+                                                           stale_coverage=True)
+
+    def test_should_measure_coverage_of_changes_made_in_fast_mode(self):
+        """ Scenariusz: uzupełnienie pokrycia """
+        # Arrange
+        self.obj.run(ChangeSet(modified=['file1.py']))
+        self.obj.run(ChangeSet(modified=['file2.py']))
+        # Act
+        self.obj.backfill()
+        # Assert
+        self.test_runner.run.assert_called_with(ChangeSet(modified=['file1.py', 'file2.py']))
+        self.status_display.notify.assert_called_with(self.obj, 2, 0, 0, 90, changes=ANY,
+                                                      coverage_summary=self.test_runner.coverage_summary)
+        self.assertFalse(self.obj._coverage_stale)
+
+    def test_should_keep_changes_when_backfill_is_cancelled(self):
+        """ Scenariusz: zmiana w trakcie uzupełniania pokrycia """
+        # Arrange
+        self.obj.run(ChangeSet(modified=['file1.py']))
+        self.test_runner.run.side_effect = TestRunCancelled(ChangeSet(modified=['file2.py']))
+        # Act
+        self.obj.backfill()
+        # Assert
+        self.assertEqual(self.obj._pending_changes, ChangeSet(modified=['file2.py']))
+        self.assertEqual(self.obj._unmeasured_changes, ChangeSet(modified=['file1.py']))
+
+    def test_should_backfill_after_green_runs(self):
+        """ Scenariusz: kolejne zielone uruchomienia """
+        # Arrange
+        self.file_monitor.wait_for_change.side_effect = [ChangeSet(modified=['file1.py']), KeyboardInterrupt]
+        # Act
+        with patch.object(self.obj, 'backfill') as backfill:
+            backfill.side_effect = KeyboardInterrupt
+            self.obj.loop()
+        # Assert
+        self.assertEqual(self.obj._green_runs, 2)
+        self.assertTrue(backfill.called)
+
+    def test_should_backfill_when_idle(self):
+        """ Scenariusz: brak zmian """
+        # Arrange
+        self.file_monitor.wait_for_change.side_effect = [FileMonitorTimeoutError, KeyboardInterrupt]
+        # Act
+        with patch.object(self.obj, 'backfill') as backfill:
+            self.obj.loop()
+        # Assert
+        self.file_monitor.wait_for_change.assert_called_with(timeout=5)
+        backfill.assert_called_once_with()
+
+
+
+@test_type('unit')
+class ImportGraphSelectTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`ImportGraph.select`. """
+
+    def setUp(self):
+        super(ImportGraphSelectTestCase, self).setUp()
+        self.write('pkg/__init__.py', '')
+        self.write('pkg/a.py', 'def a():\n    return 1\n')
+        self.write('pkg/b.py', 'from .a import a\n')
+        self.write('pkg/c.py', 'def c():\n    return 3\n')
+        self.write('tests/__init__.py', '')
+        self.write('tests/test_b.py', 'import unittest\nfrom pkg.b import a\n'
+                                      'class BTestCase(unittest.TestCase):\n    pass\n'
+                                      'class MoreBTestCase(BTestCase):\n    pass\n')
+        self.write('tests/test_c.py', 'import unittest\nfrom pkg import c\n'
+                                      'class CTestCase(unittest.TestCase):\n    pass\n')
+        self.write('run.py', 'import unittest\nfrom tests.test_b import *\nimport tests.test_c\n'
+                             'class ScriptTestCase(unittest.TestCase):\n    pass\n')
+        self.obj = ImportGraph('run.py', 'imports')
+
+    def write(self, path, content):
+        self.touch(*path.split('/'))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_should_select_tests_of_modules_importing_changed_module(self):
+        """ Scenariusz: zmieniony moduł importowany pośrednio """
+        # Arrange
+        # Act
+        result = self.obj.select(ChangeSet(modified=['pkg/a.py']))
+        # Assert
+        self.assertEqual(result, ['BTestCase', 'MoreBTestCase'])
+
+    def test_should_parse_again_files_changed_while_graph_was_not_asked(self):
+        """ Scenariusz: nowy import dodany przy wyborze testów przez indeks wpływu """
+        # Arrange
+        self.obj.select(ChangeSet(modified=['pkg/c.py']))
+        self.write('tests/test_c.py', 'import unittest\nfrom pkg import a, c\n'
+                                      'class CTestCase(unittest.TestCase):\n    pass\n')
+        self.obj.invalidate(ChangeSet(modified=['tests/test_c.py']))
+        # Act
+        result = self.obj.select(ChangeSet(modified=['pkg/a.py']))
+        # Assert
+        self.assertEqual(result, ['BTestCase', 'MoreBTestCase', 'tests.test_c.CTestCase'])
+
+    def test_should_parse_again_all_files_after_unknown_changes(self):
+        """ Scenariusz: utracone zmiany """
+        # Arrange
+        self.obj.select(ChangeSet(modified=['pkg/c.py']))
+        self.write('tests/test_c.py', 'import unittest\nfrom pkg import a, c\n'
+                                      'class CTestCase(unittest.TestCase):\n    pass\n')
+        self.obj.invalidate(ChangeSet(unknown=True))
+        # Act
+        result = self.obj.select(ChangeSet(modified=['pkg/a.py']))
+        # Assert
+        self.assertEqual(result, ['BTestCase', 'MoreBTestCase', 'tests.test_c.CTestCase'])
+
+    def test_should_name_tests_by_module_imported_by_script(self):
+        """ Scenariusz: moduł testów zaimportowany przez import """
+        # Arrange
+        # Act
+        result = self.obj.select(ChangeSet(modified=['pkg/c.py']))
+        # Assert
+        self.assertEqual(result, ['tests.test_c.CTestCase'])
+
+    def test_should_select_tests_of_script_when_module_imported_by_it_changes(self):
+        """ Scenariusz: zmieniony moduł testów importowany przez skrypt """
+        # Arrange
+        # Act
+        result = self.obj.select(ChangeSet(modified=['tests/test_c.py']))
+        # Assert
+        self.assertEqual(result, ['ScriptTestCase', 'tests.test_c.CTestCase'])
+
+    def test_should_select_whole_suite(self):
+        """ Scenariusz: zmieniony skrypt, nieznany plik lub nieznane zmiany """
+        # Arrange
+        # Act
+        # Assert
+        self.assertEqual(self.obj.select(ChangeSet(modified=['run.py'])), None)
+        self.assertEqual(self.obj.select(ChangeSet(modified=['setup.py'])), None)
+        self.assertEqual(self.obj.select(ChangeSet(unknown=True)), None)
+        self.assertEqual(self.obj.select(None), None)
+
+    def test_should_parse_again_only_changed_files(self):
+        """ Scenariusz: zmiana importów """
+        # Arrange
+        self.obj.select(ChangeSet(modified=['pkg/c.py']))
+        obj = ImportGraph('run.py', 'imports')
+        self.write('pkg/b.py', 'from .c import c\n')
+        # Act
+        with patch.object(ImportGraph, '_parse', wraps=obj._parse) as parse:
+            result = obj.select(ChangeSet(modified=['pkg/b.py']))
+        # Assert
+        parse.assert_called_once_with(os.path.abspath('pkg/b.py'), os.path.abspath('run.py'))
+        self.assertEqual(obj.select(ChangeSet(modified=['pkg/c.py'])),
+                         ['BTestCase', 'MoreBTestCase', 'tests.test_c.CTestCase'])
+
+
+@test_type('unit')
+class TestRunnerRunWithImportGraphTestCase(unittest.TestCase):
+    """ Test :py:meth:`TestRunner.run` with import graph. """
+
+    @patch('tddmon.__main__.read_coverage_summary')
+    @patch('subprocess.Popen')
+    def test_should_run_tests_selected_by_imports(self, Popen, read_coverage_summary):
+        """ Scenariusz: brak danych o pokryciu testów """
+        # Arrange
+        fake_processes(Popen, [('', 'OK')])
+        read_coverage_summary.return_value.format.return_value = 'TOTAL'
+        import_graph = Mock()
+        import_graph.select.return_value = ['BTestCase']
+        obj = TestRunner('run.py', import_graph=import_graph)
+        changes = ChangeSet(modified=['pkg/a.py'])
+        # Act
+        obj.run(changes)
+        # Assert
+        import_graph.select.assert_called_once_with(changes)
+        self.assertEqual(Popen.call_args_list[0][0][0][-2:], ['run.py', 'BTestCase'])
+
+    @patch('tddmon.__main__.read_coverage_summary')
+    @patch('subprocess.Popen')
+    def test_should_invalidate_changed_files_when_impact_index_selects_tests(self, Popen, read_coverage_summary):
+        """ Scenariusz: testy wybrane przez indeks wpływu """
+        # Arrange
+        fake_processes(Popen, [('', 'OK')])
+        read_coverage_summary.return_value.format.return_value = 'TOTAL'
+        import_graph = Mock()
+        impact_index = Mock()
+        impact_index.select.return_value = ['__main__.CTestCase.test_c']
+        obj = TestRunner('run.py', impact_index=impact_index, coverage_config=os.devnull, import_graph=import_graph)
+        changes = ChangeSet(modified=['tests/test_c.py'])
+        # Act
+        obj.run(changes)
+        # Assert
+        import_graph.invalidate.assert_called_once_with(changes)
+        self.assertFalse(import_graph.select.called)
+
+
+
+@test_type('unit')
+class CheckSyntaxTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:func:`check_syntax`. """
+
+    def setUp(self):
+        super(CheckSyntaxTestCase, self).setUp()
+        with open('good.py', 'w') as f:
+            f.write('a = 1\n')
+        with open('bad.py', 'w') as f:
+            f.write('a = 1\nif a\n    pass\n')
+        with open('template.html', 'w') as f:
+            f.write('{% if a %}\n')
+
+    def test_should_return_syntax_errors_with_location(self):
+        """ Scenariusz: literówka """
+        # Arrange
+        # Act
+        result = check_syntax(['good.py', 'bad.py', 'template.html', 'removed.py'])
+        # Assert
+        self.assertEqual(len(result), 1)
+        self.assertEqual((result[0].filename, result[0].lineno), ('bad.py', 2))
+        self.assertTrue(format_syntax_error(result[0]).startswith('bad.py:2: '))
+
+    def test_should_return_nothing_when_files_compile(self):
+        """ Scenariusz: poprawne pliki """
+        # Arrange
+        # Act
+        result = check_syntax(['good.py'])
+        # Assert
+        self.assertEqual(result, [])
+
+
+@test_type('unit')
+class TddMonSyntaxErrorTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`TddMon.run` with syntax error in changed file. """
+
+    def setUp(self):
+        super(TddMonSyntaxErrorTestCase, self).setUp()
+        with open('bad.py', 'w') as f:
+            f.write('def f(:\n')
+        self.test_runner = Mock()
+        self.test_runner.coverage_summary = None
+        self.test_runner.run.return_value = ('', 'Ran 1 test in 0.1s\nOK\n')
+        self.obj = TddMon('test_file.py', file_monitor=Mock(), test_runner=self.test_runner)
+        self.status_display = Mock()
+        self.obj.register(self.status_display)
+
+    def test_should_notify_syntax_error_without_running_tests(self):
+        """ Scenariusz: literówka """
+        # Arrange
+        changes = ChangeSet(modified=['bad.py'])
+        # Act
+        self.obj.run(changes)
+        # Assert
+        self.assertFalse(self.test_runner.run.called)
+        self.status_display.notify.assert_called_once_with(self.obj, 0, 0, 1, None, changes=changes,
+                                                           syntax_error=ANY)
+        self.assertTrue(self.status_display.notify.call_args[1]['syntax_error'].startswith('bad.py:1: '))
+
+    def test_should_run_tests_with_all_changes_when_file_compiles(self):
+        """ Scenariusz: poprawiona literówka """
+        # Arrange
+        self.obj.run(ChangeSet(modified=['bad.py']))
+        with open('bad.py', 'w') as f:
+            f.write('def f():\n    pass\n')
+        changes = ChangeSet(modified=['good.py'])
+        # Act
+        self.obj.run(changes)
+        # Assert
+        self.test_runner.run.assert_called_once_with(changes)
+        self.assertEqual(changes, ChangeSet(modified=['bad.py', 'good.py']))
+
+
+@test_type('unit')
+class TddMonStagesTestCase(unittest.TestCase):
+    """ Test :py:class:`TddMon` with later test stages. """
+
+    def setUp(self):
+        self.file_monitor = Mock()
+        self.file_monitor.startup_changes.return_value = None
+        self.test_runner = Mock()
+        self.test_runner.coverage_summary = None
+        self.test_runner.run.return_value = ('', 'Ran 2 tests in 0.1s\nOK\n')
+        self.slow_runner = Mock()
+        self.slow_runner.coverage_summary = None
+        self.slow_runner.run.return_value = ('', 'Ran 5 tests in 3.0s\nOK\n')
+        self.docs_runner = Mock()
+        self.docs_runner.coverage_summary = None
+        self.docs_runner.run.return_value = ('', 'Ran 1 test in 0.1s\nOK\n')
+        self.slow = TestStage('slow', self.slow_runner, False, IgnoreRules(['*']), 20)
+        self.docs = TestStage('docs', self.docs_runner, True, IgnoreRules(['*.rst']), 30)
+        self.obj = TddMon('test_file.py', file_monitor=self.file_monitor, test_runner=self.test_runner,
+                          stages=[self.slow, self.docs])
+        self.status_display = Mock()
+        self.obj.register(self.status_display)
+
+    def test_should_wait_for_idle_time_of_first_stage_when_tests_pass(self):
+        """ Scenariusz: zielone testy """
+        # Arrange
+        self.obj.run(ChangeSet(modified=['file1.py']))
+        # Act
+        idle, task = self.obj._idle_task()
+        task()
+        # Assert
+        self.assertEqual(idle, 20)
+        self.slow_runner.run.assert_called_once_with(None, measure_coverage=False)
+        self.status_display.notify.assert_called_with(self.obj, 5, 0, 0, None, stage='slow',
+                                                      stages={'slow': 'ok', 'docs': None})
+
+    def test_should_not_run_stages_when_tests_fail(self):
+        """ Scenariusz: czerwone testy """
+        # Arrange
+        self.test_runner.run.return_value = ('', 'Ran 2 tests in 0.1s\nFAILED (failures=1)\n')
+        # Act
+        self.obj.run(ChangeSet(modified=['file1.py']))
+        # Assert
+        self.assertIsNone(self.obj._idle_task())
+
+    def test_should_run_next_stage_only_after_previous_passes(self):
+        """ Scenariusz: kolejne etapy """
+        # Arrange
+        self.obj.run(ChangeSet(modified=['file1.py']))
+        self.slow_runner.run.return_value = ('', 'Ran 5 tests in 3.0s\nFAILED (errors=1)\n')
+        # Act
+        self.obj.run_stage(self.slow)
+        # Assert
+        self.assertIsNone(self.obj._idle_task())
+        self.assertEqual(self.obj._stage_status, {'slow': 'failed', 'docs': None})
+
+    def test_should_run_stage_again_only_when_its_triggers_match(self):
+        """ Scenariusz: zmiana pliku spoza wyzwalaczy etapu """
+        # Arrange
+        self.obj.run(ChangeSet(modified=['file1.py']))
+        self.obj.run_stage(self.slow)
+        self.obj.run_stage(self.docs)
+        # Act
+        self.obj.run(ChangeSet(modified=['file2.py']))
+        # Assert
+        self.assertEqual(self.obj._stage_status, {'slow': 'pending', 'docs': 'ok'})
+        self.obj.run_stage(self.slow)
+        self.assertIsNone(self.obj._idle_task())
+        self.slow_runner.run.assert_called_with(ChangeSet(modified=['file2.py']), measure_coverage=False)
+
+    def test_should_postpone_changes_when_stage_is_cancelled(self):
+        """ Scenariusz: zmiana w trakcie etapu """
+        # Arrange
+        self.obj.run(ChangeSet(modified=['file1.py']))
+        self.slow_runner.run.side_effect = TestRunCancelled(ChangeSet(modified=['file2.py']))
+        # Act
+        self.obj.run_stage(self.slow)
+        # Assert
+        self.assertEqual(self.obj._pending_changes, ChangeSet(modified=['file2.py']))
+        self.assertTrue(self.obj._stage_changes['slow'].unknown)
+
+    def test_should_run_stage_when_idle_in_loop(self):
+        """ Scenariusz: brak zmian po zielonych testach """
+        # Arrange
+        self.file_monitor.wait_for_change.side_effect = [ChangeSet(modified=['file1.py']),
+                                                         FileMonitorTimeoutError, KeyboardInterrupt]
+        # Act
+        self.obj.loop()
+        # Assert
+        self.file_monitor.wait_for_change.assert_called_with(timeout=30)
+        self.assertTrue(self.slow_runner.run.called)
+        self.assertTrue(self.slow_runner.close.called)
+
+
+@test_type('unit')
+class ReadStagesTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:func:`read_stages`. """
+
+    def test_should_read_stages_in_order(self):
+        """ Scenariusz: plik z etapami """
+        # Arrange
+        with open('stages.ini', 'w') as f:
+            f.write('[stage:slow]\ncommand = tests/test_slow.py\ncoverage = no\n'
+                    '[other]\nkey = value\n'
+                    '[stage:docs]\ncommand = tests/test_docs.py\ntriggers = docs/ *.rst\nidle = 2.5\n')
+        # Act
+        result = read_stages('stages.ini')
+        # Assert
+        self.assertEqual([(stage.name, stage.measure_coverage, stage.idle) for stage in result],
+                         [('slow', False, 10.0), ('docs', True, 2.5)])
+        self.assertEqual(result[0].test_runner._command, 'tests/test_slow.py')
+        self.assertTrue(result[0].triggers.is_ignored('src/file1.py'))
+        self.assertTrue(result[1].triggers.is_ignored('docs/api/index.txt'))
+        self.assertTrue(result[1].triggers.is_ignored('README.rst'))
+        self.assertFalse(result[1].triggers.is_ignored('src/file1.py'))
+
+    def test_should_raise_when_file_is_missing(self):
+        """ Scenariusz: brak pliku """
+        # Arrange
+        # Act
+        # Assert
+        self.assertRaises(IOError, read_stages, 'stages.ini')
+
+
+@test_type('unit')
+class ColorDisplayStagesTestCase(unittest.TestCase):
+    """ Test :py:meth:`ColorDisplay.notify` with later test stages. """
+
+    def setUp(self):
+        self.output = StringIO()
+        self.obj = ColorDisplay(self.output, stages=['slow', 'docs'])
+
+    def test_should_print_column_for_every_stage(self):
+        """ Scenariusz: nagłówek z etapami """
+        # Arrange
+        # Act
+        self.obj.notify(sentinel.observable, None, None, None, None)
+        # Assert
+        self.assertTrue(self.output.getvalue().startswith('Tests ran Failures  Errors Coverage  slow  docs\n'))
+
+    def test_should_print_status_of_stages_after_result(self):
+        """ Scenariusz: wynik z etapami """
+        # Arrange
+        # Act
+        self.obj.notify(sentinel.observable, 4, 0, 0, 90, stages={'slow': 'ok', 'docs': 'pending'})
+        # Assert
+        expected = '      90%%\033[0m  \033[%sm  ok\033[0m  wait\n' % DEFAULT_COLORS['green']
+        self.assertTrue(self.output.getvalue().endswith(expected))
+
+    def test_should_print_result_of_stage_without_changing_last_run_color(self):
+        """ Scenariusz: wynik etapu """
+        # Arrange
+        self.obj.notify(sentinel.observable, 4, 0, 0, 90)
+        # Act
+        self.obj.notify(sentinel.observable, 5, 1, 0, None, stage='slow', stages={'slow': 'failed', 'docs': None})
+        # Assert
+        expected = '\033[%sm        5        1       0\033[0m       ?%%  \033[%smFAIL\033[0m     -\n' % (
+            DEFAULT_COLORS['red'], DEFAULT_COLORS['red'])
+        self.assertTrue(self.output.getvalue().endswith(expected))
+        self.assertEqual(self.obj._last_run_color, DEFAULT_COLORS['green'])
+
+
+@test_type('unit')
+class SpillBufferTestCase(unittest.TestCase):
+    """ Test :py:class:`SpillBuffer`. """
+
+    def test_should_keep_small_output_in_memory(self):
+        """ Scenariusz: mało wyjścia """
+        # Arrange
+        obj = SpillBuffer(max_memory=8)
+        # Act
+        obj.write(b'OK\n')
+        # Assert
+        self.assertFalse(obj.spilled)
+        self.assertEqual(obj.getvalue(), 'OK\n')
+
+    def test_should_move_output_to_temporary_file_above_limit(self):
+        """ Scenariusz: dużo wyjścia """
+        # Arrange
+        obj = SpillBuffer(max_memory=8)
+        # splits two bytes of last letter
+        obj.CHUNK_SIZE = 13
+        # Act
+        obj.write(b'line 1\n')
+        obj.write(u'line \u017c\n')
+        # Assert
+        self.assertTrue(obj.spilled)
+        self.assertEqual(len(obj), 15)
+        self.assertEqual(obj.getvalue(), 'line 1\nline ż\n')
+
+    def test_should_append_file_contents(self):
+        """ Scenariusz: wyjście zapisane do pliku """
+        # Arrange
+        obj = SpillBuffer(max_memory=8)
+        obj.write(b'out ')
+        # Act
+        obj.read_from(BytesIO(b'x' * 100))
+        # Assert
+        self.assertEqual(obj.getvalue(), 'out ' + 'x' * 100)
+
+
+@test_type('unit')
+class OutputLinesTestCase(unittest.TestCase):
+    """ Test :py:func:`output_lines`. """
+
+    def test_should_join_lines_split_between_pieces_and_outputs(self):
+        """ Scenariusz: linie podzielone między kawałki """
+        # Arrange
+        buffer = SpillBuffer(max_memory=4)
+        buffer.CHUNK_SIZE = 4
+        buffer.write(b'Ran 2 tests\r\n\nOK')
+        # Act
+        result = list(output_lines('program ', buffer, ' (skipped=1)\n'))
+        # Assert
+        self.assertEqual(result, ['program Ran 2 tests', '', 'OK (skipped=1)'])
+
+
+@test_type('unit')
+class TestRunnerLimitsTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:meth:`TestRunner.run` with limits. """
+
+    def test_should_kill_process_group_after_timeout(self):
+        """ Scenariusz: zawieszony test """
+        # Arrange
+        with open('test_file.py', 'w') as f:
+            f.write('import subprocess, sys, time\n'
+                    'child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])\n'
+                    'open("child.pid", "w").write(str(child.pid))\n'
+                    'time.sleep(30)\n')
+        obj = TestRunner('test_file.py', limits=RunLimits(timeout=1))
+        obj.progress_callback = Mock()
+        started = time.time()
+        # Act
+        with self.assertRaises(TestRunLimitExceeded) as raised:
+            obj.run(measure_coverage=False)
+        # Assert
+        self.assertEqual(raised.exception.status, 'timeout')
+        self.assertLess(time.time() - started, 10)
+        with open('child.pid') as f:
+            child_pid = int(f.read())
+        for _ in range(100):
+            try:
+                os.kill(child_pid, 0)
+            except OSError:
+                break
+            time.sleep(0.05)
+        else:
+            self.fail('child of test process is still running')
+
+    @patch('subprocess.Popen')
+    def test_should_report_memory_error_under_memory_limit(self, Popen):
+        """ Scenariusz: za mało pamięci na test """
+        # Arrange
+        error_output = 'E\nTraceback (most recent call last):\nMemoryError\n'
+        fake_processes(Popen, [('', error_output)])
+        obj = TestRunner('test_file.py', limits=RunLimits(memory=1024 * 1024))
+        # Act
+        with self.assertRaises(TestRunLimitExceeded) as raised:
+            obj.run()
+        # Assert
+        self.assertEqual(raised.exception.status, 'oom')
+        self.assertEqual(raised.exception.outputs[1].getvalue(), error_output)
+        self.assertEqual(Popen.call_args[0][0][:2], [sys.executable, '-c'])
+        self.assertFalse('preexec_fn' in Popen.call_args[1])
+
+    @patch('subprocess.Popen')
+    def test_should_report_process_killed_by_cpu_limit_as_timeout(self, Popen):
+        """ Scenariusz: przekroczony czas procesora """
+        # Arrange
+        fake_processes(Popen, [('', '')], returncode=-signal.SIGXCPU)
+        obj = TestRunner('test_file.py', limits=RunLimits(cpu=1))
+        # Act
+        with self.assertRaises(TestRunLimitExceeded) as raised:
+            obj.run()
+        # Assert
+        self.assertEqual(raised.exception.status, 'timeout')
+
+
+@test_type('unit')
+class ApplyResourceLimitsTestCase(unittest.TestCase):
+    """ Test :py:func:`apply_resource_limits`. """
+
+    @patch('tddmon.__main__.resource')
+    def test_should_limit_address_space_and_cpu_time(self, resource):
+        """ Scenariusz: limity procesu testów """
+        # Arrange
+        resource.getrlimit.return_value = (resource.RLIM_INFINITY, resource.RLIM_INFINITY)
+        # Act
+        apply_resource_limits(RunLimits(memory=1024, cpu=60))
+        # Assert
+        resource.setrlimit.assert_has_calls([call(resource.RLIMIT_AS, (1024, 1024)),
+                                             call(resource.RLIMIT_CPU, (60, 61))])
+
+    @patch('tddmon.__main__.resource')
+    def test_should_not_raise_limit_above_hard_one(self, resource):
+        """ Scenariusz: niższy limit systemowy """
+        # Arrange
+        resource.getrlimit.return_value = (30, 30)
+        # Act
+        apply_resource_limits(RunLimits(cpu=60))
+        # Assert
+        resource.setrlimit.assert_called_once_with(resource.RLIMIT_CPU, (30, 31))
+
+
+@test_type('unit')
+class LimitedCommandTestCase(unittest.TestCase):
+    """ Test :py:func:`limited_command`. """
+
+    @unittest.skipIf(os.name == 'nt', 'no resource limits on Windows')
+    def test_should_run_command_with_limits_applied(self):
+        """ Scenariusz: limity ustawione przed uruchomieniem testów """
+        # Arrange
+        command = [sys.executable, '-c', 'import resource; print(resource.getrlimit(resource.RLIMIT_CPU)[0])']
+        # Act
+        output = subprocess.check_output(limited_command(command, RunLimits(cpu=60)))
+        # Assert
+        self.assertEqual(output.strip(), b'60')
+
+
+@test_type('unit')
+class TddMonLimitsTestCase(unittest.TestCase):
+    """ Test :py:meth:`TddMon.run` with run breaking limits. """
+
+    def setUp(self):
+        self.test_runner = Mock()
+        self.test_runner.coverage_summary = None
+        self.log = StringIO()
+        self.obj = TddMon('test_file.py', log=self.log, file_monitor=Mock(), test_runner=self.test_runner)
+        self.status_display = Mock()
+        self.obj.register(self.status_display)
+
+    def test_should_notify_timeout_as_error(self):
+        """ Scenariusz: przekroczony czas testów """
+        # Arrange
+        self.test_runner.run.side_effect = TestRunLimitExceeded('timeout', ('', '..'))
+        changes = ChangeSet(modified=['file1.py'])
+        # Act
+        self.obj.run(changes)
+        # Assert
+        self.status_display.notify.assert_called_once_with(self.obj, 0, 0, 1, None, changes=changes,
+                                                           limit_exceeded='timeout')
+        self.assertEqual(self.obj._unmeasured_changes, changes)
+        self.assertTrue(self.log.getvalue().endswith('..\ntest run stopped: timeout\n'))
+
+
+@test_type('unit')
+class ReadCoverageSummaryTestCase(TemporaryDirectoryMixin, unittest.TestCase):
+    """ Test :py:func:`read_coverage_summary`. """
+
+    def test_should_return_none_when_data_file_can_not_be_read(self):
+        """ Scenariusz: uszkodzony plik danych pokrycia """
+        # Arrange
+        with open('.coverage', 'w') as f:
+            f.write('not a coverage data file\n')
+        # Act
+        result = read_coverage_summary('.coverage')
+        # Assert
+        self.assertIsNone(result)
 
 
 if __name__ == '__main__':  # pragma: nobranch